@@ -0,0 +1,986 @@
+"""
+대시보드 계산 함수 성능 측정 (네트워크 없이 합성 데이터 사용)
+
+실행 방법:
+    python benchmarks.py            # 전체
+    python benchmarks.py parse      # 특정 항목만
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+import warnings
+from contextlib import contextmanager
+from datetime import datetime
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+warnings.filterwarnings('ignore')
+logging.disable(logging.WARNING)  # streamlit bare mode 경고 숨김
+
+import kospi_sector_dashboard as app  # noqa: E402
+
+
+TICKER_COUNTS = (10, 100, 500, 2000)
+N_DAYS = 2520  # 10년
+
+
+# ========================================================================================
+# 합성 데이터
+# ========================================================================================
+def make_prices(n_tickers, n_days=N_DAYS, nan_ratio=0.05, seed=0):
+    """랜덤워크 종가 패널 (앞부분 NaN 일부 포함 - 신규 상장 종목 흉내)"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end='2026-10-16', periods=n_days)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_days, n_tickers)), axis=0))
+    late = rng.random(n_tickers) < nan_ratio
+    starts = rng.integers(0, n_days // 2, n_tickers)
+    for col in np.flatnonzero(late):
+        values[:starts[col], col] = np.nan
+    columns = [f"T{i:04d}" for i in range(n_tickers)]
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def make_yf_download(n_tickers, n_days=N_DAYS):
+    """yf.download(group_by='ticker') 결과와 같은 모양의 (Ticker, Price) MultiIndex 프레임"""
+    close = make_prices(n_tickers, n_days)
+    fields = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+    frame = pd.concat({t: pd.DataFrame({f: close[t] for f in fields}) for t in close.columns}, axis=1)
+    frame.columns.names = ['Ticker', 'Price']
+    frame.index = frame.index.tz_localize('Asia/Seoul')
+    return frame, list(close.columns)
+
+
+def make_instruments(n, seed=0):
+    """한글/영문 섞인 합성 종목 목록 (code, name, market)"""
+    rng = np.random.default_rng(seed)
+    syllables = [chr(c) for c in rng.integers(0xAC00, 0xD7A4, 400)]
+    words = ["".join(rng.choice(syllables, rng.integers(2, 4))) for _ in range(3000)]
+    latin = ["".join(rng.choice(list("abcdefghijklmnopqrstuvwxyz"), rng.integers(3, 8))).title() for _ in range(3000)]
+    rows = []
+    for i in range(n):
+        if i % 3 == 2:
+            rows.append((f"{''.join(rng.choice(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'), 4))}{i}", f"{rng.choice(latin)} {rng.choice(latin)}", "us"))
+        else:
+            market = "kospi" if i % 3 == 0 else "kosdaq"
+            suffix = ".KS" if market == "kospi" else ".KQ"
+            rows.append((f"{i:06d}{suffix}", f"{rng.choice(words)}{rng.choice(words)}", market))
+    return pd.DataFrame(rows, columns=["code", "name", "market"])
+
+
+def timeit(fn, repeat=3):
+    """최소 실행 시간 (ms)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def report(title, rows):
+    print(f"\n[{title}]")
+    print(f"{'tickers':>8} {'legacy(ms)':>12} {'new(ms)':>10} {'speedup':>8}")
+    for n, legacy_ms, new_ms in rows:
+        print(f"{n:>8} {legacy_ms:>12.1f} {new_ms:>10.1f} {legacy_ms / new_ms:>7.1f}x")
+
+
+# ========================================================================================
+# 기존 구현 (비교 기준)
+# ========================================================================================
+def legacy_parse_yf_to_close(data, tickers):
+    result = pd.DataFrame()
+    for ticker in tickers:
+        try:
+            if ticker in data.columns.get_level_values(0):
+                result[ticker] = data[ticker]['Close']
+        except:
+            pass
+    if not result.empty:
+        result.index = pd.to_datetime(result.index).tz_localize(None)
+    return result
+
+
+def legacy_normalize_data(df, method='rebase100'):
+    if df.empty:
+        return df
+    first_valid = df.apply(lambda x: x.dropna().iloc[0] if len(x.dropna()) > 0 else 1)
+    if method == 'rebase100':
+        return ((df / first_valid) * 100).round(1)
+    else:
+        return (((df / first_valid) - 1) * 100).round(1)
+
+
+def legacy_calculate_relative_strength(df, benchmark_col):
+    result = pd.DataFrame(index=df.index)
+    bench_first = df[benchmark_col].dropna().iloc[0] if len(df[benchmark_col].dropna()) > 0 else 1
+    bench_return = ((df[benchmark_col] / bench_first) - 1) * 100
+    for col in df.columns:
+        if col != benchmark_col:
+            first_val = df[col].dropna().iloc[0] if len(df[col].dropna()) > 0 else 1
+            stock_return = ((df[col] / first_val) - 1) * 100
+            result[col] = (stock_return - bench_return).round(1)
+    return result
+
+
+def legacy_calculate_outperform_days(relative_df):
+    results = {}
+    for col in relative_df.columns:
+        series = relative_df[col].dropna()
+        if len(series) < 2:
+            results[col] = {'days': 0, 'status': '-', 'relative_return': 0}
+            continue
+        latest = series.iloc[-1]
+        is_outperform = latest > 0
+        count = 0
+        for i in range(len(series)-1, -1, -1):
+            if (series.iloc[i] > 0) == is_outperform:
+                count += 1
+            else:
+                break
+        results[col] = {
+            'days': count,
+            'status': '🔥 주도' if is_outperform else '❄️ 소외',
+            'relative_return': latest
+        }
+    return results
+
+
+def legacy_calculate_streak_history(relative_df):
+    results = {}
+    for col in relative_df.columns:
+        history = []
+        count, was_outperform = 0, None
+        for value in relative_df[col]:
+            if pd.isna(value):
+                history.append(np.nan)
+                continue
+            is_outperform = value > 0
+            count = count + 1 if is_outperform == was_outperform else 1
+            was_outperform = is_outperform
+            history.append(count if is_outperform else -count)
+        results[col] = history
+    return pd.DataFrame(results, index=relative_df.index, dtype=np.float64)
+
+
+def legacy_create_ranking_df(filtered_data, relative_df):
+    if relative_df.empty:
+        return pd.DataFrame()
+    ranking_data = []
+    for col in relative_df.columns:
+        if col in filtered_data.columns:
+            first_val = filtered_data[col].iloc[0]
+            last_val = filtered_data[col].iloc[-1]
+            rel_val = relative_df[col].iloc[-1] if len(relative_df[col]) > 0 else 0
+
+            if pd.isna(first_val) or pd.isna(last_val) or first_val == 0 or pd.isna(rel_val):
+                stock_return = None
+                rel_return = None
+                status = '⚠️'
+            else:
+                stock_return = round((last_val / first_val - 1) * 100, 1)
+                rel_return = round(rel_val, 1)
+                status = '🔥' if rel_return > 0 else '❄️'
+
+            stock_name = col.split(']')[-1] if ']' in col else col
+            if '[' in col and ']' in col:
+                sector = col.split('[')[1].split(']')[0]
+            else:
+                sector = '-'
+            ranking_data.append({
+                '섹터': sector,
+                '종목': stock_name,
+                '상대수익률': rel_return,
+                '수익률': stock_return,
+                '상태': status,
+                '_full_name': col
+            })
+    df = pd.DataFrame(ranking_data)
+    if df.empty:
+        return df
+    df = df.sort_values('상대수익률', ascending=False, na_position='last')
+    df['순위'] = range(1, len(df) + 1)
+    return df
+
+
+def legacy_rank_table(ranking_now, ranking_prev):
+    """탭3 이전 기간 보완 + 순위 변동 (main 안의 iterrows 루프 두 개)"""
+    prev_names = set(ranking_prev['_full_name']) if not ranking_prev.empty else set()
+    missing_rows = []
+    for _, row in ranking_now.iterrows():
+        if row['_full_name'] not in prev_names:
+            missing_rows.append({
+                '섹터': row['섹터'],
+                '종목': row['종목'],
+                '상대수익률': None,
+                '수익률': None,
+                '상태': '⚠️',
+                '_full_name': row['_full_name'],
+            })
+    if missing_rows:
+        missing_df = pd.DataFrame(missing_rows)
+        if not ranking_prev.empty:
+            ranking_prev = pd.concat([ranking_prev, missing_df], ignore_index=True)
+            ranking_prev = ranking_prev.sort_values('상대수익률', ascending=False, na_position='last')
+        else:
+            ranking_prev = missing_df
+        ranking_prev['순위'] = range(1, len(ranking_prev) + 1)
+
+    prev_valid = set(ranking_prev[ranking_prev['상대수익률'].notna()]['_full_name'])
+    prev_rank_map = dict(zip(ranking_prev['_full_name'], ranking_prev['순위']))
+    rank_changes = []
+    for _, row in ranking_now.iterrows():
+        full_name = row['_full_name']
+        if full_name not in prev_valid:
+            rank_changes.append('⚠️')
+            continue
+        change = prev_rank_map.get(full_name, row['순위']) - row['순위']
+        if change > 0:
+            rank_changes.append(f'▲{change}')
+        elif change < 0:
+            rank_changes.append(f'▼{abs(change)}')
+        else:
+            rank_changes.append('-')
+    return ranking_prev, rank_changes
+
+
+# ========================================================================================
+# 측정 항목
+# ========================================================================================
+def bench_parse():
+    """_parse_yf_to_close: 티커별 컬럼 삽입 루프 vs Close 레벨 일괄 선택"""
+    rows = []
+    for n in TICKER_COUNTS:
+        raw, tickers = make_yf_download(n)
+        expected = legacy_parse_yf_to_close(raw, tickers)
+        assert app._parse_yf_to_close(raw, tickers).equals(expected)
+        rows.append((n,
+                     timeit(lambda: legacy_parse_yf_to_close(raw, tickers)),
+                     timeit(lambda: app._parse_yf_to_close(raw, tickers))))
+    report("parse: _parse_yf_to_close", rows)
+
+
+def bench_normalize():
+    """normalize_data: 컬럼별 dropna 기준값 + 연산마다 복사 vs 단일 버퍼 리베이스 (1년/10년/20년)"""
+    for n_days in (250, N_DAYS, N_DAYS * 2):
+        rows = []
+        for n in TICKER_COUNTS:
+            prices = make_prices(n, n_days)
+            expected = legacy_normalize_data(prices)
+            pd.testing.assert_frame_equal(app.normalize_data(prices), expected)
+            rows.append((n,
+                         timeit(lambda: legacy_normalize_data(prices)),
+                         timeit(lambda: app.normalize_data(prices))))
+            print(f"  {n} tickers float32: {timeit(lambda: app.normalize_data(prices, dtype=np.float32)):.1f} ms")
+        report(f"normalize: normalize_data ({n_days}일)", rows)
+
+
+def bench_rs():
+    """calculate_relative_strength: 컬럼별 루프 vs 행렬 브로드캐스트"""
+    rows = []
+    for n in TICKER_COUNTS:
+        prices = make_prices(n + 1)
+        bench = prices.columns[0]
+        expected = legacy_calculate_relative_strength(prices, bench)
+        pd.testing.assert_frame_equal(app.calculate_relative_strength(prices, bench), expected)
+        rows.append((n,
+                     timeit(lambda: legacy_calculate_relative_strength(prices, bench)),
+                     timeit(lambda: app.calculate_relative_strength(prices, bench))))
+    report("rs: calculate_relative_strength", rows)
+
+
+def bench_streak():
+    """calculate_outperform_days / calculate_streak_history: 컬럼별 루프 vs 배열 연산 연속 구간 계산"""
+    rows, history_rows = [], []
+    for n in TICKER_COUNTS:
+        prices = make_prices(n + 1)
+        relative = app.calculate_relative_strength(prices, prices.columns[0])
+        relative.iloc[::17, ::3] = np.nan  # 중간 결측 (연속을 끊지 않고 건너뛰는지 확인)
+        assert app.calculate_outperform_days(relative) == legacy_calculate_outperform_days(relative)
+        pd.testing.assert_frame_equal(app.calculate_streak_history(relative),
+                                      legacy_calculate_streak_history(relative))
+        rows.append((n,
+                     timeit(lambda: legacy_calculate_outperform_days(relative), repeat=1),
+                     timeit(lambda: app.calculate_outperform_days(relative))))
+        history_rows.append((n,
+                             timeit(lambda: legacy_calculate_streak_history(relative), repeat=1),
+                             timeit(lambda: app.calculate_streak_history(relative))))
+    report("streak: calculate_outperform_days", rows)
+    report("streak: calculate_streak_history", history_rows)
+
+
+def bench_expiry():
+    """cache_expiry: 고정 시각별 만료 시각 검증 (장전/장중/정산 경계/주말/휴장일) + 호출 시간"""
+    kr, us = ZoneInfo("Asia/Seoul"), ZoneInfo("America/New_York")
+    cases = [
+        # (티커, 현재 시각, 기대 만료 시각) - 현지 시각
+        ("005930.KS", datetime(2026, 10, 19, 8, 0, tzinfo=kr), datetime(2026, 10, 19, 9, 0, tzinfo=kr)),       # 장전
+        ("005930.KS", datetime(2026, 10, 19, 10, 0, tzinfo=kr), datetime(2026, 10, 19, 10, 15, tzinfo=kr)),    # 장중 TTL
+        ("005930.KS", datetime(2026, 10, 19, 15, 50, tzinfo=kr), datetime(2026, 10, 19, 16, 0, tzinfo=kr)),    # 정산 시각에서 자름
+        ("005930.KS", datetime(2026, 10, 19, 16, 0, tzinfo=kr), datetime(2026, 10, 20, 9, 0, tzinfo=kr)),      # 정산 경계
+        ("005930.KS", datetime(2026, 10, 16, 17, 0, tzinfo=kr), datetime(2026, 10, 19, 9, 0, tzinfo=kr)),      # 금요일 마감 → 월요일
+        ("005930.KS", datetime(2026, 10, 9, 10, 0, tzinfo=kr), datetime(2026, 10, 12, 9, 0, tzinfo=kr)),       # 휴장일 (한글날)
+        ("005930.KS", datetime(2026, 12, 30, 17, 0, tzinfo=kr), datetime(2027, 1, 4, 9, 0, tzinfo=kr)),        # 연말 휴장 + 신정
+        ("005930.KS", datetime(2027, 2, 5, 16, 30, tzinfo=kr), datetime(2027, 2, 10, 9, 0, tzinfo=kr)),        # 설 연휴 (2027)
+        ("^KS11", datetime(2027, 9, 13, 16, 30, tzinfo=kr), datetime(2027, 9, 17, 9, 0, tzinfo=kr)),           # 추석 연휴 (2027)
+        ("AAPL", datetime(2026, 11, 25, 17, 0, tzinfo=us), datetime(2026, 11, 27, 9, 30, tzinfo=us)),          # 미국 휴장일
+    ]
+    for ticker, now, expected in cases:
+        got = app.cache_expiry(ticker, now.timestamp())
+        assert got == expected.timestamp(), (ticker, now, datetime.fromtimestamp(got, now.tzinfo))
+    stamps = [now.timestamp() for _, now, _ in cases]
+    call_ms = timeit(lambda: [app.cache_expiry(ticker, s) for (ticker, _, _), s in zip(cases, stamps)], repeat=20)
+    print(f"\n[expiry: cache_expiry 고정 시각 {len(cases)}건 통과]")
+    print(f"  호출당 {call_ms / len(cases) * 1000:.1f} µs")
+
+
+def bench_cube():
+    """기간 전환: 기간마다 tail→ffill/bfill→RS 재계산 vs RSCube 조회 (전 기간 합계)"""
+    rows = []
+    periods = list(app.PERIOD_OPTIONS.values())
+    for n in TICKER_COUNTS[:3]:
+        prices = make_prices(n + 1)
+        bench = prices.columns[0]
+        # 중간 결측 (거래정지 흉내, 벤치마크 제외)
+        holes = np.random.default_rng(1).random(prices.shape) < 0.01
+        holes[:, 0] = False
+        prices = prices.mask(holes)
+        cube = app.RSCube(prices, bench, dtype=np.float64)
+        for p in periods:
+            pd.testing.assert_frame_equal(cube.relative(p),
+                                          app.calculate_relative_strength(prices.tail(p).ffill().bfill(), bench),
+                                          check_exact=True)
+        # 짧은 이력으로 만든 큐브는 앞쪽 이력이 채워지면(긴 기간 선택) 이어 붙이지 않고 새로 만든다
+        assert not app.RSCube(prices.iloc[-600:], bench).update(prices)
+
+        def recompute():
+            for p in periods:
+                app.calculate_relative_strength(prices.tail(p).ffill().bfill(), bench)
+
+        def lookup():
+            for p in periods:
+                cube.relative(p)
+
+        rows.append((n, timeit(recompute), timeit(lookup)))
+        print(f"  build {n} tickers: {timeit(lambda: app.RSCube(prices, bench), repeat=1):.1f} ms")
+    report("cube: 기간 전환 (18개 기간)", rows)
+
+
+def assert_state_matches(state, window, bench):
+    """RSState.latest()가 창 전체 재계산(ffill/bfill → RS → 연속 일수)과 같은지 확인"""
+    filled = window.ffill().bfill()
+    relative = app.calculate_relative_strength(filled, bench)
+    expected = pd.DataFrame.from_dict(app.calculate_outperform_days(relative), orient='index')
+    latest = state.latest()
+    pd.testing.assert_frame_equal(latest[['days', 'status', 'relative_return']].astype({'relative_return': float}),
+                                  expected[['days', 'status', 'relative_return']].astype({'relative_return': float}),
+                                  check_dtype=False)
+    stock_return = np.round((filled.iloc[-1] / filled.iloc[0] - 1) * 100, 1)
+    np.testing.assert_array_equal(latest['return'].to_numpy(), stock_return[latest.index].to_numpy())
+
+
+def bench_incremental():
+    """장중 갱신 (마지막 봉 교체): 창 전체 ffill/bfill→RS→연속 일수 재계산 vs RSState 증분 갱신
+
+    증분 갱신은 창 시작일이 그대로일 때만 된다 - 마지막 봉 교체(장중)와 이력이 기간보다 짧은 창의
+    새 봉 추가. 기간이 꽉 찬 창에 새 거래일이 오면 창 시작일(기준가)이 밀려 과거 상대수익률의
+    부호가 모두 바뀔 수 있으므로 RSState를 새로 만든다 (get_rs_state).
+    """
+    rows = []
+    for n in TICKER_COUNTS:
+        prices = make_prices(n + 1)
+        bench = prices.columns[0]
+        window = prices.tail(250)
+        updated = window.copy()
+        updated.iloc[-1, 1:] *= 1.01
+        # 새 봉 추가 (같은 시작일) → 마지막 봉 교체 순서로 재계산 결과와 비교
+        state = app.RSState(window.iloc[:-1], bench)
+        assert state.sync(window)
+        assert_state_matches(state, window, bench)
+        assert state.sync(updated)
+        assert_state_matches(state, updated, bench)
+        # 창이 밀리면 증분 갱신하지 않음
+        assert not app.RSState(prices.iloc[-251:-1], bench).sync(window)
+        state = app.RSState(window, bench)
+
+        def recompute():
+            relative = app.calculate_relative_strength(updated.ffill().bfill(), bench)
+            app.calculate_outperform_days(relative)
+
+        def incremental():
+            assert state.sync(updated)
+            state.latest()
+
+        rows.append((n, timeit(recompute), timeit(incremental)))
+    report("incremental: 마지막 봉 교체 (1년 창)", rows)
+
+
+def bench_prev():
+    """탭3 이전 기간 창: 티커별 DataFrame 재구성→ffill/bfill→RS 재계산 vs RSCube 창 슬라이스"""
+    rows = []
+    period = app.PERIOD_OPTIONS['1년']
+    for n in TICKER_COUNTS[:3]:
+        prices = make_prices(n + 1)
+        bench = prices.columns[0]
+        holes = np.random.default_rng(1).random(prices.shape) < 0.01
+        holes[:, 0] = False
+        prices = prices.mask(holes)
+        names = {bench: bench, **{c: f"[S]{c}" for c in prices.columns[1:]}}
+        cube = app.RSCube(prices.rename(columns=names), bench)
+        selected = list(names.values())[1:]
+
+        def legacy():
+            prev_batch = prices.iloc[len(prices) - 2 * period:len(prices) - period]
+            prev_data = pd.DataFrame(index=prev_batch.index)
+            for ticker, display_name in names.items():
+                prev_data[display_name] = prev_batch[ticker]
+            prev_data = prev_data.ffill().bfill()
+            return prev_data, app.calculate_relative_strength(prev_data[[bench] + selected], bench)
+
+        def view():
+            return cube.prices(period, selected, back=1), cube.relative(period, selected, back=1)
+
+        (exp_prices, exp_relative), (got_prices, got_relative) = legacy(), view()
+        pd.testing.assert_frame_equal(got_prices, exp_prices[[bench] + selected], check_exact=True, check_freq=False)
+        pd.testing.assert_frame_equal(got_relative, exp_relative, check_exact=True, check_freq=False)
+        rows.append((n, timeit(legacy), timeit(view)))
+    report("prev: 이전 기간 창 (1년)", rows)
+
+
+def bench_memory():
+    """RSCube 공유 메모리: float64 vs float32 (컴팩트 모드) 보관 크기와 생성 시간
+
+    float32 큐브 값은 float64 재계산과 비교한다. 미리 계산해 둔 기간 창(back=0)은 float64로
+    계산한 뒤 저장만 float32라 상대 오차 1e-6 이내, float32 가격으로 다시 계산하는 이전 창
+    (back=1)은 소수 첫째 자리 반올림 경계에서 0.1까지 달라질 수 있다.
+    """
+    print("\n[memory: RSCube 보관 크기]")
+    print(f"{'tickers':>8} {'float64(MB)':>12} {'float32(MB)':>12} {'build32(ms)':>12}")
+    for n in TICKER_COUNTS[:3]:
+        prices = make_prices(n + 1)
+        bench = prices.columns[0]
+        cube32 = app.RSCube(prices, bench, dtype=np.float32)
+        for p in app.PERIOD_OPTIONS.values():
+            window = prices.tail(p).ffill().bfill()
+            expected = app.calculate_relative_strength(window, bench)
+            np.testing.assert_allclose(cube32.relative(p).to_numpy(np.float64), expected.to_numpy(),
+                                       rtol=1e-6, atol=1e-6)
+            np.testing.assert_allclose(cube32.prices(p).to_numpy(np.float64), window.to_numpy(), rtol=1e-6)
+        period = app.PERIOD_OPTIONS['1년']
+        prev = prices.iloc[len(prices) - 2 * period:len(prices) - period].ffill().bfill()
+        np.testing.assert_allclose(cube32.relative(period, back=1).to_numpy(np.float64),
+                                   app.calculate_relative_strength(prev, bench).to_numpy(), rtol=0, atol=0.1 + 1e-6)
+        full = app.RSCube(prices, bench, dtype=np.float64).nbytes / 2 ** 20
+        compact = app.RSCube(prices, bench, dtype=np.float32).nbytes / 2 ** 20
+        build_ms = timeit(lambda: app.RSCube(prices, bench, dtype=np.float32), repeat=1)
+        print(f"{n:>8} {full:>12.1f} {compact:>12.1f} {build_ms:>12.1f}")
+
+
+def bench_rating():
+    """RS 등급: 종목별 기간 수익률 루프 + 순위 vs 전체 종목 배열 연산 (1년6개월 이력)
+
+    등급은 기존 루프 결과와 같아야 하고, 장중 갱신(마지막 봉 교체) 뒤 다시 만든 등급표도 같은 루프
+    결과와 같아야 한다.
+    """
+    rows = []
+    for n in TICKER_COUNTS + (5000,):
+        prices = make_prices(n, 378, nan_ratio=0.3)
+
+        def legacy(prices=prices):
+            scores = {}
+            for col in prices.columns:
+                series = prices[col].ffill()
+                weighted = [(w, (series.iloc[-1] / series.iloc[-1 - h] - 1) * 100)
+                            for h, w in app.RS_RATING_WEIGHTS if not np.isnan(series.iloc[-1 - h])]
+                if weighted:
+                    scores[col] = sum(w * r for w, r in weighted) / sum(w for w, _ in weighted)
+            return (pd.Series(scores).rank(pct=True) * 99).apply(np.ceil)
+
+        def assert_matches(prices):
+            expected = legacy(prices)
+            rating = pd.Series(app.calculate_rs_rating(prices)[2], index=prices.columns)
+            pd.testing.assert_series_equal(rating[expected.index], expected, check_names=False)
+            assert rating.drop(expected.index).isna().all()
+            universe = pd.DataFrame({'code': prices.columns, 'name': prices.columns, 'market': 'kospi'})
+            table = app.build_rs_rating_table(prices, universe)
+            pd.testing.assert_series_equal(table['rating'].sort_index(), expected.astype(int).sort_index(),
+                                           check_names=False, check_index_type=False)
+
+        if n <= 500:
+            assert_matches(prices)
+            intraday = prices.copy()
+            intraday.iloc[-1] *= np.random.default_rng(2).uniform(0.95, 1.05, n)
+            assert_matches(intraday)
+        rows.append((n, timeit(legacy, repeat=1), timeit(lambda: app.calculate_rs_rating(prices))))
+    report("rating: 전체 종목 RS 등급", rows)
+
+
+def bench_beta():
+    """롤링 베타/상관: pandas 컬럼별 rolling cov/var + 창 상관행렬 vs RollingStats (10년, 60일 창)
+
+    합계 행렬은 pandas의 온라인 공분산과 더하는 순서가 달라 부동소수점 오차만큼 차이가 난다
+    (상대 1e-6, 절대 1e-9 허용). 장중 갱신(마지막 봉 교체)과 새 봉 추가 뒤에도 같은 기준으로 비교한다.
+    """
+    rows = []
+    for n in TICKER_COUNTS[:3]:
+        prices = make_prices(n + 1)
+        bench = prices.columns[0]
+        updated = prices.copy()
+        updated.iloc[-1, 1:] *= 1.01
+
+        def legacy(prices=prices):
+            returns = prices.ffill().pct_change(fill_method=None)
+            y = returns[bench]
+            beta = {}
+            for col in returns.columns[1:]:
+                x = returns[col]
+                y_masked = y + 0 * x
+                beta[col] = (x + 0 * y).rolling(60).cov(y_masked) / y_masked.rolling(60).var()
+            return pd.DataFrame(beta), returns.tail(60).corr(min_periods=3)
+
+        def assert_matches(stats, prices):
+            beta, matrix = legacy(prices)
+            close = dict(rtol=1e-6, atol=1e-9, check_freq=False)
+            pd.testing.assert_frame_equal(stats.beta_history(), beta, **close)
+            pd.testing.assert_frame_equal(stats.correlation(), matrix, **close)
+            latest = stats.latest()
+            pd.testing.assert_series_equal(latest['beta'], beta.iloc[-1], check_names=False, **close)
+            # 최근 창 상관계수는 창 안 유효일이 min_periods 이상인 종목만 값이 있음
+            corr = matrix.loc[latest.index, bench].where(beta.iloc[-1].notna())
+            pd.testing.assert_series_equal(latest['correlation'], corr, check_names=False, **close)
+
+        def engine():
+            stats = app.RollingStats(prices, bench, 60)
+            stats.beta_history()
+            stats.correlation()
+
+        stats = app.RollingStats(prices.iloc[:-1], bench, 60)
+        assert_matches(stats, prices.iloc[:-1])
+        assert stats.update(prices)
+        assert_matches(stats, prices)
+        assert stats.update(updated)
+        assert_matches(stats, updated)
+        stats = app.RollingStats(prices, bench, 60)
+        rows.append((n, timeit(legacy, repeat=1), timeit(engine)))
+        print(f"  {n} tickers 장중 갱신: {timeit(lambda: stats.update(updated)):.2f} ms")
+    report("beta: 롤링 베타 이력 + 상관행렬", rows)
+
+
+def brute_force_search(index, query, markets=None):
+    """InstrumentIndex.search 기준 결과 - 전 종목을 직접 훑어 티커 일치 → 접두어 → 부분 문자열 순"""
+    query = app._search_key(query)
+    if not query:
+        return []
+    choseong = app._is_choseong_query(query)
+    ranked = []
+    for i, (code, name, market) in enumerate(zip(index.codes, index.names, index.markets)):
+        if markets is not None and market not in markets:
+            continue
+        code, name = app._search_key(code), app._search_key(name)
+        base = code.split('.')[0]
+        name = app._choseong(name) if choseong else name
+        if query in (code, base):
+            rank = 0
+        elif name.startswith(query) or code.startswith(query) or base.startswith(query):
+            rank = 1
+        elif len(query) >= 2 and (query in name or query in code):
+            rank = 2
+        else:
+            continue
+        ranked.append((rank, i))
+    # 티커 일치는 첫 종목 하나만, 나머지는 접두어 순위로
+    exact = min((i for rank, i in ranked if rank == 0), default=None)
+    results, seen = [], set()
+    for _, i in sorted((0 if i == exact else max(rank, 1), i) for rank, i in ranked):
+        base = app._search_key(index.codes[i]).split('.')[0]
+        if base not in seen:
+            seen.add(base)
+            results.append({"code": index.codes[i], "name": index.names[i]})
+    return results
+
+
+def random_queries(instruments, count, seed=0):
+    """종목명 부분 문자열/초성, 코드 앞부분, 대소문자·공백 변형, 아무 것도 안 걸리는 검색어"""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(count):
+        row = instruments.iloc[rng.integers(len(instruments))]
+        name, code = row['name'], row['code']
+        start = rng.integers(len(name))
+        part = name[start:start + rng.integers(1, 5)]
+        kind = rng.integers(5)
+        if kind == 0:
+            queries.append(part)
+        elif kind == 1:
+            queries.append(app._choseong(part))
+        elif kind == 2:
+            queries.append(code[:rng.integers(1, len(code) + 1)])
+        elif kind == 3:
+            queries.append(f" {part.upper()} ")
+        else:
+            queries.append("".join(rng.choice(list("abcxyzㄱㄴ가나"), rng.integers(1, 4))))
+    return queries
+
+
+def bench_search():
+    """종목 검색: 매 호출 목록 선형 탐색 vs InstrumentIndex (접두어/n-gram/초성/티커)
+
+    색인 결과는 전 종목을 직접 훑는 brute_force_search와 순서까지 같아야 한다 (임의 검색어, 시장 필터 포함).
+    """
+    rows = []
+    for n in (1000, 10000, 40000):
+        instruments = make_instruments(n)
+        records = instruments.to_dict("records")
+        start = time.perf_counter()
+        index = app.InstrumentIndex(instruments)
+        build_ms = (time.perf_counter() - start) * 1000
+        if n <= 10000:
+            for i, q in enumerate(random_queries(instruments, 300)):
+                markets = (None, app.REGION_MARKETS['kr'], app.REGION_MARKETS['us'])[i % 3]
+                expected = brute_force_search(index, q, markets)
+                assert index.search(q, markets=markets, limit=len(index)) == expected, q
+                assert index.search(q, markets=markets) == expected[:15], q
+        sample = instruments["name"].iloc[n // 2]
+        queries = [sample[:2], sample[1:4], app._choseong(sample[:3]), instruments["code"].iloc[n // 3][:4], "ab"]
+
+        def legacy():
+            for q in queries:
+                q_lower = q.lower()
+                [r for r in records if q_lower in r["name"].lower() or q_lower in r["code"].lower()][:15]
+
+        def indexed():
+            for q in queries:
+                index.search(q)
+
+        rows.append((n, timeit(legacy) / len(queries), timeit(indexed, repeat=20) / len(queries)))
+        print(f"  {n} 종목 색인 생성: {build_ms:.0f} ms")
+    report("search: 검색어 1회 (ms)", rows)
+
+
+def bench_ranking():
+    """탭3 랭킹표: 종목별 루프 + iterrows 보완/순위 변동 vs 배열 연산 랭킹 엔진 (이전+현재 기간)"""
+    rows = []
+    for n in TICKER_COUNTS:
+        prices = make_prices(n + 1, 500)
+        prices.columns = [prices.columns[0]] + [f"[S{i % 12}]{c}" for i, c in enumerate(prices.columns[1:])]
+        bench = prices.columns[0]
+        now = prices.tail(250).ffill().bfill()
+        prev = prices.head(250).ffill().bfill().drop(columns=prices.columns[1:n // 10 + 2])
+        rel_now = app.calculate_relative_strength(now, bench)
+        rel_prev = app.calculate_relative_strength(prev, bench)
+
+        def legacy():
+            ranking_now = legacy_create_ranking_df(now, rel_now)
+            return ranking_now, legacy_rank_table(ranking_now, legacy_create_ranking_df(prev, rel_prev))
+
+        def vectorized():
+            ranking_now = app.create_ranking_df(now, rel_now)
+            ranking_prev = app.fill_missing_ranking(ranking_now, app.create_ranking_df(prev, rel_prev))
+            return ranking_now, (ranking_prev, app.calculate_rank_changes(ranking_now, ranking_prev))
+
+        (exp_now, (exp_prev, exp_changes)), (got_now, (got_prev, got_changes)) = legacy(), vectorized()
+        pd.testing.assert_frame_equal(got_now, exp_now)
+        pd.testing.assert_frame_equal(got_prev, exp_prev)
+        assert list(got_changes) == exp_changes
+        rows.append((n, timeit(legacy, repeat=1), timeit(vectorized)))
+    report("ranking: 탭3 랭킹표 (이전+현재)", rows)
+
+
+def bench_registry():
+    """섹터/ETF 필터 + 트레이스 색상: 종목명 키워드 검사·표시 이름 파싱 vs InstrumentRegistry 번호 열"""
+    rows = []
+    for n in (200, 2000, 20000):
+        instruments = make_instruments(n)
+        instruments.loc[::7, "name"] = "KODEX " + instruments.loc[::7, "name"]
+        sector_names = [f"S{i}" for i in range(24)]
+        sectors = {s: {"kospi": [], "kosdaq": [], "us": []} for s in sector_names}
+        for i, (code, name, market) in enumerate(instruments.itertuples(index=False)):
+            sectors[sector_names[i % 24]][market].append({"code": code, "name": name})
+        registry = app.InstrumentRegistry((sectors,))
+        selected = sector_names[::2]
+
+        def legacy():
+            ticker_info = {}
+            for sector_name in selected:
+                for stock in sectors[sector_name]["kospi"]:
+                    if not any(kw in stock["name"] for kw in app.ETF_KEYWORDS):
+                        continue
+                    ticker_info.setdefault(stock["code"], f"[{sector_name}]{stock['name']}")
+            colors = []
+            for col in ticker_info.values():
+                sector = col.split("]")[0] + "]" if "[" in col and "]" in col else None
+                stock_name = col.split("]")[-1] if "]" in col else col
+                if stock_name in app.INDEX_COLORS:
+                    colors.append(app.INDEX_COLORS[stock_name])
+                else:
+                    colors.append(app.SECTOR_COLORS.get(sector.strip("[]"), app.DEFAULT_COLOR) if sector else app.DEFAULT_COLOR)
+            groups = {s: [c for c in ticker_info.values() if f"[{s}]" in c] for s in selected}
+            return list(ticker_info.values()), colors, groups
+
+        def registry_lookup():
+            rows = registry.select("kospi", selected, etf_only=True)
+            _, first = np.unique(registry.codes[rows], return_index=True)
+            meta = registry.meta.iloc[rows[np.sort(first)]]
+            labels, sector_id = meta.index.to_numpy(), meta["sector_id"].to_numpy()
+            groups = {s: list(labels[sector_id == i]) for s, i in zip(selected, registry.sector_ids(selected))}
+            return list(labels), list(meta["color"]), groups
+
+        assert legacy() == registry_lookup()
+        rows.append((n, timeit(legacy), timeit(registry_lookup)))
+    report("registry: 섹터/ETF 필터 + 색상/그룹 (ms)", rows)
+
+
+def bench_composite():
+    """섹터 합성 지수: 섹터별 pandas pct_change/평균/cumprod vs SectorComposite (생성 + 새 봉 반영)"""
+    rows = []
+    for n in TICKER_COUNTS:
+        prices = make_prices(n)
+        groups = np.array([f"S{i % 24}" for i in range(n)], dtype=object)
+
+        def legacy():
+            filled = prices.ffill()
+            returns = filled.pct_change(fill_method=None).iloc[1:]
+            levels = {}
+            for sector in pd.unique(groups):
+                sector_return = returns.loc[:, groups == sector].mean(axis=1).fillna(0)
+                levels[sector] = 100 * np.concatenate([[1.0], np.cumprod(1 + sector_return.to_numpy())])
+            return pd.DataFrame(levels, index=prices.index)
+
+        composite = app.SectorComposite(prices.iloc[:-1], groups)
+        expected = legacy()
+        composite.update(prices)
+        np.testing.assert_allclose(composite.levels().to_numpy(), expected.to_numpy(), rtol=1e-9)
+        update_ms = timeit(lambda: composite.update(prices), repeat=10)
+        rows.append((n, timeit(legacy), timeit(lambda: app.SectorComposite(prices, groups))))
+        print(f"  {n} 종목 새 봉 반영: {update_ms:.2f} ms")
+    report("composite: 섹터 합성 지수 (동일가중+시총가중, 10년)", rows)
+
+
+def bench_screen():
+    """조건 검색: 랭킹표 재계산 + 연속 일수 dict 순회 vs 미리 만든 열 테이블에 screen()"""
+    rows = []
+    where = "days >= 5 and relative_return > 3"
+    for n in TICKER_COUNTS:
+        window = make_prices(n + 1, 60).ffill().bfill()
+        bench = window.columns[0]
+        relative = app.calculate_relative_strength(window, bench)
+        table = app.build_screen_table(window, bench, relative=relative)
+
+        def legacy():
+            ranking = app.create_ranking_df(window, relative)
+            streaks = app.calculate_outperform_days(relative)
+            hits = [name for name, rel in zip(ranking['_full_name'], ranking['상대수익률'])
+                    if streaks[name]['status'] == '🔥 주도' and streaks[name]['days'] >= 5 and rel > 3]
+            return sorted(hits)
+
+        assert legacy() == sorted(app.screen(table, where).index)
+        numeric = table[['return', 'relative_return']]
+        assert not (np.signbit(numeric) & (numeric == 0)).any().any()
+        rows.append((n, timeit(legacy), timeit(lambda: app.screen(table, where, "relative_return desc", 50), repeat=20)))
+    report("screen: 조건 검색 1회 (ms)", rows)
+    assert_screen_parsing()
+
+
+def assert_screen_parsing():
+    """조건/정렬식 해석 경계 사례 - 따옴표 안 쉼표·and, 문자 컬럼 크기 비교, NaN, 잘못된 정렬 방향"""
+    table = pd.DataFrame({'kind': 'stock', 'sector': ['반도체', np.nan, '금융, 보험', 'A and B'],
+                          'name': ['a', 'b', 'c', 'd'], 'return': [1.0, np.nan, -2.0, 3.0],
+                          'relative_return': [0.5, 1.0, np.nan, -1.0], 'days': [3, -2, 0, 5]},
+                         index=list('abcd'))
+    assert list(app.screen(table, 'sector == "금융, 보험", days >= 0').index) == ['c']
+    assert list(app.screen(table, "sector == 'A and B'").index) == ['d']
+    assert list(app.screen(table, 'sector != 반도체').index) == ['c', 'd']
+    assert list(app.screen(table, 'return != 1').index) == ['c', 'd']
+    assert list(app.screen(table, None, "relative_return desc, -days").index) == ['b', 'a', 'd', 'c']
+    for where, sort in [('sector > 가', None), ('name <= b', None), ('sector == "금융', None),
+                        (None, 'days desc asc'), (None, 'days down')]:
+        try:
+            app.screen(table, where, sort)
+        except ValueError:
+            continue
+        raise AssertionError(f"ValueError 없음: {where!r} {sort!r}")
+
+
+class RecordingReplayProvider(app.ReplayProvider):
+    """요청(티커 묶음, 시작일)을 기록하고, gate가 닫혀 있으면 열릴 때까지 기다리는 재생 공급자"""
+
+    def __init__(self, path, gate=None):
+        super().__init__(path)
+        self.gate = gate
+        self.calls = []
+
+    def download_close(self, tickers, start_date, end_date=None):
+        if self.gate is not None:
+            self.gate.wait()
+        self.calls.append((tuple(tickers), str(start_date)[:10]))
+        return super().download_close(tickers, start_date, end_date)
+
+
+def replay_provider(prices, directory, name, gate=None):
+    """prices를 재생 파일로 저장하고 그 파일을 돌려주는 공급자"""
+    path = os.path.join(directory, f"{name}.csv")
+    app.write_replay_file(prices, path)
+    return RecordingReplayProvider(path, gate)
+
+
+@contextmanager
+def replay_backend(provider, store):
+    """get_batch_stock_data_partial이 쓰는 공급자/저장소/캐시/갱신 스레드를 재생용으로 바꿔 끼움"""
+    cache, flights = app.SeriesCache(expiry=lambda ticker, now: now + 3600), app.SingleFlight()
+    refresher = app.BackgroundRefresher(provider, cache, store, flights, interval_seconds=3600)
+    with mock.patch.object(app, "get_price_provider", return_value=provider), \
+            mock.patch.object(app, "get_price_store", return_value=store), \
+            mock.patch.object(app, "get_series_cache", return_value=cache), \
+            mock.patch.object(app, "get_fetch_flights", return_value=flights), \
+            mock.patch.object(app, "get_background_refresher", return_value=refresher):
+        yield cache
+
+
+def assert_stored(store, prices, start, end):
+    """저장소 내용이 재생 파일의 [start, end) 구간과 같은지 확인"""
+    expected = prices[(prices.index >= start) & (prices.index < end)].dropna(how='all')
+    stored = store.read(list(prices.columns), start, end)
+    pd.testing.assert_frame_equal(stored, expected, check_freq=False)
+
+
+def assert_io_paths(directory):
+    """재생 공급자 + 임시 저장소로 I/O 경로 확인
+
+    - 처음 받기 / 증분 추가(기준 봉부터만) / 분할로 과거 종가가 바뀐 티커만 전체 재다운로드
+    - 빈 결과 티커는 구간 기록 없이 실패로 남고 캐시에 새 데이터로 들어가지 않음
+    - _merge_recent_bars, _adjusted_tickers, SingleFlight
+    - 청크 마감: 마감을 넘긴 청크는 pending, 계속 받아서 다음 요청에 바로 보임 (중복 다운로드 없음)
+    """
+    prices = make_prices(20, 300)
+    tickers = list(prices.columns)
+    start, end = str(prices.index[0].date()), str((prices.index[-1] + pd.Timedelta(days=1)).date())
+    store = app.PriceStore(os.path.join(directory, "store.sqlite3"))
+
+    # 처음 받기 → 전체 구간 한 번
+    day1 = replay_provider(prices.iloc[:-5], directory, "day1")
+    fetched, reset, empty = app._fetch_to_store(day1, store, tickers, start, end)
+    assert day1.calls == [(tuple(tickers), start)] and reset == [] and empty == []
+    assert_stored(store, prices.iloc[:-5], start, end)
+
+    # 새 봉 5개 → 저장된 마지막 바로 앞 봉부터만 받음
+    day2 = replay_provider(prices, directory, "day2")
+    fetched, reset, empty = app._fetch_to_store(day2, store, tickers, start, end)
+    assert day2.calls == [(tuple(tickers), str(prices.index[-7].date()))] and reset == [] and empty == []
+    assert list(fetched.index) == list(prices.index[-7:])
+    assert_stored(store, prices, start, end)
+
+    # 분할 (과거 종가 전체 소급 조정) → 그 티커만 저장 이력 삭제 후 전체 구간 재다운로드
+    split = prices.copy()
+    split[tickers[3]] /= 2
+    day3 = replay_provider(split, directory, "day3")
+    fetched, reset, empty = app._fetch_to_store(day3, store, tickers, start, end)
+    assert reset == [tickers[3]] and empty == []
+    assert day3.calls[-1] == ((tickers[3],), start)
+    assert_stored(store, split, start, end)
+    anchors = store.anchors(tickers)
+    assert app._adjusted_tickers(split.iloc[-2:], anchors) == []
+    nudged = split.iloc[-2:] * (1 + app.PRICE_ADJUST_TOLERANCE / 2)
+    assert app._adjusted_tickers(nudged, anchors) == []
+
+    # 빈 결과 (재생 파일에 없는 티커) → 실패, 구간 기록 없음, 캐시는 재시도 시각에 만료
+    cache = app.SeriesCache(expiry=lambda ticker, now: now + 3600, retry_seconds=60)
+    columns, empty = app._refresh_series(day3, cache, store, [tickers[0], "MISSING"], start, end)
+    assert empty == ["MISSING"] and list(columns) == [tickers[0]]
+    assert "MISSING" not in store.coverage(["MISSING"])
+    assert cache.failed([tickers[0], "MISSING"]) == ["MISSING"]
+    assert cache.expiring([tickers[0], "MISSING"], 60) == ["MISSING"]
+
+    # 최근 봉 이어 붙이기 (겹치는 날짜는 최근 값 우선)
+    base = prices[tickers[0]].iloc[:-3]
+    recent = prices[tickers[0]].iloc[-5:] * 1.01
+    merged = app._merge_recent_bars(base, recent)
+    pd.testing.assert_series_equal(merged, pd.concat([base.iloc[:-2], recent]), check_freq=False)
+    assert app._merge_recent_bars(base, recent.iloc[:0]) is base
+
+    # SingleFlight: 동시에 들어온 같은 키는 한 번만 실행하고 결과/예외를 함께 받음
+    flights, barrier, runs, results = app.SingleFlight(), threading.Barrier(8), [], []
+
+    def slow():
+        runs.append(1)
+        time.sleep(0.2)
+        return object()
+
+    def call():
+        barrier.wait()
+        results.append(flights.do("key", slow))
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(runs) == 1 and len(results) == 8 and len({id(r) for r in results}) == 1
+
+    # 청크 마감: 공급자가 막혀 있으면 전부 pending → 풀리면 같은 청크를 다시 받지 않고 전부 도착
+    gate = threading.Event()
+    slow_provider = replay_provider(prices, directory, "gated", gate)
+    slow_store = app.PriceStore(os.path.join(directory, "gated.sqlite3"))
+    with replay_backend(slow_provider, slow_store):
+        try:
+            data, report_ = app.get_batch_stock_data_partial(tuple(tickers), start, end, deadline_seconds=0.2)
+            assert data.empty and sorted(report_['pending']) == tickers and report_['missing'] == []
+        finally:
+            gate.set()
+        data, report_ = app.get_batch_stock_data_partial(tuple(tickers), start, end, deadline_seconds=None)
+    assert report_ == {'missing': [], 'pending': [], 'stale': [], 'failed': [], 'refresh_failed': []}
+    pd.testing.assert_frame_equal(data, prices, check_freq=False)
+    chunks = (len(tickers) + app.FETCH_CHUNK_SIZE - 1) // app.FETCH_CHUNK_SIZE
+    assert len(slow_provider.calls) == chunks
+
+
+def bench_io():
+    """가격 I/O: 재생 공급자 + 임시 SQLite로 증분/분할/빈 결과/마감 처리 확인, 증분 갱신 1회 시간 (10년)
+
+    재생 공급자는 네트워크 비용이 없으므로 전체 재다운로드와의 시간 비교 대신 받은 봉 수를 함께 보여준다.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        assert_io_paths(directory)
+        print("\n[io: 재생 공급자 I/O 경로 확인 통과]")
+        for n in TICKER_COUNTS[:3]:
+            prices = make_prices(n)
+            tickers = list(prices.columns)
+            start, end = str(prices.index[0].date()), str((prices.index[-1] + pd.Timedelta(days=1)).date())
+            provider = replay_provider(prices, directory, f"io{n}")
+            store = app.PriceStore(os.path.join(directory, f"io{n}.sqlite3"))
+            app._fetch_to_store(provider, store, tickers, start, end)
+            fetched = app._fetch_to_store(provider, store, tickers, start, end)[0]
+            ms = timeit(lambda: app._fetch_to_store(provider, store, tickers, start, end), repeat=1)
+            print(f"  {n} tickers 증분 갱신: {ms:.1f} ms (받은 봉 {fetched.count().sum()} / 전체 {prices.count().sum()})")
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "normalize": bench_normalize,
+    "rs": bench_rs,
+    "streak": bench_streak,
+    "expiry": bench_expiry,
+    "cube": bench_cube,
+    "prev": bench_prev,
+    "memory": bench_memory,
+    "ranking": bench_ranking,
+    "rating": bench_rating,
+    "beta": bench_beta,
+    "search": bench_search,
+    "registry": bench_registry,
+    "composite": bench_composite,
+    "screen": bench_screen,
+    "incremental": bench_incremental,
+    "io": bench_io,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -6,14 +6,28 @@
 2. streamlit run kospi_sector_dashboard.py
 """
 
+import bisect
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import yfinance as yf
 import warnings
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
+
 
 # ========================================================================================
 # 페이지 설정
@@ -461,6 +475,185 @@ SECTORS_US = {
     },
 }
 
+# 종목 검색 기본 목록 (전체 상장 목록 파일이 없어도 검색되는 종목)
+KR_SEARCH_STOCKS = [
+    {"code": "005930.KS", "name": "삼성전자"},
+    {"code": "000660.KS", "name": "SK하이닉스"},
+    {"code": "005380.KS", "name": "현대차"},
+    {"code": "000270.KS", "name": "기아"},
+    {"code": "005490.KS", "name": "POSCO홀딩스"},
+    {"code": "051910.KS", "name": "LG화학"},
+    {"code": "006400.KS", "name": "삼성SDI"},
+    {"code": "035420.KS", "name": "NAVER"},
+    {"code": "035720.KS", "name": "카카오"},
+    {"code": "068270.KS", "name": "셀트리온"},
+    {"code": "207940.KS", "name": "삼성바이오로직스"},
+    {"code": "012450.KS", "name": "한화에어로스페이스"},
+    {"code": "047810.KS", "name": "한국항공우주"},
+    {"code": "079550.KS", "name": "LIG넥스원"},
+    {"code": "042660.KS", "name": "한화오션"},
+    {"code": "329180.KS", "name": "HD현대중공업"},
+    {"code": "009540.KS", "name": "HD한국조선해양"},
+    {"code": "373220.KS", "name": "LG에너지솔루션"},
+    {"code": "247540.KS", "name": "에코프로비엠"},
+    {"code": "086520.KS", "name": "에코프로"},
+    {"code": "003670.KS", "name": "포스코퓨처엠"},
+    {"code": "105560.KS", "name": "KB금융"},
+    {"code": "055550.KS", "name": "신한지주"},
+    {"code": "086790.KS", "name": "하나금융지주"},
+    {"code": "096770.KS", "name": "SK이노베이션"},
+    {"code": "004020.KS", "name": "현대제철"},
+    {"code": "066570.KS", "name": "LG전자"},
+    {"code": "003550.KS", "name": "LG"},
+    {"code": "034730.KS", "name": "SK"},
+    {"code": "017670.KS", "name": "SK텔레콤"},
+    {"code": "030200.KS", "name": "KT"},
+    {"code": "032830.KS", "name": "삼성생명"},
+    {"code": "010950.KS", "name": "S-Oil"},
+    {"code": "009150.KS", "name": "삼성전��"},
+    {"code": "028260.KS", "name": "삼성물산"},
+    {"code": "018260.KS", "name": "삼성에스디에스"},
+    {"code": "000810.KS", "name": "삼성화재"},
+    {"code": "036570.KS", "name": "엔씨소프트"},
+    {"code": "251270.KS", "name": "넷마블"},
+    {"code": "263750.KS", "name": "펄어비스"},
+    {"code": "259960.KS", "name": "크래프톤"},
+    {"code": "352820.KS", "name": "하이브"},
+    {"code": "011200.KS", "name": "HMM"},
+    {"code": "402340.KS", "name": "SK스퀘어"},
+    {"code": "000100.KS", "name": "유한양행"},
+    {"code": "128940.KS", "name": "한미약품"},
+    {"code": "302440.KS", "name": "SK바이오사이언스"},
+    {"code": "326030.KS", "name": "SK바이오팜"},
+    {"code": "010130.KS", "name": "고려아연"},
+    {"code": "011070.KS", "name": "LG이노텍"},
+    {"code": "034220.KS", "name": "LG디스플레이"},
+    {"code": "267250.KS", "name": "HD현대"},
+    {"code": "010620.KS", "name": "HD현대미포"},
+    {"code": "241560.KS", "name": "두산밥캣"},
+    {"code": "042700.KS", "name": "한미반도체"},
+    {"code": "000720.KS", "name": "현대건설"},
+    {"code": "006360.KS", "name": "GS건설"},
+    {"code": "047040.KS", "name": "대우건설"},
+    {"code": "323410.KS", "name": "카카오뱅크"},
+    {"code": "377300.KS", "name": "카카오페이"},
+    {"code": "293490.KS", "name": "카카오게임즈"},
+    {"code": "099320.KQ", "name": "쎄트렉아이"},
+    {"code": "095340.KQ", "name": "ISC"},
+    {"code": "357780.KQ", "name": "솔브레인"},
+    {"code": "041510.KQ", "name": "에스엠"},
+    {"code": "122870.KQ", "name": "와이지엔터테인먼트"},
+    {"code": "035900.KQ", "name": "JYP Ent."},
+    {"code": "293480.KQ", "name": "하나기술"},
+    {"code": "039030.KQ", "name": "이오테크닉스"},
+    {"code": "214150.KQ", "name": "클래시스"},
+    {"code": "145020.KQ", "name": "휴젤"},
+    {"code": "196170.KQ", "name": "알테오젠"},
+    {"code": "028300.KQ", "name": "에이치엘비"},
+    {"code": "067160.KQ", "name": "아프리카TV"},
+    {"code": "240810.KQ", "name": "원익IPS"},
+    {"code": "058470.KQ", "name": "리노공업"},
+    {"code": "272210.KS", "name": "한화시스템"},
+]
+
+US_SEARCH_STOCKS = [
+    # AI/가속기 반도체
+    {"code": "NVDA", "name": "NVIDIA"},
+    {"code": "AVGO", "name": "Broadcom"},
+    {"code": "AMD", "name": "AMD"},
+    # 반도체 파운드리/제조
+    {"code": "TSM", "name": "TSMC"},
+    {"code": "INTC", "name": "Intel"},
+    {"code": "GFS", "name": "GlobalFoundries"},
+    # 반도체 장비
+    {"code": "LRCX", "name": "Lam Research"},
+    {"code": "AMAT", "name": "Applied Materials"},
+    {"code": "KLAC", "name": "KLA Corp"},
+    {"code": "ASML", "name": "ASML"},
+    # 반도체 메모리/스토리지
+    {"code": "MU", "name": "Micron"},
+    {"code": "WDC", "name": "Western Digital"},
+    {"code": "STX", "name": "Seagate"},
+    # 검색/광고플랫폼
+    {"code": "GOOG", "name": "Alphabet"},
+    {"code": "APP", "name": "AppLovin"},
+    {"code": "TTD", "name": "The Trade Desk"},
+    # 소셜/커뮤니티
+    {"code": "META", "name": "Meta"},
+    {"code": "PINS", "name": "Pinterest"},
+    {"code": "SNAP", "name": "Snap"},
+    # 이커머스
+    {"code": "AMZN", "name": "Amazon"},
+    {"code": "PDD", "name": "PDD Holdings"},
+    {"code": "MELI", "name": "MercadoLibre"},
+    # 리테일(오프라인)
+    {"code": "WMT", "name": "Walmart"},
+    {"code": "COST", "name": "Costco"},
+    {"code": "TGT", "name": "Target"},
+    # 클라우드/엔터프라이즈
+    {"code": "MSFT", "name": "Microsoft"},
+    {"code": "ORCL", "name": "Oracle"},
+    {"code": "NOW", "name": "ServiceNow"},
+    # 데이터/AI 분석SW
+    {"code": "PLTR", "name": "Palantir"},
+    {"code": "SNOW", "name": "Snowflake"},
+    {"code": "DDOG", "name": "Datadog"},
+    # 사이버보안
+    {"code": "PANW", "name": "Palo Alto"},
+    {"code": "CRWD", "name": "CrowdStrike"},
+    {"code": "FTNT", "name": "Fortinet"},
+    {"code": "ZS", "name": "Zscaler"},
+    {"code": "NET", "name": "Cloudflare"},
+    # 미디어/스트리밍
+    {"code": "NFLX", "name": "Netflix"},
+    {"code": "CMCSA", "name": "Comcast"},
+    {"code": "ROKU", "name": "Roku"},
+    {"code": "DIS", "name": "Disney"},
+    # 전기차/EV
+    {"code": "TSLA", "name": "Tesla"},
+    {"code": "RIVN", "name": "Rivian"},
+    {"code": "LCID", "name": "Lucid"},
+    {"code": "NIO", "name": "NIO"},
+    # 전력인프라(그리드)
+    {"code": "GEV", "name": "GE Vernova"},
+    {"code": "ETN", "name": "Eaton"},
+    {"code": "CEG", "name": "Constellation Energy"},
+    # 신재생/태양광
+    {"code": "FSLR", "name": "First Solar"},
+    {"code": "ENPH", "name": "Enphase"},
+    {"code": "SEDG", "name": "SolarEdge"},
+    # 로봇
+    {"code": "ISRG", "name": "Intuitive Surgical"},
+    {"code": "SYM", "name": "Symbotic"},
+    {"code": "PRCT", "name": "PROCEPT BioRobotics"},
+    # 양자컴퓨팅
+    {"code": "IONQ", "name": "IonQ"},
+    {"code": "RGTI", "name": "Rigetti"},
+    {"code": "QBTS", "name": "D-Wave"},
+    # 결제/카드네트워크
+    {"code": "V", "name": "Visa"},
+    {"code": "MA", "name": "Mastercard"},
+    {"code": "AXP", "name": "American Express"},
+    # 은행
+    {"code": "JPM", "name": "JPMorgan"},
+    {"code": "BAC", "name": "Bank of America"},
+    {"code": "GS", "name": "Goldman Sachs"},
+    # 자산운용/투자
+    {"code": "BRK-B", "name": "Berkshire Hathaway"},
+    {"code": "BLK", "name": "BlackRock"},
+    # 기타
+    {"code": "AAPL", "name": "Apple"},
+    {"code": "JNJ", "name": "Johnson & Johnson"},
+    {"code": "PFE", "name": "Pfizer"},
+    {"code": "UNH", "name": "UnitedHealth"},
+    {"code": "PG", "name": "Procter & Gamble"},
+    {"code": "KO", "name": "Coca-Cola"},
+    {"code": "PEP", "name": "PepsiCo"},
+    {"code": "MCD", "name": "McDonald's"},
+    {"code": "NKE", "name": "Nike"},
+    {"code": "SBUX", "name": "Starbucks"},
+]
+
 # 기간 옵션
 PERIOD_OPTIONS = {
     "3일": 3,
@@ -483,6 +676,22 @@ PERIOD_OPTIONS = {
     "10년": 2520,
 }
 
+# 베타/상관계수 롤링 창 옵션 (거래일)
+BETA_WINDOW_OPTIONS = {
+    "20일": 20,
+    "60일": 60,
+    "120일": 120,
+    "1년": 252,
+}
+
+# 기간별 다운로드 구간 (달력 일수) - 고른 기간과 그 이전 기간 비교분(탭3), 가장 긴 베타 창까지만
+# (거래일 × 1.5 + 여유 100일). 더 긴 기간을 고르면 그때 모자란 앞쪽 이력을 받아 채우고
+# (저장소 구간이 시작일을 덮지 못하는 티커만), 짧은 기간으로 돌아오면 받아 둔 이력을 잘라 쓴다.
+HISTORY_DAYS = {
+    period: int(max(2 * period, max(BETA_WINDOW_OPTIONS.values()) + 1) * 1.5) + 100
+    for period in PERIOD_OPTIONS.values()
+}
+
 # 벤치마크 지수 옵션
 BENCHMARK_OPTIONS = {
     "코스피": {"ticker": "^KS11", "name": "코스피", "emoji": "📈", "color": "#00FF7F", "market": "kospi", "region": "kr"},
@@ -564,6 +773,13 @@ INDEX_COLORS = {
     "S&P500": "#FF69B4",
     "다우존스": "#FF8C00",
 }
+DEFAULT_COLOR = "#888888"   # 섹터 색상이 없는 종목
+
+# ETF 판별 키워드 (종목명에 포함되면 ETF)
+ETF_KEYWORDS = ("KODEX", "TIGER", "HANARO", "ACE", "KBSTAR", "SOL", "ARIRANG", "KOSEF", "ETF")
+
+# 사용자가 추가한 종목의 섹터 이름
+CUSTOM_SECTOR = "➕추가"
 
 # 선 스타일 옵션
 LINE_STYLES = {
@@ -576,334 +792,2461 @@ LINE_STYLES = {
 # 글씨 크기 (고정)
 FONT_SIZE = 14
 
+# 로컬 가격 저장소 경로 (환경변수로 변경 가능)
+PRICE_STORE_PATH = os.environ.get(
+    "PRICE_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".price_store.sqlite3"),
+)
+
+# 가격 데이터 공급자: "yfinance"(기본) 또는 "replay"(로컬 Parquet/CSV 재생)
+PRICE_PROVIDER = os.environ.get("PRICE_PROVIDER", "yfinance")
+PRICE_REPLAY_PATH = os.environ.get("PRICE_REPLAY_PATH", "replay_prices.parquet")
+
+# 시장별 거래 시간 (현지 시각) - 캐시 만료를 거래 시간에 맞춤
+MARKET_SESSIONS = {
+    "kr": {"tz": "Asia/Seoul", "open": (9, 0), "close": (15, 30)},
+    "us": {"tz": "America/New_York", "open": (9, 30), "close": (16, 0)},
+}
+MARKET_OPEN_TTL_SECONDS = 900   # 장중 15분마다 갱신 (오늘 데이터 빠른 반영)
+MARKET_SETTLE_MINUTES = 30      # 마감 후 확정 종가 반영까지 대기
+FETCH_RETRY_SECONDS = 120       # 빈 결과/실패 다운로드는 거래 시간과 무관하게 이 간격 뒤 재시도
+
+# 휴장일 (주말 제외, 매년 갱신 필요)
+MARKET_HOLIDAYS = {
+    "kr": {
+        "2025-01-01", "2025-01-27", "2025-01-28", "2025-01-29", "2025-01-30",
+        "2025-03-03", "2025-05-01", "2025-05-05", "2025-05-06", "2025-06-03",
+        "2025-06-06", "2025-08-15", "2025-10-03", "2025-10-06", "2025-10-07",
+        "2025-10-08", "2025-10-09", "2025-12-25", "2025-12-31",
+        "2026-01-01", "2026-02-16", "2026-02-17", "2026-02-18", "2026-03-02",
+        "2026-05-01", "2026-05-05", "2026-05-25", "2026-06-03", "2026-08-17",
+        "2026-09-24", "2026-09-25", "2026-09-28", "2026-10-05", "2026-10-09",
+        "2026-12-25", "2026-12-31",
+        "2027-01-01", "2027-02-08", "2027-02-09", "2027-03-01", "2027-05-05",
+        "2027-05-13", "2027-08-16", "2027-09-14", "2027-09-15", "2027-09-16",
+        "2027-10-04", "2027-10-11", "2027-12-27", "2027-12-31",
+    },
+    "us": {
+        "2025-01-01", "2025-01-09", "2025-01-20", "2025-02-17", "2025-04-18",
+        "2025-05-26", "2025-06-19", "2025-07-04", "2025-09-01", "2025-11-27",
+        "2025-12-25",
+        "2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25",
+        "2026-06-19", "2026-07-03", "2026-09-07", "2026-11-26", "2026-12-25",
+        "2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31",
+        "2027-06-18", "2027-07-05", "2027-09-06", "2027-11-25", "2027-12-24",
+    },
+}
+
+# 다운로드 마감/동시성 설정 - 마감을 넘긴 청크는 기다리지 않고 도착분만 먼저 표시
+FETCH_DEADLINE_SECONDS = 20
+FETCH_CHUNK_SIZE = 8
+FETCH_MAX_WORKERS = 4
+# 저장된 기준 봉과 다시 받은 종가의 허용 상대 오차 - 넘으면 분할/배당 소급 조정으로 보고 전체 재다운로드
+PRICE_ADJUST_TOLERANCE = 1e-4
+
+# 가격/상대강도 패널 자료형: "float64"(기본) 또는 "float32"(컴팩트 - 메모리 절반)
+PANEL_DTYPE = np.dtype(os.environ.get("PANEL_DTYPE", "float64"))
+# 세션 간 공유 데이터(상대강도 큐브 보관소 + 티커별 시리즈 캐시)의 메모리 한도 (MB)
+# - 넘으면 오래 쓰지 않은 것부터 제거
+PANEL_MEMORY_BUDGET_MB = float(os.environ.get("PANEL_MEMORY_BUDGET_MB", "512"))
+# 그중 티커별 시리즈 캐시 몫 (MB) - 큐브 보관소는 한도에서 시리즈 캐시 사용량을 뺀 만큼 사용
+SERIES_CACHE_BUDGET_MB = float(os.environ.get("SERIES_CACHE_BUDGET_MB", PANEL_MEMORY_BUDGET_MB / 2))
+# 사이드바에 메모리 사용량 표시 (운영 확인용 - 기본은 로그에만 남김)
+SHOW_MEMORY_REPORT = os.environ.get("SHOW_MEMORY_REPORT", "").lower() in ("1", "true", "yes")
+
+# 전체 상장 종목 목록 CSV (code, name, market 컬럼 - market: kospi/kosdaq/us)
+# 파일이 없으면 섹터 정의(SECTORS_KR/SECTORS_US)에 있는 종목만 사용
+UNIVERSE_PATH = os.environ.get(
+    "UNIVERSE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "universe.csv"),
+)
+REGION_MARKETS = {"kr": ("kospi", "kosdaq"), "us": ("us",)}
+
+# RS 등급 기간별 가중치 (거래일, 가중치) - 최근 3개월에 두 배 가중
+RS_RATING_WEIGHTS = ((63, 0.4), (126, 0.2), (189, 0.2), (252, 0.2))
+RS_RATING_HISTORY_DAYS = int(max(h for h, _ in RS_RATING_WEIGHTS) * 1.6) + 30
+
+# 전체 시장 스캔 - 청크(종목 수) 단위로 받고 청크마다 결과를 체크포인트에 저장 (중단 시 이어서)
+SCAN_CHUNK_SIZE = 200
+SCAN_MAX_RETRIES = 2
+SCAN_CHECKPOINT_PATH = os.environ.get(
+    "SCAN_CHECKPOINT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".scan_checkpoint.sqlite3"),
+)
+
 
 # ========================================================================================
 # 데이터 수집 함수
 # ========================================================================================
 def _parse_yf_to_close(data, tickers):
-    """yfinance 다운로드 결과에서 종가만 추출해 ticker별 DataFrame 반환"""
+    """yfinance 다운로드 결과에서 종가만 추출해 ticker별 DataFrame 반환
+
+    MultiIndex의 'Close' 레벨을 한 번에 선택해 하나의 연속된 2차원 블록으로 만든다
+    (티커별 컬럼 삽입/복사 없음).
+    """
     if data.empty:
         return pd.DataFrame()
-    if len(tickers) == 1:
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = data.columns.get_level_values(0)
-        df = data[['Close']].copy()
-        df.columns = [tickers[0]]
-        df.index = pd.to_datetime(df.index).tz_localize(None)
-        return df
-    result = pd.DataFrame()
+    if isinstance(data.columns, pd.MultiIndex):
+        # group_by='ticker'면 (Ticker, Price), 아니면 (Price, Ticker) 순서
+        level = 1 if 'Close' in data.columns.get_level_values(1) else 0
+        if 'Close' not in data.columns.get_level_values(level):
+            return pd.DataFrame()
+        close = data.xs('Close', axis=1, level=level)
+    elif 'Close' in data.columns:
+        close = data[['Close']].set_axis(tickers[:1], axis=1)
+    else:
+        return pd.DataFrame()
+    present = [t for t in tickers if t in close.columns]
+    if not present:
+        return pd.DataFrame()
+    index = pd.DatetimeIndex(close.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    values = np.array(close[present], dtype=np.float64, order='C')
+    return pd.DataFrame(values, index=index, columns=present)
+
+
+def ticker_region(ticker):
+    """티커가 거래되는 시장 지역 ('kr' | 'us')"""
+    if ticker.endswith(('.KS', '.KQ')) or ticker in ('^KS11', '^KQ11'):
+        return 'kr'
+    return 'us'
+
+
+def is_trading_day(region, day):
+    """region 시장의 거래일 여부 (주말/휴장일 제외)"""
+    return day.weekday() < 5 and day.isoformat() not in MARKET_HOLIDAYS[region]
+
+
+def cache_expiry(ticker, now=None):
+    """티커 캐시의 만료 시각 (epoch 초) - 거래 시간에 따라 결정
+
+    - 장중: MARKET_OPEN_TTL_SECONDS 간격으로 갱신 (마감 정산 시각은 넘지 않음)
+    - 마감 후 정산 시각: 확정 종가를 위해 한 번 더 갱신
+    - 그 외 (장전/야간/주말/휴장일): 다음 개장 시각까지 갱신 안 함
+    """
+    region = ticker_region(ticker)
+    session = MARKET_SESSIONS[region]
+    tz = ZoneInfo(session['tz'])
+    now = datetime.now(tz) if now is None else datetime.fromtimestamp(now, tz)
+
+    def at(day, hour_minute):
+        return datetime(day.year, day.month, day.day, *hour_minute, tzinfo=tz)
+
+    today = now.date()
+    if is_trading_day(region, today):
+        open_at = at(today, session['open'])
+        settle_at = at(today, session['close']) + timedelta(minutes=MARKET_SETTLE_MINUTES)
+        if now < open_at:
+            return open_at.timestamp()
+        if now < settle_at:
+            return min(now + timedelta(seconds=MARKET_OPEN_TTL_SECONDS), settle_at).timestamp()
+    day = today + timedelta(days=1)
+    while not is_trading_day(region, day):
+        day += timedelta(days=1)
+    return at(day, session['open']).timestamp()
+
+
+class PriceProvider:
+    """종가 데이터 공급자 인터페이스
+
+    download_close(tickers, start_date)는 start_date부터 현재까지의 종가를
+    index=날짜(tz 없음), columns=티커인 DataFrame으로 반환한다.
+    """
+
+    name = "base"
+
+    def download_close(self, tickers, start_date, end_date=None):
+        raise NotImplementedError
+
+    def shares_outstanding(self, tickers):
+        """{ticker: 상장주식수} - 모르는 티커는 빠짐 (시가총액 가중 합성 지수용)"""
+        return {}
+
+
+class YFinanceProvider(PriceProvider):
+    """yfinance 기반 공급자 (기본값)"""
+
+    name = "yfinance"
+
+    def download_close(self, tickers, start_date, end_date=None):
+        raw = yf.download(list(tickers), start=start_date, end=end_date,
+                          progress=False, group_by='ticker', threads=True)
+        return _parse_yf_to_close(raw, list(tickers))
+
+    def shares_outstanding(self, tickers):
+        shares = {}
+        for ticker in tickers:
+            try:
+                shares[ticker] = yf.Ticker(ticker).fast_info['shares']
+            except Exception:
+                continue
+        return shares
+
+
+class ReplayProvider(PriceProvider):
+    """로컬 Parquet/CSV 파일을 그대로 돌려주는 재생 공급자
+
+    네트워크 없이 같은 종가 패널을 결정적으로 반환하므로 계산/렌더링 성능 측정,
+    부하 테스트, 문제 재현에 사용한다. 파일 형식은 write_replay_file() 참고.
+    """
+
+    name = "replay"
+
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._data is None:
+                self._data = read_replay_file(self.path)
+        return self._data
+
+    def download_close(self, tickers, start_date, end_date=None):
+        data = self._load()
+        mask = data.index >= pd.Timestamp(start_date)
+        if end_date is not None:
+            mask &= data.index < pd.Timestamp(end_date)
+        return data.loc[mask, [t for t in tickers if t in data.columns]].dropna(how='all')
+
+
+def write_replay_file(close_df, path):
+    """종가 패널(index=날짜, columns=티커)을 재생용 파일로 저장 (.parquet 또는 .csv)"""
+    if path.endswith('.parquet'):
+        close_df.to_parquet(path)
+    else:
+        close_df.to_csv(path, index_label='date')
+
+
+def read_replay_file(path):
+    """write_replay_file()로 저장한 재생용 파일을 종가 패널로 읽기"""
+    if path.endswith('.parquet'):
+        data = pd.read_parquet(path)
+    else:
+        data = pd.read_csv(path, index_col=0)
+    data.index = pd.to_datetime(data.index)
+    data.index.name = None
+    return data.sort_index()
+
+
+@st.cache_resource
+def get_price_provider():
+    """환경변수 PRICE_PROVIDER로 공급자 선택 (yfinance | replay)"""
+    if PRICE_PROVIDER == "replay":
+        return ReplayProvider(PRICE_REPLAY_PATH)
+    return YFinanceProvider()
+
+
+class PriceStore:
+    """티커·날짜별 종가를 로컬 SQLite에 저장하는 가격 저장소
+
+    - prices: (ticker, date) → close
+    - coverage: 티커별로 어디서부터 다운로드해 두었는지 기록
+      (상장일이 늦은 종목도 매번 과거 구간을 다시 받지 않도록)
+    """
+
+    _SQL_CHUNK = 500  # SQLite 바인딩 변수 제한 회피용
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prices ("
+                " ticker TEXT NOT NULL, date TEXT NOT NULL, close REAL,"
+                " PRIMARY KEY (ticker, date)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                " ticker TEXT PRIMARY KEY, start TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _chunks(self, tickers):
+        for i in range(0, len(tickers), self._SQL_CHUNK):
+            yield tickers[i:i + self._SQL_CHUNK]
+
+    def coverage(self, tickers):
+        """{ticker: (저장 시작일, 마지막 저장일)} - 한 번도 받지 않은 티커는 제외"""
+        result = {}
+        with self._connect() as conn:
+            for chunk in self._chunks(list(tickers)):
+                marks = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT c.ticker, c.start, MAX(p.date) FROM coverage c"
+                    f" LEFT JOIN prices p ON p.ticker = c.ticker"
+                    f" WHERE c.ticker IN ({marks}) GROUP BY c.ticker",
+                    chunk,
+                ).fetchall()
+                for ticker, start, last in rows:
+                    result[ticker] = (start, last)
+        return result
+
+    def append(self, close_df):
+        """종가 DataFrame(index=날짜, columns=티커)을 저장 (같은 날짜는 덮어씀)"""
+        if close_df.empty:
+            return 0
+        stacked = close_df.stack().dropna()
+        dates = stacked.index.get_level_values(0).strftime('%Y-%m-%d')
+        tickers = stacked.index.get_level_values(1)
+        rows = list(zip(tickers, dates, stacked.astype(float).tolist()))
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO prices (ticker, date, close) VALUES (?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def anchors(self, tickers):
+        """{ticker: (날짜, 종가)} - 마지막 바로 앞 저장 봉 (저장 봉이 하나면 그 봉)
+
+        마지막 봉은 장중 값일 수 있지만 그 앞 봉은 다음 봉을 받을 때 함께 다시 받아 덮어쓴
+        확정 종가이므로, 다시 받은 값과 비교해 수정주가 소급 변경을 찾는 기준으로 쓴다.
+        """
+        result = {}
+        with self._connect() as conn:
+            for ticker in tickers:
+                rows = conn.execute(
+                    "SELECT date, close FROM prices WHERE ticker = ? ORDER BY date DESC LIMIT 2",
+                    (ticker,),
+                ).fetchall()
+                if rows:
+                    result[ticker] = rows[-1]
+        return result
+
+    def reset(self, tickers):
+        """tickers의 저장 종가와 다운로드 기록 삭제 (수정주가가 바뀌어 전체를 다시 받을 때)"""
+        with self._lock, self._connect() as conn:
+            for chunk in self._chunks(list(tickers)):
+                marks = ",".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM prices WHERE ticker IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM coverage WHERE ticker IN ({marks})", chunk)
+
+    def mark_coverage(self, tickers, start_date):
+        """tickers를 start_date부터 다운로드 완료로 기록"""
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO coverage (ticker, start) VALUES (?, ?)"
+                " ON CONFLICT(ticker) DO UPDATE SET start = MIN(start, excluded.start)",
+                [(t, start_date) for t in tickers],
+            )
+
+    def read(self, tickers, start_date, end_date):
+        """[start_date, end_date) 구간 종가를 ticker별 컬럼 DataFrame으로 반환"""
+        frames = []
+        with self._connect() as conn:
+            for chunk in self._chunks(list(tickers)):
+                marks = ",".join("?" * len(chunk))
+                frames.append(pd.read_sql_query(
+                    f"SELECT ticker, date, close FROM prices"
+                    f" WHERE ticker IN ({marks}) AND date >= ? AND date < ?",
+                    conn, params=[*chunk, start_date, end_date],
+                ))
+        long_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if long_df.empty:
+            return pd.DataFrame()
+        result = long_df.pivot(index='date', columns='ticker', values='close')
+        result.index = pd.to_datetime(result.index)
+        result.index.name = None
+        result.columns.name = None
+        return result[[t for t in tickers if t in result.columns]]
+
+
+@st.cache_resource
+def get_price_store():
+    """프로세스 전체에서 공유하는 가격 저장소 (공급자별로 파일 분리)"""
+    path = PRICE_STORE_PATH
+    provider = get_price_provider()
+    if provider.name != YFinanceProvider.name:
+        # 재생 데이터가 실제 데이터 저장소에 섞이지 않도록
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{provider.name}{ext}"
+    return PriceStore(path)
+
+
+class SeriesCache:
+    """티커별 종가 시리즈 메모리 캐시
+
+    요청 패널 전체(티커 묶음)가 아니라 티커 하나하나를 캐시하므로
+    섹터/종목 선택이 바뀌어도 이미 받은 티커는 재사용한다.
+    전체 크기가 max_bytes를 넘으면 가장 오래 쓰지 않은 티커부터 제거한다 (제거분은 다음 요청에서
+    로컬 가격 저장소로 다시 읽음).
+    다운로드가 빈 결과로 끝난 티커는 put_failed()로 기록한다 - 거래 시간 기준 만료(다음 개장까지일
+    수 있음) 대신 retry_seconds 뒤 만료로 두고 실패 표시를 남겨 failed()로 알려준다.
+    """
+
+    def __init__(self, expiry, max_bytes=None, retry_seconds=FETCH_RETRY_SECONDS):
+        self.expiry = expiry        # (ticker, 저장 시각) → 만료 시각 (epoch 초)
+        self.max_bytes = max_bytes  # None이면 제한 없음
+        self.retry_seconds = retry_seconds
+        self._entries = OrderedDict()  # {ticker: (series, 캐시 시작일, 만료 시각, bytes, 실패 여부)} - 오래 쓰지 않은 순
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, tickers, start_date):
+        """({ticker: series} 유효분, {ticker: series} 만료분, [누락 티커]) 반환
+
+        만료분은 갱신 전까지 그대로 보여줄 수 있는 마지막 정상 데이터
+        """
+        now = time.time()
+        fresh, stale, missing = {}, {}, []
+        with self._lock:
+            for ticker in tickers:
+                entry = self._entries.get(ticker)
+                if entry is None or entry[1] > start_date:
+                    missing.append(ticker)
+                    continue
+                self._entries.move_to_end(ticker)
+                if now >= entry[2]:
+                    stale[ticker] = entry[0]
+                else:
+                    fresh[ticker] = entry[0]
+        return fresh, stale, missing
+
+    def expiring(self, tickers, within_seconds):
+        """within_seconds 안에 만료되는(또는 이미 만료된) 캐시 티커 목록"""
+        deadline = time.time() + within_seconds
+        with self._lock:
+            return [t for t in tickers
+                    if t in self._entries and self._entries[t][2] <= deadline]
+
+    def peek(self, ticker, start_date):
+        """만료 여부와 관계없이 start_date를 덮는 캐시 시리즈 반환 (없으면 None)"""
+        with self._lock:
+            entry = self._entries.get(ticker)
+        if entry is None or entry[1] > start_date:
+            return None
+        return entry[0]
+
+    def put(self, close_df, tickers, start_date):
+        """tickers를 start_date부터 받은 결과로 저장 (데이터가 없는 티커도 빈 시리즈로 기록)
+
+        한도를 넘으면 방금 저장한 tickers는 남기고 오래 쓰지 않은 티커부터 제거한다.
+        """
+        now = time.time()
+        with self._lock:
+            for ticker in tickers:
+                if ticker in close_df.columns:
+                    series = close_df[ticker].dropna()
+                else:
+                    series = pd.Series(dtype=float, name=ticker)
+                nbytes = int(series.memory_usage(index=True))
+                old = self._entries.pop(ticker, None)
+                if old is not None:
+                    self._nbytes -= old[3]
+                self._entries[ticker] = (series, start_date, self.expiry(ticker, now), nbytes, False)
+                self._nbytes += nbytes
+            self._evict(set(tickers))
+
+    def put_failed(self, tickers, start_date):
+        """tickers 다운로드가 빈 결과로 끝남 - 기존 시리즈는 그대로 두고 retry_seconds 뒤 만료, 실패로 표시
+
+        캐시에 없던 티커는 빈 시리즈로 넣는다 (만료되면 백그라운드 갱신이 다시 받음).
+        """
+        now = time.time()
+        retry_at = now + self.retry_seconds
+        with self._lock:
+            for ticker in tickers:
+                old = self._entries.get(ticker)
+                if old is not None and old[1] <= start_date:
+                    self._entries[ticker] = (old[0], old[1], retry_at, old[3], True)
+                    continue
+                if old is not None:
+                    self._nbytes -= old[3]
+                series = pd.Series(dtype=float, name=ticker)
+                nbytes = int(series.memory_usage(index=True))
+                self._entries[ticker] = (series, start_date, retry_at, nbytes, True)
+                self._nbytes += nbytes
+            self._evict(set(tickers))
+
+    def failed(self, tickers):
+        """tickers 중 마지막 다운로드가 빈 결과로 끝난 티커"""
+        with self._lock:
+            return [t for t in tickers if t in self._entries and self._entries[t][4]]
+
+    def _evict(self, keep):
+        # 한도를 넘으면 keep(방금 저장한 티커)은 남기고 오래 쓰지 않은 티커부터 제거
+        if self.max_bytes is None:
+            return
+        for ticker in [t for t in self._entries if t not in keep]:
+            if self._nbytes <= self.max_bytes:
+                break
+            self._nbytes -= self._entries.pop(ticker)[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return self._nbytes
+
+
+class SingleFlight:
+    """같은 키로 동시에 들어온 요청은 먼저 시작된 한 번의 호출 결과를 함께 받음
+
+    TTL 만료 직후 여러 세션이 동시에 같은 다운로드를 시작하는 것(thundering herd)을 막는다.
+    """
+
+    def __init__(self):
+        self._calls = {}  # {key: Future}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+@st.cache_resource
+def get_fetch_flights():
+    """프로세스 전체에서 공유하는 다운로드 single-flight"""
+    return SingleFlight()
+
+
+@st.cache_resource
+def get_series_cache():
+    """프로세스 전체에서 공유하는 티커별 시리즈 캐시 (SERIES_CACHE_BUDGET_MB 한도)"""
+    return SeriesCache(expiry=cache_expiry, max_bytes=int(SERIES_CACHE_BUDGET_MB * 2 ** 20))
+
+
+def _merge_recent_bars(base, recent):
+    """정렬된 기존 시리즈 뒤에 최근 봉을 덧붙임
+
+    최근 봉은 기존 데이터의 꼬리 구간이므로 겹치는 날짜부터 잘라 이어 붙이면 되고
+    (겹치는 날짜는 최근 값 우선), 전체를 다시 정렬할 필요가 없다.
+    """
+    recent = recent.dropna()
+    if recent.empty:
+        return base
+    if base.empty:
+        return recent
+    cut = base.index.searchsorted(recent.index[0])
+    return pd.concat([base.iloc[:cut], recent])
+
+
+def _adjusted_tickers(fetched, anchors):
+    """다시 받은 기준 봉 종가가 저장값과 PRICE_ADJUST_TOLERANCE 이상 다른 티커 (분할/배당 소급 조정)"""
+    changed = []
+    for ticker, (date, close) in anchors.items():
+        day = pd.Timestamp(date)
+        if ticker not in fetched.columns or day not in fetched.index or close is None:
+            continue
+        new_close = fetched.at[day, ticker]
+        if pd.notna(new_close) and abs(new_close / close - 1) > PRICE_ADJUST_TOLERANCE:
+            changed.append(ticker)
+    return changed
+
+
+def _fetch_to_store(provider, store, tickers, start_date, end_date):
+    """로컬 저장소에 없는 구간만 공급자에서 받아 저장소에 추가하고,
+    (받은 종가, 전체를 다시 받은 티커, 한 봉도 받지 못한 티커) 반환
+
+    다운로드 시작일이 같은 티커끼리 한 번씩만 요청한다. end를 비워 두면 yfinance가
+    현재 시각까지 받아 오므로 당일 종가를 위한 별도의 최근 5일 요청이 필요 없다.
+    yfinance 종가는 수정주가라 분할/배당이 생기면 과거 값이 소급해서 바뀐다. 이미 저장된
+    티커는 확정된 기준 봉부터 다시 받아 저장값과 비교하고, 달라졌으면 그 티커의 저장 이력을
+    지우고 전체 구간을 다시 받는다 (저장소에 조정 전/후 값이 섞이지 않도록).
+    이미 저장된 티커는 기준 봉부터 받으므로 정상이면 최소 한 봉은 온다. yfinance는 오류를
+    삼키고 빈 결과를 주므로, 한 봉도 받지 못한 티커는 실패로 보고 구간 기록도 남기지 않는다.
+    """
+    coverage = store.coverage(tickers)
+
+    # 저장 구간이 요청 시작일을 덮지 못하는 티커 → 전체 구간,
+    # 이미 저장된 티커 → 자기 기준 봉(마지막 바로 앞 봉)부터, 기준일이 같은 티커끼리 한 요청으로
+    # (거래정지/상장폐지로 마지막 봉이 오래된 티커가 다른 티커까지 과거부터 다시 받게 하지 않음)
+    cold = [t for t in tickers
+            if t not in coverage or coverage[t][1] is None or coverage[t][0] > start_date]
+    warm = [t for t in tickers if t not in cold]
+    anchors = store.anchors(warm) if warm else {}
+    groups = []
+    if cold:
+        groups.append((cold, start_date, False))
+    by_since = {}
+    for t in warm:
+        by_since.setdefault(anchors[t][0] if t in anchors else coverage[t][1], []).append(t)
+    groups.extend((group, since, True) for since, group in sorted(by_since.items()))
+
+    frames, reset = [], []
+    for group, since, check in groups:
+        fetched = provider.download_close(group, since)
+        changed = _adjusted_tickers(fetched, {t: anchors[t] for t in group if t in anchors}) if check else []
+        if changed:
+            store.reset(changed)
+            full_start = min(min(coverage[t][0] for t in changed), start_date)
+            refetched = provider.download_close(changed, full_start)
+            store.append(refetched)
+            store.mark_coverage([t for t in changed if t in refetched.columns
+                                 and refetched[t].notna().any()], full_start)
+            fetched = fetched.drop(columns=[t for t in changed if t in fetched.columns])
+            frames.append(refetched)
+            reset.extend(changed)
+        store.append(fetched)
+        frames.append(fetched)
+    frames = [f for f in frames if not f.empty]
+    fetched = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0] if frames else pd.DataFrame()
+    received = set(fetched.columns[fetched.notna().any()])
+    empty = [t for t in tickers if t not in received]
+    if cold:
+        store.mark_coverage([t for t in cold if t in received], start_date)
+    if fetched.empty:
+        return fetched, reset, empty
+    return fetched[fetched.index < pd.Timestamp(end_date)], reset, empty
+
+
+def _refresh_series(provider, cache, store, tickers, start_date, end_date):
+    """tickers를 다시 받아 캐시에 넣고 ({ticker: series}, [빈 결과로 끝난 티커]) 반환
+
+    만료된 캐시 시리즈가 있으면 새 봉만 덧붙이고, 없거나 수정주가 변경으로 전체를 다시 받은
+    티커는 저장소에서 읽는다. 빈 결과로 끝난 티커는 새로 받은 것으로 기록하지 않고
+    (SeriesCache.put_failed) 기존 시리즈가 있으면 그대로 돌려준다.
+    """
+    fetched, reset, empty = _fetch_to_store(provider, store, tickers, start_date, end_date)
+    refreshed, unknown = {}, []
     for ticker in tickers:
+        if ticker in empty:
+            stale = cache.peek(ticker, start_date)
+            if stale is not None and not stale.empty:
+                refreshed[ticker] = stale
+            continue
+        stale = cache.peek(ticker, start_date)
+        if stale is None or ticker in reset:
+            unknown.append(ticker)
+        elif ticker in fetched.columns:
+            refreshed[ticker] = _merge_recent_bars(stale, fetched[ticker])
+        else:
+            refreshed[ticker] = stale
+    if unknown:
+        stored = store.read(unknown, start_date, end_date)
+        refreshed.update({t: stored[t].dropna() for t in stored.columns})
+    refreshed = pd.DataFrame(refreshed) if refreshed else pd.DataFrame()
+    cache.put(refreshed, [t for t in tickers if t not in empty], start_date)
+    cache.put_failed(empty, start_date)
+    return {t: refreshed[t] for t in refreshed.columns}, empty
+
+
+def _refresh_series_shared(flights, provider, cache, store, tickers, start_date, end_date):
+    """_refresh_series를 single-flight로 감싸 같은 요청의 동시 다운로드를 한 번으로 합침
+
+    캐시 조회와 합류 사이에 앞선 다운로드가 끝났을 수 있으므로, 그새 캐시에 유효하게 들어간
+    티커는 다시 받지 않는다.
+    """
+    key = (tuple(sorted(tickers)), start_date, end_date)
+
+    def refresh():
+        fresh, _, _ = cache.lookup(tickers, start_date)
+        todo = [t for t in tickers if t not in fresh]
+        if not todo:
+            return fresh, []
+        refreshed, empty = _refresh_series(provider, cache, store, todo, start_date, end_date)
+        return {**fresh, **refreshed}, empty
+
+    return flights.do(key, refresh)
+
+
+class BackgroundRefresher:
+    """만료된 티커를 백그라운드에서 다시 받는 갱신 스레드 (stale-while-revalidate)
+
+    - submit(): 만료분을 보여준 세션이 갱신을 요청 (이미 대기 중이면 무시)
+    - 자주 요청되는 티커 묶음은 만료되기 전에 미리 갱신
+    - 갱신에 실패한 티커(오류 또는 빈 결과)는 로그를 남기고 다음에 성공할 때까지 failed()로 알려줌
+    """
+
+    def __init__(self, provider, cache, store, flights,
+                 interval_seconds=60, lead_seconds=120, top_n=8):
+        self.provider = provider
+        self.cache = cache
+        self.store = store
+        self.flights = flights
+        self.interval_seconds = interval_seconds
+        self.lead_seconds = lead_seconds
+        self.top_n = top_n
+        self._popular = Counter()  # {(tickers, start_date, end_date): 요청 수}
+        self._jobs = {}            # {ticker: (start_date, end_date)}
+        self._failures = {}        # {ticker: 마지막 갱신 실패 시각}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="price-refresher", daemon=True)
+        self._thread.start()
+
+    def track(self, tickers, start_date, end_date):
+        """요청된 티커 묶음 기록 (인기 묶음 선별용)"""
+        with self._lock:
+            self._popular[(tuple(tickers), start_date, end_date)] += 1
+            if len(self._popular) > 256:
+                self._popular = Counter(dict(self._popular.most_common(128)))
+
+    def submit(self, tickers, start_date, end_date):
+        """tickers 갱신 예약 후 갱신 스레드를 바로 깨움"""
+        self._enqueue(tickers, start_date, end_date)
+        self._wake.set()
+
+    def failed(self, tickers):
+        """tickers 중 마지막 백그라운드 갱신이 실패한 티커"""
+        with self._lock:
+            return [t for t in tickers if t in self._failures]
+
+    def _enqueue(self, tickers, start_date, end_date):
+        with self._lock:
+            for ticker in tickers:
+                self._jobs.setdefault(ticker, (start_date, end_date))
+
+    def _schedule_popular(self):
+        # 주기마다 확인만 하고 스레드를 다시 깨우지는 않음 (갱신 실패 시 재시도 폭주 방지)
+        with self._lock:
+            popular = [key for key, _ in self._popular.most_common(self.top_n)]
+        for tickers, start_date, end_date in popular:
+            expiring = self.cache.expiring(tickers, self.lead_seconds)
+            if expiring:
+                self._enqueue(expiring, start_date, end_date)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            self._schedule_popular()
+            with self._lock:
+                jobs, self._jobs = self._jobs, {}
+            # 같은 구간끼리 묶어서 한 번에 갱신
+            groups = {}
+            for ticker, key in jobs.items():
+                groups.setdefault(key, []).append(ticker)
+            for (start_date, end_date), tickers in groups.items():
+                try:
+                    _, empty = _refresh_series_shared(self.flights, self.provider, self.cache,
+                                                      self.store, tickers, start_date, end_date)
+                except Exception:
+                    logger.exception("백그라운드 갱신 실패: %s (%s ~ %s)", ", ".join(tickers),
+                                     start_date, end_date)
+                    empty = tickers
+                else:
+                    if empty:
+                        logger.warning("백그라운드 갱신 빈 결과: %s (%s ~ %s)", ", ".join(empty),
+                                       start_date, end_date)
+                failed_at = time.time()
+                with self._lock:
+                    for ticker in tickers:
+                        self._failures.pop(ticker, None)
+                    self._failures.update(dict.fromkeys(empty, failed_at))
+
+
+@st.cache_resource
+def get_background_refresher():
+    """프로세스 전체에서 하나만 도는 백그라운드 갱신 스레드"""
+    return BackgroundRefresher(get_price_provider(), get_series_cache(),
+                               get_price_store(), get_fetch_flights())
+
+
+@st.cache_resource
+def get_fetch_executor():
+    """청크 단위 동시 다운로드용 스레드 풀 (동시 요청 수 제한)"""
+    return ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="price-fetch")
+
+
+def _fetch_missing_partial(tickers, start_date, end_date, deadline_seconds):
+    """tickers를 청크로 나눠 동시에 받고, 마감 시간 안에 도착한 청크만 반환
+
+    반환: ({ticker: series}, [실패 티커], [마감 초과로 아직 받는 중인 티커])
+    실패 티커는 다운로드 오류가 난 청크의 티커와 빈 결과로 끝난 티커 (빈 결과는 캐시에
+    실패로 남아 FETCH_RETRY_SECONDS 뒤 다시 받는다).
+    마감을 넘긴 청크는 계속 받아서 캐시에 넣으므로 다음 rerun에서 바로 보인다.
+    """
+    flights, provider = get_fetch_flights(), get_price_provider()
+    cache, store = get_series_cache(), get_price_store()
+    executor = get_fetch_executor()
+    futures = {}
+    for i in range(0, len(tickers), FETCH_CHUNK_SIZE):
+        chunk = tickers[i:i + FETCH_CHUNK_SIZE]
+        future = executor.submit(_refresh_series_shared, flights, provider, cache, store,
+                                 chunk, start_date, end_date)
+        futures[future] = chunk
+    done, not_done = wait(futures, timeout=deadline_seconds)
+
+    columns, failed = {}, []
+    for future in done:
         try:
-            if ticker in data.columns.get_level_values(0):
-                result[ticker] = data[ticker]['Close']
-        except:
-            pass
-    if not result.empty:
-        result.index = pd.to_datetime(result.index).tz_localize(None)
-    return result
+            fetched, empty = future.result()
+        except Exception:
+            logger.exception("다운로드 실패: %s", ", ".join(futures[future]))
+            failed.extend(futures[future])
+            continue
+        columns.update(fetched)
+        failed.extend(empty)
+    pending = [t for future in not_done for t in futures[future]]
+    return columns, failed, pending
 
 
-@st.cache_data(ttl=900)  # 15분마다 갱신 (오늘 데이터 빠른 반영)
-def get_batch_stock_data(tickers_tuple, start_date, end_date):
-    """yfinance로 여러 주식/지수 데이터 한 번에 가져오기 (배치 다운로드)"""
+def get_batch_stock_data_partial(tickers_tuple, start_date, end_date,
+                                 deadline_seconds=FETCH_DEADLINE_SECONDS):
+    """yfinance로 여러 주식/지수 데이터 가져오기 (마감 시간 내 도착분만 반환)
+
+    티커별 캐시에 있는 컬럼은 그대로 쓰고, 없는 티커만 청크로 나눠 동시에 받는다.
+    만료된 컬럼은 마지막 정상 데이터를 바로 반환하고 갱신은 백그라운드에서 처리한다.
+    다운로드는 로컬 가격 저장소를 거치므로 마지막 저장일 이후 봉만 받는다.
+
+    반환: (DataFrame, {'missing': 데이터 없음/실패, 'pending': 마감 초과, 'stale': 만료 데이터,
+                       'failed': missing 중 다운로드 오류/빈 결과로 못 받은 티커,
+                       'refresh_failed': stale 중 마지막 백그라운드 갱신이 실패한 티커})
+    """
     tickers = list(tickers_tuple)
+    report = {'missing': [], 'pending': [], 'stale': [], 'failed': [], 'refresh_failed': []}
     if not tickers:
-        return pd.DataFrame()
-    try:
-        # 1) 과거 데이터 (start ~ end)
-        raw = yf.download(tickers, start=start_date, end=end_date,
-                          progress=False, group_by='ticker', threads=True)
-        result = _parse_yf_to_close(raw, tickers)
+        return pd.DataFrame(), report
+    cache = get_series_cache()
+    refresher = get_background_refresher()
+    refresher.track(tickers, start_date, end_date)
+    columns, stale, missing = cache.lookup(tickers, start_date)
+
+    # 처음 보는 티커만 기다려서 받고, 만료분은 그대로 쓰면서 백그라운드 갱신
+    if missing:
+        fetched, failed, pending = _fetch_missing_partial(missing, start_date, end_date,
+                                                          deadline_seconds)
+        columns.update(fetched)
+        report['pending'] = pending
+        report['failed'] = failed
+    if stale:
+        columns.update(stale)
+        refresher.submit(list(stale), start_date, end_date)
+
+    columns = {t: columns[t].dropna() for t in tickers if t in columns}
+    columns = {t: series for t, series in columns.items() if not series.empty}
+    # 이전 데이터로 보여주는 티커 중 마지막 갱신이 실패한 티커 (갱신 스레드 기록 + 캐시의 빈 결과 표시)
+    # (재시도 대기 중인 티커는 만료 전이어도 실패로 안내)
+    shown_stale = [t for t in tickers if t in stale and t in columns]
+    refresh_failed = set(refresher.failed(shown_stale)) | set(cache.failed(list(columns)))
+    report['refresh_failed'] = [t for t in tickers if t in columns and t in refresh_failed]
+    report['stale'] = [t for t in shown_stale if t not in refresh_failed]
+    report['missing'] = [t for t in tickers
+                         if t not in columns and t not in report['pending']]
+    # 이번에 받지 않고 캐시에서 꺼낸 티커도 마지막 다운로드가 빈 결과였으면 실패로 안내
+    failed = set(report['failed']) | set(cache.failed(report['missing']))
+    report['failed'] = [t for t in report['missing'] if t in failed]
+    if not columns:
+        return pd.DataFrame(), report
+    result = pd.concat(columns, axis=1).sort_index()
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    return result[(result.index >= start) & (result.index < end)], report
 
-        # 2) 최근 5거래일 데이터 보완 → 오늘 당일 종가 확보
-        try:
-            recent_raw = yf.download(tickers, period='5d', interval='1d',
-                                     progress=False, group_by='ticker', threads=True)
-            recent = _parse_yf_to_close(recent_raw, tickers)
-            if not recent.empty:
-                # 과거 데이터에 없는 날짜만 추가 (중복 방지)
-                new_rows = recent[~recent.index.isin(result.index)]
-                if not new_rows.empty:
-                    result = pd.concat([result, new_rows]).sort_index()
-        except:
-            pass
 
-        return result
-    except Exception:
-        return pd.DataFrame()
+def get_batch_stock_data(tickers_tuple, start_date, end_date):
+    """yfinance로 여러 주식/지수 데이터 한 번에 가져오기 (배치 다운로드, 전부 도착할 때까지 대기)"""
+    return get_batch_stock_data_partial(tickers_tuple, start_date, end_date,
+                                        deadline_seconds=None)[0]
 
 
-@st.cache_data(ttl=3600)
 def get_stock_data(ticker, name, start_date, end_date):
-    """yfinance로 주식/지수 데이터 가져오기 (단일 종목용 - 호환성 유지)"""
+    """주식/지수 데이터 가져오기 (단일 종목용 - 호환성 유지, 배치와 같은 티커별 캐시 사용)"""
     try:
-        data = yf.download(ticker, start=start_date, end=end_date, progress=False)
-        if data.empty:
+        df = get_batch_stock_data((ticker,), start_date, end_date)
+        if df.empty or ticker not in df.columns:
             return pd.DataFrame()
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = data.columns.get_level_values(0)
-        df = data[['Close']].rename(columns={'Close': name})
-        df.index = pd.to_datetime(df.index).tz_localize(None)
-        return df
+        return df[[ticker]].rename(columns={ticker: name})
     except Exception as e:
         return pd.DataFrame()
 
 
-def normalize_data(df, method='rebase100'):
-    """데이터 표준화"""
+def normalize_data(df, method='rebase100', dtype=None):
+    """데이터 표준화
+
+    - dtype: 결과 자료형 (None이면 float64). np.float32를 주면 큰 패널을 절반 메모리로 처리
+    """
     if df.empty:
         return df
-    first_valid = df.apply(lambda x: x.dropna().iloc[0] if len(x.dropna()) > 0 else 1)
-    if method == 'rebase100':
-        return ((df / first_valid) * 100).round(1)
-    else:
-        return (((df / first_valid) - 1) * 100).round(1)
+    values = df.to_numpy(dtype=dtype or np.float64, copy=True)
+    return pd.DataFrame(_rebase(values, method), index=df.index, columns=df.columns)
+
+
+def _rebase(values, method='rebase100', out=None):
+    """컬럼별 첫 유효값 기준 리베이스 (rebase100: 기준=100, 그 외: 기준 대비 %)
+
+    컬럼별 복사본 없이 out 버퍼 하나에서 나누기/스케일/반올림을 모두 처리한다.
+    out을 생략하면 values를 그대로 덮어쓴다.
+    """
+    if out is None:
+        out = values
+    np.divide(values, _first_valid_values(values).astype(out.dtype), out=out)
+    if method != 'rebase100':
+        np.subtract(out, out.dtype.type(1), out=out)
+    np.multiply(out, out.dtype.type(100), out=out)
+    return np.round(out, 1, out=out)
+
+
+def _first_valid_values(values):
+    """2차원 배열 각 컬럼의 첫 유효값 (유효값이 없는 컬럼은 1)"""
+    if values.shape[0] == 0:
+        return np.ones(values.shape[1])
+    valid = ~np.isnan(values)
+    first_idx = valid.argmax(axis=0)
+    first = values[first_idx, np.arange(values.shape[1])]
+    return np.where(valid.any(axis=0), first, 1.0)
 
 
 def calculate_relative_strength(df, benchmark_col='코스피'):
-    """벤치마크 대비 상대강도 계산"""
+    """벤치마크 대비 상대강도 계산
+
+    모든 컬럼을 float 행렬 하나로 놓고 컬럼별 첫 유효값 기준 수익률을 한 번에 계산한다.
+    """
     if benchmark_col not in df.columns:
         return pd.DataFrame()
-    result = pd.DataFrame(index=df.index)
-    bench_first = df[benchmark_col].dropna().iloc[0] if len(df[benchmark_col].dropna()) > 0 else 1
-    bench_return = ((df[benchmark_col] / bench_first) - 1) * 100
-    for col in df.columns:
-        if col != benchmark_col:
-            first_val = df[col].dropna().iloc[0] if len(df[col].dropna()) > 0 else 1
-            stock_return = ((df[col] / first_val) - 1) * 100
-            result[col] = (stock_return - bench_return).round(1)
-    return result
+    others = [c for c in df.columns if c != benchmark_col]
+    bench = df[benchmark_col].to_numpy(dtype=np.float64)[:, None]
+    values = df[others].to_numpy(dtype=np.float64)
+    bench_return = ((bench / _first_valid_values(bench)) - 1) * 100
+    stock_return = ((values / _first_valid_values(values)) - 1) * 100
+    return pd.DataFrame(np.round(stock_return - bench_return, 1), index=df.index, columns=others)
+
+
+def _streak_matrix(values):
+    """상대수익률 행렬의 부호별 연속 일수 (NaN은 건너뜀 - 연속을 끊지도 세지도 않음)
+
+    반환: (streak, valid) - streak[t, j]는 t 시점까지 같은 부호가 이어진 유효값 개수
+    """
+    n_rows, n_cols = values.shape
+    valid = ~np.isnan(values)
+    positive = values > 0
+    rows = np.arange(n_rows)[:, None]
+
+    # 직전 유효값 위치 → 직전 유효값의 부호 (NaN 구간은 앞의 부호를 이어받음)
+    last_valid = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    filled = positive[np.maximum(last_valid, 0), np.arange(n_cols)]
+    prev_valid = np.vstack([np.full((1, n_cols), -1), last_valid[:-1]])
+    prev_sign = np.vstack([np.zeros((1, n_cols), dtype=bool), filled[:-1]])
+
+    # 부호가 바뀐(또는 첫 유효값인) 지점에서 새 연속 구간 시작
+    starts = valid & ((prev_valid < 0) | (positive != prev_sign))
+    count = np.cumsum(valid, axis=0)
+    base = np.maximum.accumulate(np.where(starts, count - 1, 0), axis=0)
+    return count - base, valid
 
 
 def calculate_outperform_days(relative_df):
-    """연속 아웃퍼폼/언더퍼폼 일수 계산"""
+    """연속 아웃퍼폼/언더퍼폼 일수 계산 (모든 컬럼을 배열 연산으로 한 번에)"""
+    values = relative_df.to_numpy(dtype=np.float64)
+    if values.shape[0] == 0:
+        return {col: {'days': 0, 'status': '-', 'relative_return': 0} for col in relative_df.columns}
+    streak, valid = _streak_matrix(values)
+    n_valid = valid.sum(axis=0)
+    last_idx = np.maximum.accumulate(np.where(valid, np.arange(len(values))[:, None], 0), axis=0)[-1]
+    latest = values[last_idx, np.arange(values.shape[1])]
     results = {}
-    for col in relative_df.columns:
-        series = relative_df[col].dropna()
-        if len(series) < 2:
+    for j, col in enumerate(relative_df.columns):
+        if n_valid[j] < 2:
             results[col] = {'days': 0, 'status': '-', 'relative_return': 0}
             continue
-        latest = series.iloc[-1]
-        is_outperform = latest > 0
-        count = 0
-        for i in range(len(series)-1, -1, -1):
-            if (series.iloc[i] > 0) == is_outperform:
-                count += 1
-            else:
-                break
+        is_outperform = latest[j] > 0
         results[col] = {
-            'days': count,
+            'days': int(streak[-1, j]),
             'status': '🔥 주도' if is_outperform else '❄️ 소외',
-            'relative_return': latest
+            'relative_return': latest[j]
         }
     return results
 
 
+def calculate_streak_history(relative_df):
+    """날짜별 연속 일수 이력 (+N: N일 연속 아웃퍼폼, -N: N일 연속 언더퍼폼, 값이 없는 날은 NaN)"""
+    values = relative_df.to_numpy(dtype=np.float64)
+    if values.shape[0] == 0:
+        return relative_df.copy()
+    streak, valid = _streak_matrix(values)
+    signed = np.where(values > 0, streak, -streak).astype(np.float64)
+    signed[~valid] = np.nan
+    return pd.DataFrame(signed, index=relative_df.index, columns=relative_df.columns)
+
+
+RANKING_COLUMNS = ['섹터', '종목', '상대수익률', '수익률', '상태', '_full_name']
+
+
+def _split_display_names(names):
+    """"[섹터]종목" 표시 이름 → (섹터, 종목) 배열 (섹터가 없으면 '-')"""
+    sectors = [n.split('[')[1].split(']')[0] if '[' in n and ']' in n else '-' for n in names]
+    stocks = [n.split(']')[-1] for n in names]
+    return np.array(sectors, dtype=object), np.array(stocks, dtype=object)
+
+
+def create_ranking_df(filtered_data, relative_df, meta=None):
+    """기간 랭킹표 (종목별 상대수익률/수익률/상태, 상대수익률 내림차순 순위)
+
+    첫/마지막 가격과 마지막 상대수익률을 행렬에서 한 번에 뽑아 계산한다.
+    가격이나 상대수익률이 없는 종목은 값 없이 '⚠️'로 표시하고 맨 뒤에 둔다.
+    meta(표시 이름 인덱스의 종목 메타데이터)가 있으면 섹터/종목명을 거기서 읽는다.
+    """
+    if relative_df.empty or filtered_data.empty:
+        return pd.DataFrame()
+    cols = relative_df.columns[relative_df.columns.isin(filtered_data.columns)]
+    if len(cols) == 0:
+        return pd.DataFrame()
+    prices = filtered_data[cols].to_numpy(dtype=np.float64)
+    first, last = prices[0], prices[-1]
+    relative = relative_df[cols].to_numpy(dtype=np.float64)[-1]
+    invalid = np.isnan(first) | np.isnan(last) | (first == 0) | np.isnan(relative)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stock_return = np.round((last / first - 1) * 100, 1)
+    rel_return = np.round(relative, 1)
+    stock_return[invalid] = np.nan
+    rel_return[invalid] = np.nan
+    status = np.where(invalid, '⚠️', np.where(rel_return > 0, '🔥', '❄️'))
+
+    if meta is not None:
+        sector = meta['sector'].reindex(cols).fillna('-').to_numpy(dtype=object)
+        stock = meta['name'].reindex(cols).to_numpy(dtype=object)
+    else:
+        sector, stock = _split_display_names(cols)
+    df = pd.DataFrame({
+        '섹터': sector,
+        '종목': stock,
+        '상대수익률': rel_return,
+        '수익률': stock_return,
+        '상태': status.astype(object),
+        '_full_name': np.asarray(cols, dtype=object),
+    })
+    df = df.sort_values('상대수익률', ascending=False, na_position='last')
+    df['순위'] = np.arange(1, len(df) + 1)
+    return df
+
+
+def fill_missing_ranking(ranking_now, ranking_prev):
+    """이전 기간 랭킹에 없는 현재 종목을 값 없는 '⚠️' 행으로 보완"""
+    prev_names = ranking_prev['_full_name'] if not ranking_prev.empty else pd.Series(dtype=object)
+    missing = ranking_now.loc[~ranking_now['_full_name'].isin(prev_names), ['섹터', '종목', '_full_name']]
+    if missing.empty:
+        return ranking_prev
+    missing_df = missing.assign(상대수익률=np.nan, 수익률=np.nan, 상태='⚠️')[RANKING_COLUMNS]
+    missing_df = missing_df.reset_index(drop=True)
+    if not ranking_prev.empty:
+        ranking_prev = pd.concat([ranking_prev, missing_df], ignore_index=True)
+        ranking_prev = ranking_prev.sort_values('상대수익률', ascending=False, na_position='last')
+    else:
+        ranking_prev = missing_df
+    ranking_prev['순위'] = np.arange(1, len(ranking_prev) + 1)
+    return ranking_prev
+
+
+def calculate_rank_changes(ranking_now, ranking_prev):
+    """현재 랭킹의 순위 변동 표시 (▲N 상승 / ▼N 하락 / - 유지 / ⚠️ 이전 값 없음)"""
+    prev_valid = ranking_prev[ranking_prev['상대수익률'].notna()]
+    prev_valid = prev_valid.drop_duplicates('_full_name', keep='last')
+    prev_rank = ranking_now['_full_name'].map(pd.Series(prev_valid['순위'].to_numpy(), index=prev_valid['_full_name']))
+    change = (prev_rank - ranking_now['순위']).to_numpy()
+    magnitude = np.abs(np.nan_to_num(change)).astype(np.int64).astype(str).astype(object)
+    labels = np.select(
+        [np.isnan(change), change > 0, change < 0],
+        ['⚠️', '▲' + magnitude, '▼' + magnitude],
+        default='-',
+    )
+    return labels.astype(object)
+
+
+def _ffill_rows(values, seed=None):
+    """2차원 배열 행 방향 forward-fill (seed: 첫 행 이전의 마지막 값)"""
+    if seed is not None:
+        values = np.vstack([seed, values])
+    idx = np.where(~np.isnan(values), np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    filled = values[idx, np.arange(values.shape[1])]
+    return filled[1:] if seed is not None else filled
+
+
+def _window_relative(bench, raw, filled):
+    """한 기간 창의 벤치마크 대비 상대수익률 (창 안에서 ffill().bfill() 후 RS와 동일)
+
+    - raw: 창 구간 원본 가격 (컬럼별 첫 유효값 = 기준가)
+    - filled: 전체 이력 기준 ffill 가격 (기준가 이후 구간은 창 안 ffill과 같음)
+    - 기준가 이전 구간은 bfill 효과로 수익률 0
+    """
+    valid = ~np.isnan(raw)
+    first_idx = valid.argmax(axis=0)
+    base = raw[first_idx, np.arange(raw.shape[1])]
+    stock_return = ((filled / base) - 1) * 100
+    stock_return[np.arange(len(raw))[:, None] < first_idx] = 0.0
+    bench = bench[:, None]
+    bench_return = ((bench / _first_valid_values(bench)) - 1) * 100
+    return np.round(stock_return - bench_return, 1)
+
+
+def _window_prices(raw, filled):
+    """한 기간 창의 가격 (창 안에서 ffill().bfill() 한 값과 같음)
+
+    - 기준가(창 안 첫 유효값) 이후는 전체 이력 기준 ffill 값, 이전은 기준가
+    - 창 안에 유효값이 없는 컬럼은 NaN
+    """
+    valid = ~np.isnan(raw)
+    first_idx = valid.argmax(axis=0)
+    base = raw[first_idx, np.arange(raw.shape[1])]
+    values = np.where(np.arange(len(raw))[:, None] < first_idx, base, filled)
+    values[:, ~valid.any(axis=0)] = np.nan
+    return values
+
+
+class RSCube:
+    """기간 × 날짜 × 종목 상대수익률 큐브 (기간별로 해당 창 길이만큼 보관)
+
+    가격 패널을 한 번 ffill 해 두고 PERIOD_OPTIONS의 모든 기간 창에 대한 벤치마크 대비
+    상대수익률을 미리 계산한다. 기간 전환/비교는 배열 조회만 하면 된다.
+    정렬된 가격 행렬을 max_back 기간 전까지 보관해 N기간 전 창(back)도 같은 행렬의
+    슬라이스로 바로 계산한다.
+    새 봉이 오면 update()로 보관 중인 가격 창 뒤에 이어 붙여 다시 계산하고,
+    장중 갱신(마지막 봉 교체)은 기간별 마지막 행만 고친다.
+
+    보관 배열은 dtype(기본 PANEL_DTYPE)으로 저장하고 읽기 전용으로 세션 간 공유한다.
+    relative()는 복사 없이 뷰를 돌려주며, 장중 갱신은 배열을 복사해 교체하므로
+    이미 받아 간 뷰는 바뀌지 않는다.
+    """
+
+    def __init__(self, prices, benchmark_col, periods=None, max_back=1, dtype=None):
+        self.benchmark_col = benchmark_col
+        self.columns = [c for c in prices.columns if c != benchmark_col]
+        self.periods = sorted(set(periods or PERIOD_OPTIONS.values()))
+        self.window = max(self.periods) * (max_back + 1)
+        self.dtype = np.dtype(dtype or PANEL_DTYPE)
+        self._lock = threading.Lock()
+        raw = prices[[benchmark_col] + self.columns].to_numpy(dtype=np.float64)
+        filled = _ffill_rows(raw)
+        self._set(raw[-self.window:], filled[-self.window:], prices.index[-self.window:])
+
+    def _set(self, raw, filled, index):
+        # 기간별 창 길이만큼만 보관 (짧은 기간을 최대 창 길이로 채우지 않음)
+        cube, bases = [], []
+        for period in self.periods:
+            rows = slice(len(raw) - min(period, len(raw)), len(raw))
+            cube.append(self._frozen(_window_relative(raw[rows, 0], raw[rows, 1:], filled[rows, 1:])))
+            # 마지막 봉 이전 구간의 기준가 (장중 갱신 시 재사용, 없으면 None)
+            head = raw[rows][:-1]
+            patchable = len(head) > 0 and not np.isnan(head).all(axis=0).any()
+            bases.append(_first_valid_values(head) if patchable else None)
+        raw, filled = self._frozen(raw), self._frozen(filled)
+        with self._lock:
+            self._raw, self._filled, self.index = raw, filled, index
+            self._cube, self._bases = cube, bases
+
+    def _frozen(self, values):
+        """보관용 읽기 전용 배열 (dtype 변환, 큰 배열의 슬라이스면 복사해 원본을 놓아줌)"""
+        values = np.array(values, dtype=self.dtype)
+        values.setflags(write=False)
+        return values
+
+    def _patched(self, values, last):
+        """마지막 행만 바꾼 읽기 전용 사본"""
+        values = values.copy()
+        values[-1] = last
+        values.setflags(write=False)
+        return values
+
+    def _patch_last(self, row):
+        """마지막 봉만 바뀐 경우 기간별 마지막 행만 다시 계산
+
+        창 안에서 마지막 봉 이전에 유효값이 없는 종목이 있으면 기준가가 바뀌므로 False
+        """
+        if any(base is None for base in self._bases):
+            return False
+        filled_row = np.where(np.isnan(row), self._filled[-2], row)
+        cube = []
+        for values, base in zip(self._cube, self._bases):
+            stock_return = ((filled_row[1:] / base[1:]) - 1) * 100
+            bench_return = ((filled_row[0] / base[0]) - 1) * 100
+            cube.append(self._patched(values, np.round(stock_return - bench_return, 1)))
+        self._raw, self._filled = self._patched(self._raw, row), self._patched(self._filled, filled_row)
+        self._cube = cube
+        return True
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return self._raw.nbytes + self._filled.nbytes + sum(values.nbytes for values in self._cube)
+
+    def update(self, prices):
+        """최신 가격 패널 반영 - 마지막 봉 교체(장중 갱신)와 새 봉 추가만 처리
+
+        보관 중인 마지막 날짜가 prices에 없거나, 보관 창이 덜 찼는데 prices에 더 앞쪽 이력이 있으면
+        (긴 기간을 골라 이력을 채운 경우) False (호출 측에서 새로 생성)
+        """
+        with self._lock:
+            raw, filled, index = self._raw, self._filled, self.index
+        pos = prices.index.searchsorted(index[-1])
+        if pos >= len(prices) or prices.index[pos] != index[-1]:
+            return False
+        if len(index) < self.window and len(prices) and prices.index[0] < index[0]:
+            return False
+        new_raw = prices.iloc[pos:][[self.benchmark_col] + self.columns].to_numpy(dtype=np.float64)
+        if len(new_raw) == 1:
+            if np.array_equal(new_raw[0], raw[-1], equal_nan=True):
+                return True
+            with self._lock:
+                if self._raw is raw and self._patch_last(new_raw[0]):
+                    return True
+        seed = filled[-2:-1] if len(filled) > 1 else np.full((1, raw.shape[1]), np.nan)
+        self._set(np.vstack([raw[:-1], new_raw])[-self.window:],
+                  np.vstack([filled[:-1], _ffill_rows(new_raw, seed)])[-self.window:],
+                  index[:-1].append(prices.index[pos:])[-self.window:])
+        return True
+
+    def window_rows(self, period_days, back=0):
+        """back 기간 전 창의 행 범위 (앞쪽 이력이 모자라면 있는 만큼, 아예 없으면 None)"""
+        end = len(self.index) - back * period_days
+        start = max(0, end - period_days)
+        return slice(start, end) if end > start else None
+
+    def relative(self, period_days, columns=None, back=0):
+        """back 기간 전 period_days 창의 상대수익률 DataFrame (calculate_relative_strength와 같은 값)"""
+        with self._lock:
+            raw, filled, index = self._raw, self._filled, self.index
+            rows = self.window_rows(period_days, back)
+            if rows is None:
+                return pd.DataFrame(columns=self.columns if columns is None else columns)
+            if back == 0 and period_days in self.periods:
+                values = self._cube[self.periods.index(period_days)]
+            else:
+                values = _window_relative(raw[rows, 0], raw[rows, 1:], filled[rows, 1:])
+        result = pd.DataFrame(values, index=index[rows], columns=self.columns, copy=False)
+        return result if columns is None else result[columns]
+
+    def prices(self, period_days, columns=None, back=0):
+        """back 기간 전 period_days 창의 가격 (벤치마크 포함, 창 안에서 ffill().bfill() 한 값과 같음)"""
+        with self._lock:
+            rows = self.window_rows(period_days, back)
+            if rows is None:
+                return pd.DataFrame(columns=[self.benchmark_col] + (self.columns if columns is None else columns))
+            values = _window_prices(self._raw[rows], self._filled[rows])
+            index = self.index[rows]
+        result = pd.DataFrame(values, index=index, columns=[self.benchmark_col] + self.columns)
+        return result if columns is None else result[[self.benchmark_col] + list(columns)]
+
+
+def _last_date(entry):
+    """보관 객체의 마지막 봉 날짜 (봉이 없으면 가장 오래된 것으로 취급)"""
+    return entry.index[-1] if len(entry.index) else pd.Timestamp.min
+
+
+class SharedRegistry:
+    """세션 간 공유하는 LRU 보관소 (조회/추가/제거/크기 합계를 잠금 하나로 보호)
+
+    객체 갱신/생성은 잠금 밖에서 하고 put()으로 넣는다. stamp가 있으면 보관 중인 객체보다
+    오래된 데이터(stamp가 더 작은 것)로는 덮어쓰지 않는다 (예전 가격을 가진 세션이 새 큐브를
+    되돌리지 않도록).
+    """
+
+    def __init__(self, stamp=_last_date):
+        self.stamp = stamp
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def values(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def retain(self, keep):
+        """keep(key)가 거짓인 항목 제거"""
+        with self._lock:
+            for key in [k for k in self._entries if not keep(k)]:
+                del self._entries[key]
+
+    def put(self, key, value, max_entries=None, budget=None):
+        """value를 key로 보관하고 개수/크기 한도를 넘는 오래 쓰지 않은 항목 제거 (방금 쓴 항목은 남김)
+
+        budget(bytes)이 있으면 항목 nbytes 합계도 한도로 본다.
+        """
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None or self.stamp is None or self.stamp(value) >= self.stamp(current):
+                self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > 1 and (
+                    (max_entries is not None and len(self._entries) > max_entries)
+                    or (budget is not None and sum(e.nbytes for e in self._entries.values()) > budget)):
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+@st.cache_resource
+def _rs_cube_registry():
+    """종목 구성/벤치마크별 RSCube 보관소 (세션 간 공유)"""
+    return SharedRegistry()
+
+
+def get_rs_cube(prices, benchmark_col, max_entries=16, budget_mb=None):
+    """가격 패널에 맞는 RSCube 반환 (같은 종목 구성이면 새 봉만 반영해 재사용)
+
+    보관 개수가 max_entries를 넘거나 전체 크기가 budget_mb(기본 PANEL_MEMORY_BUDGET_MB에서
+    시리즈 캐시 사용량을 뺀 값)를 넘으면 가장 오래 쓰지 않은 큐브부터 제거한다 (방금 쓴 큐브는 남김).
+    """
+    registry = _rs_cube_registry()
+    if budget_mb is None:
+        budget = PANEL_MEMORY_BUDGET_MB * 2 ** 20 - get_series_cache().nbytes
+    else:
+        budget = budget_mb * 2 ** 20
+    key = (tuple(prices.columns), benchmark_col)
+    cube = registry.get(key)
+    if cube is None or not cube.update(prices):
+        cube = RSCube(prices, benchmark_col)
+    registry.put(key, cube, max_entries, budget)
+    return cube
+
+
+def panel_memory_report(frames):
+    """이번 실행(세션)이 만든 프레임과 세션 간 공유 데이터의 메모리 사용량 (bytes)
+
+    공유 큐브 배열을 그대로 보는 뷰 프레임은 세션 사용량에서 빼고 공유 쪽으로만 센다.
+    """
+    cube_arrays = []
+    for cube in _rs_cube_registry().values():
+        cube_arrays.extend([cube._raw, cube._filled, *cube._cube])
+    by_frame = {}
+    for name, frame in frames.items():
+        if frame is None or frame.empty:
+            continue
+        values = frame.to_numpy() if len(set(frame.dtypes)) == 1 else None
+        if values is not None and any(np.may_share_memory(values, a) for a in cube_arrays):
+            continue
+        by_frame[name] = int(frame.memory_usage(index=True).sum())
+    shared = sum(a.nbytes for a in cube_arrays) + get_series_cache().nbytes
+    return {
+        'session': sum(by_frame.values()),
+        'frames': by_frame,
+        'shared': shared,
+        'budget': int(PANEL_MEMORY_BUDGET_MB * 2 ** 20),
+    }
+
+
+class RSState:
+    """한 기간 창의 누적 상태 (기준가, 마지막 가격, 마지막 상대수익률, 부호 있는 연속 일수)
+
+    창 시작일이 그대로인 채 봉이 하나 추가되거나(이력이 기간보다 짧은 경우) 마지막 봉이
+    장중 갱신되면 창 전체를 다시 계산하지 않고 O(종목 수)로 갱신한다.
+    결과는 창에 ffill().bfill() 후 calculate_relative_strength/calculate_outperform_days와 같다.
+    세션 간 공유되므로 상태 확인과 갱신은 잠금 안에서 한 번에 한다 (같은 봉이 두 번 추가되지 않음).
+    """
+
+    def __init__(self, window, benchmark_col):
+        self._lock = threading.RLock()
+        self.benchmark_col = benchmark_col
+        self.columns = [c for c in window.columns if c != benchmark_col]
+        raw = window[[benchmark_col] + self.columns].to_numpy(dtype=np.float64)
+        filled = _ffill_rows(raw)
+        relative = _window_relative(filled[:, 0], raw[:, 1:], filled[:, 1:])
+        streak, valid = _streak_matrix(relative)
+        signed = np.where(relative > 0, streak, -streak)
+        # NaN 행은 직전 유효값의 연속 일수를 이어받음
+        last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(raw))[:, None], -1), axis=0)
+        held = signed[np.maximum(last_valid, 0), np.arange(len(self.columns))]
+        held[last_valid < 0] = 0
+
+        self.index = window.index
+        self.base = _first_valid_values(raw)
+        self.last_prices = filled[-1] if len(raw) else np.full(raw.shape[1], np.nan)
+        self.relative = relative[-1] if len(raw) else np.full(len(self.columns), np.nan)
+        self._streak = held[-1] if len(raw) else np.zeros(len(self.columns), dtype=np.int64)
+        self._n_valid = valid.sum(axis=0)
+        # 마지막 봉 교체용 직전 상태
+        self._prev = (filled[-2], held[-2], self._n_valid - valid[-1]) if len(raw) > 1 else None
+
+    def _advance(self, prev_prices, prev_streak, prev_n_valid, row):
+        # 창 안에 유효값이 없던 종목이 새로 생기면 기준가가 바뀌므로 증분 갱신 불가
+        if (np.isnan(prev_prices) & ~np.isnan(row)).any():
+            return None
+        filled_row = np.where(np.isnan(row), prev_prices, row)
+        stock_return = ((filled_row[1:] / self.base[1:]) - 1) * 100
+        bench_return = ((filled_row[0] / self.base[0]) - 1) * 100
+        relative = np.round(stock_return - bench_return, 1)
+        valid = ~np.isnan(relative)
+        positive = relative > 0
+        step = np.where(positive, 1, -1)
+        same_sign = (positive & (prev_streak > 0)) | (~positive & (prev_streak < 0))
+        streak = np.where(valid, np.where(same_sign, prev_streak + step, step), prev_streak)
+        return filled_row, relative, streak, prev_n_valid + valid
+
+    def append(self, date, row):
+        """같은 창에 새 봉 추가 (row: 벤치마크, columns 순서). 증분 갱신이 불가하면 False"""
+        with self._lock:
+            result = self._advance(self.last_prices, self._streak, self._n_valid, row)
+            if result is None:
+                return False
+            self._prev = (self.last_prices, self._streak, self._n_valid)
+            self.last_prices, self.relative, self._streak, self._n_valid = result
+            self.index = self.index.append(pd.DatetimeIndex([date]))
+        return True
+
+    def replace_last(self, row):
+        """마지막 봉 교체 (장중 갱신). 증분 갱신이 불가하면 False"""
+        with self._lock:
+            if self._prev is None:
+                return False
+            result = self._advance(*self._prev, row)
+            if result is None:
+                return False
+            self.last_prices, self.relative, self._streak, self._n_valid = result
+        return True
+
+    def sync(self, window):
+        """최신 창 반영 - 같은 시작일에서 마지막 봉 교체/새 봉 하나 추가면 증분 갱신, 아니면 False"""
+        values = window[[self.benchmark_col] + self.columns]
+        with self._lock:
+            if len(window) == 0 or len(self.index) == 0 or window.index[0] != self.index[0]:
+                return False
+            first = values.iloc[0].to_numpy(dtype=np.float64)
+            # 수정주가 반영 등으로 이력이 바뀌었으면 기준가부터 다시 계산
+            if not np.array_equal(first[~np.isnan(first)], self.base[~np.isnan(first)]):
+                return False
+            n_old = len(self.index)
+            if len(window) == n_old and window.index[-1] == self.index[-1]:
+                anchor = self._prev[0] if self._prev is not None else None
+            elif len(window) == n_old + 1 and window.index[-2] == self.index[-1]:
+                anchor = self.last_prices
+            else:
+                return False
+            if anchor is not None and len(window) > 1:
+                before = values.iloc[-2].to_numpy(dtype=np.float64)
+                if not np.array_equal(np.where(np.isnan(before), anchor, before), anchor, equal_nan=True):
+                    return False
+            row = values.iloc[-1].to_numpy(dtype=np.float64)
+            if len(window) == n_old:
+                return self.replace_last(row)
+            return self.append(window.index[-1], row)
+
+    def latest(self):
+        """종목별 최신 값 (return: 수익률 %, relative_return: 상대수익률 %p, days/status: 연속 구간)"""
+        with self._lock:
+            last_prices, relative, streak, n_valid = self.last_prices, self.relative, self._streak, self._n_valid
+        enough = n_valid >= 2
+        outperform = relative > 0
+        return pd.DataFrame({
+            'return': np.round(((last_prices[1:] / self.base[1:]) - 1) * 100, 1),
+            'relative_return': np.where(enough, relative, 0),
+            'days': np.where(enough, np.abs(streak), 0),
+            'status': np.where(enough, np.where(outperform, '🔥 주도', '❄️ 소외'), '-'),
+        }, index=self.columns)
+
+
+@st.cache_resource
+def _rs_state_registry():
+    """종목 구성/벤치마크/기간별 RSState 보관소 (세션 간 공유)"""
+    return SharedRegistry()
+
+
+def get_rs_state(window, benchmark_col, period_days, max_entries=64):
+    """기간 창에 맞는 RSState 반환 (장중 갱신/봉 추가는 증분 갱신, 창이 밀리면 새로 생성)"""
+    registry = _rs_state_registry()
+    key = (tuple(window.columns), benchmark_col, period_days)
+    state = registry.get(key)
+    if state is None or not state.sync(window):
+        state = RSState(window, benchmark_col)
+    registry.put(key, state, max_entries)
+    return state
+
+
+def _read_only(values):
+    """세션 간 공유하는 배열을 읽기 전용으로 표시 (제자리 수정 방지)"""
+    values.setflags(write=False)
+    return values
+
+
+def _daily_returns(filled, seed=None):
+    """ffill 가격 → 일간 수익률 (첫 행/상장 전은 NaN, seed: 첫 행 이전 가격)"""
+    prev = np.vstack([seed if seed is not None else np.full((1, filled.shape[1]), np.nan), filled[:-1]])
+    return filled / prev - 1
+
+
+def _rolling_sum(values, window):
+    """행 방향 창 합계 (누적합 차이 - 창 길이와 무관하게 O(행 × 열), 앞쪽은 있는 행까지 합계)"""
+    total = np.cumsum(values, axis=0)
+    total[window:] -= total[:-window].copy()
+    return total
+
+
+class RollingStats:
+    """롤링 베타/상관계수 엔진 (벤치마크 포함 전 종목)
+
+    최근 창의 짝별 합계 행렬(n, Σx_i, Σx_i², Σx_i·x_j - i, j 둘 다 유효한 날만)을 들고 있다가
+    새 봉이 오면 들어오는 행을 더하고 빠지는 행을 빼는 rank-1 갱신만 한다 (O(종목²)).
+    종목 × 종목 상관행렬과 종목별 벤치마크 베타(행렬의 벤치마크 행/열)가 여기서 바로 나온다.
+    베타 이력은 누적합 차이로 모든 창의 합계를 한 번에 구한다 (창마다 다시 더하지 않음).
+
+    세션 간 공유되므로 보관 배열은 읽기 전용으로 두고, update()는 새 배열을 만들어 잠금 안에서
+    통째로 바꾼다 (이미 읽어 간 배열은 바뀌지 않고, 같은 봉을 두 세션이 반영해도 한 번만 들어감).
+    """
+
+    def __init__(self, prices, benchmark_col, window=60, min_periods=None):
+        self.benchmark_col = benchmark_col
+        self.columns = [c for c in prices.columns if c != benchmark_col]
+        self.window = window
+        self.min_periods = min_periods or window
+        self._lock = threading.Lock()
+        raw = prices[[benchmark_col] + self.columns].to_numpy(dtype=np.float64)
+        filled = _ffill_rows(raw)
+        self.index = prices.index
+        self._returns = _read_only(_daily_returns(filled))
+        self._prev_filled = filled[-2:-1] if len(filled) > 1 else np.full((1, raw.shape[1]), np.nan)
+        self._last_raw = raw[-1].copy()
+        self._matrix = _read_only(self._window_sums(self._returns[-window:]))
+
+    @staticmethod
+    def _window_sums(rows):
+        """짝별 합계 행렬 [n, Σx_i, Σx_i², Σx_i·x_j] (행렬 [i, j]는 i, j 모두 유효한 날의 합)"""
+        rows = np.atleast_2d(rows)
+        mask = (~np.isnan(rows)).astype(np.float64)
+        z = np.nan_to_num(rows)
+        return np.stack([mask.T @ mask, z.T @ mask, (z * z).T @ mask, z.T @ z])
+
+    def update(self, prices):
+        """최신 가격 패널 반영 - 마지막 봉 교체(장중 갱신)와 새 봉 추가만 증분 처리
+
+        보관 중인 마지막 날짜가 prices에 없거나 prices에 더 앞쪽 이력이 있으면(긴 기간을 골라 이력을
+        채운 경우) False (호출 측에서 새로 생성)
+        위치 확인부터 교체까지 잠금 안에서 하므로 다른 세션이 이미 반영한 봉은 다시 더하지 않는다.
+        """
+        with self._lock:
+            pos = prices.index.searchsorted(self.index[-1])
+            if pos >= len(prices) or prices.index[pos] != self.index[-1] or prices.index[0] < self.index[0]:
+                return False
+            new_raw = prices.iloc[pos:][[self.benchmark_col] + self.columns].to_numpy(dtype=np.float64)
+            if len(new_raw) == 1 and np.array_equal(new_raw[0], self._last_raw, equal_nan=True):
+                return True
+            # 보관 중인 마지막 봉부터 직전 봉 가격 기준으로 수익률을 다시 계산
+            filled = _ffill_rows(new_raw, self._prev_filled)
+            returns = _daily_returns(filled, self._prev_filled)
+            matrix = self._matrix + self._window_sums(returns[0]) - self._window_sums(self._returns[-1])
+            history = np.vstack([self._returns[:-1], returns])
+            for t in range(len(self._returns), len(history)):
+                matrix += self._window_sums(history[t])
+                if t >= self.window:
+                    matrix -= self._window_sums(history[t - self.window])
+            self._matrix, self._returns = _read_only(matrix), _read_only(history)
+            self._last_raw = new_raw[-1].copy()
+            if len(returns) > 1:
+                self.index = self.index.append(prices.index[pos + 1:])
+                self._prev_filled = filled[-2:-1]
+        return True
+
+    def latest(self):
+        """종목별 최근 창 벤치마크 베타/상관계수 (beta, correlation, days: 창 안 유효일 수)"""
+        with self._lock:
+            n_mat, sx_mat, sxx_mat, sxy_mat = self._matrix
+            n, sxy = n_mat[0, 1:], sxy_mat[0, 1:]
+            sx, sy = sx_mat[1:, 0], sx_mat[0, 1:]
+            sxx, syy = sxx_mat[1:, 0], sxx_mat[0, 1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = n * sxy - sx * sy
+            beta = cov / (n * syy - sy * sy)
+            corr = cov / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+        short = n < self.min_periods
+        beta[short] = np.nan
+        corr[short] = np.nan
+        return pd.DataFrame({'beta': beta, 'correlation': np.clip(corr, -1, 1), 'days': n.astype(int)},
+                            index=self.columns)
+
+    def beta_history(self, columns=None):
+        """날짜 × 종목 롤링 베타 (유효한 날이 min_periods 미만인 창은 NaN)"""
+        columns = self.columns if columns is None else list(columns)
+        idx = pd.Index(self.columns).get_indexer(columns) + 1
+        with self._lock:
+            y = self._returns[:, :1]
+            x = self._returns[:, idx]
+            index = self.index
+        valid = ~np.isnan(x) & ~np.isnan(y)
+        xz = np.where(valid, x, 0.0)
+        yz = np.where(valid, y, 0.0)
+        n, sx, sy, sxy, syy = (_rolling_sum(term, self.window)
+                               for term in (valid.astype(np.float64), xz, yz, xz * yz, yz * yz))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = (n * sxy - sx * sy) / (n * syy - sy * sy)
+        beta[n < self.min_periods] = np.nan
+        return pd.DataFrame(beta, index=index, columns=columns)
+
+    def correlation(self, columns=None):
+        """최근 창 종목 × 종목 상관행렬 (벤치마크 포함, 짝별로 둘 다 유효한 날만 사용)"""
+        with self._lock:
+            n, sx, sxx, sxy = self._matrix
+            with np.errstate(divide='ignore', invalid='ignore'):
+                corr = (n * sxy - sx * sx.T) / np.sqrt((n * sxx - sx * sx) * (n * sxx.T - sx.T * sx.T))
+        corr = np.clip(corr, -1, 1)
+        corr[n < 3] = np.nan
+        names = [self.benchmark_col] + self.columns
+        result = pd.DataFrame(corr, index=names, columns=names)
+        return result if columns is None else result.loc[columns, columns]
+
+
+@st.cache_resource
+def _rolling_stats_registry():
+    """종목 구성/벤치마크/창 길이별 RollingStats 보관소 (세션 간 공유)"""
+    return SharedRegistry()
+
+
+def get_rolling_stats(prices, benchmark_col, window, max_entries=8):
+    """가격 패널에 맞는 RollingStats 반환 (같은 종목 구성이면 새 봉만 반영해 재사용)"""
+    registry = _rolling_stats_registry()
+    key = (tuple(prices.columns), benchmark_col, window)
+    stats = registry.get(key)
+    if stats is None or not stats.update(prices):
+        stats = RollingStats(prices, benchmark_col, window)
+    registry.put(key, stats, max_entries)
+    return stats
+
+
+@st.cache_resource
+def _shares_registry():
+    """티커별 상장주식수 보관소 (프로세스당 한 번 받음, 못 받은 티커는 NaN)"""
+    return {}
+
+
+def get_shares_outstanding(tickers, deadline_seconds=FETCH_DEADLINE_SECONDS):
+    """tickers의 상장주식수 배열 (시가총액 가중용)
+
+    처음 보는 티커만 청크로 나눠 다운로드 스레드 풀에서 받는다. 마감을 넘긴 청크는 이번에는
+    NaN으로 두고, 도착하면 보관소에 들어가 다음 rerun부터 반영된다.
+    """
+    registry = _shares_registry()
+    missing = [t for t in dict.fromkeys(tickers) if t not in registry]
+    if missing:
+        provider, executor = get_price_provider(), get_fetch_executor()
+
+        def fetch(chunk):
+            try:
+                shares = provider.shares_outstanding(chunk)
+            except Exception:
+                shares = {}
+            registry.update({t: float(shares.get(t) or np.nan) for t in chunk})
+
+        futures = [executor.submit(fetch, missing[i:i + FETCH_CHUNK_SIZE])
+                   for i in range(0, len(missing), FETCH_CHUNK_SIZE)]
+        wait(futures, timeout=deadline_seconds)
+    return np.array([registry.get(t, np.nan) for t in tickers], dtype=np.float64)
+
+
+class SectorComposite:
+    """섹터 합성 지수 (구성 종목 동일가중 / 시가총액가중, 시작=100)
+
+    가격 행렬(날짜 × 종목)을 ffill 한 뒤 컬럼을 섹터 순으로 모아 두고 섹터 구간 합(reduceat)
+    한 번으로 모든 섹터의 일간 수익률을 구해 누적한다 (전일과 당일 가격이 모두 있는 종목만
+    그날 계산에 들어감).
+    - equal: 구성 종목 일간 수익률의 단순 평균
+    - cap: 전일 시가총액 가중 평균 = Σ(주식수 × 당일가) / Σ(주식수 × 전일가) - 1
+      주식수를 아는 종목이 없는 섹터는 동일가중 수익률로 대신함
+    새 봉은 update()로 보관 중인 마지막 두 봉과 지수 수준에서 이어 계산한다.
+    """
+
+    METHODS = ('equal', 'cap')
+
+    def __init__(self, prices, groups, shares=None):
+        """groups: 컬럼별 섹터 이름 (None/NaN이면 어느 합성 지수에도 넣지 않음)"""
+        codes, self.sectors = pd.factorize(pd.Series(groups, index=prices.columns), sort=False)
+        # 섹터 소속 종목만 섹터 순으로 (섹터별 구간 시작 위치로 합산)
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0]
+        self.columns = [prices.columns[i] for i in order]
+        self._starts = np.searchsorted(codes[order], np.arange(len(self.sectors)))
+        shares = np.full(len(codes), np.nan) if shares is None else np.asarray(shares, dtype=np.float64)
+        shares = np.where(shares > 0, shares, np.nan)[order]
+        self._shares = shares if not np.isnan(shares).all() else None
+        self._lock = threading.Lock()
+
+        filled = _ffill_rows(prices[self.columns].to_numpy(dtype=np.float64))
+        returns = self._returns(filled)
+        levels = {m: np.vstack([np.full((1, len(self.sectors)), 100.0),
+                                100.0 * np.cumprod(1 + returns[m], axis=0)]) for m in self.METHODS}
+        self._set(filled[-2:], levels, prices.index)
+
+    def _set(self, tail, levels, index):
+        with self._lock:
+            self._tail, self._levels, self.index = tail, levels, index
+
+    def _group_sum(self, values):
+        """(행 × 종목) → (행 × 섹터) 섹터별 합"""
+        if values.shape[1] == 0:
+            return np.zeros((len(values), len(self.sectors)))
+        return np.add.reduceat(values, self._starts, axis=1)
+
+    def _returns(self, filled):
+        """연속한 두 행 사이의 섹터별 일간 수익률 {방법: (행 수 - 1) × 섹터}"""
+        prev, cur = filled[:-1], filled[1:]
+        both = ~np.isnan(prev) & ~np.isnan(cur)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stock_return = np.where(both, cur / prev - 1, 0.0)
+            count = self._group_sum(both.astype(np.float64))
+            equal = np.where(count > 0, self._group_sum(stock_return) / count, 0.0)
+            if self._shares is None:
+                return {'equal': equal, 'cap': equal}
+            capped = both & ~np.isnan(self._shares)
+            cap_now = self._group_sum(np.where(capped, cur * self._shares, 0.0))
+            cap_prev = self._group_sum(np.where(capped, prev * self._shares, 0.0))
+            cap = np.where(cap_prev > 0, cap_now / cap_prev - 1, equal)
+        return {'equal': equal, 'cap': cap}
+
+    def update(self, prices):
+        """최신 가격 패널 반영 - 마지막 봉 교체(장중 갱신)와 새 봉 추가만 처리
+
+        보관 중인 마지막 날짜가 prices에 없거나, 이력이 두 봉 미만이거나, prices에 더 앞쪽 이력이
+        있으면(긴 기간을 골라 이력을 채운 경우) False (호출 측에서 새로 생성)
+        """
+        with self._lock:
+            tail, levels, index = self._tail, self._levels, self.index
+        pos = prices.index.searchsorted(index[-1])
+        if len(index) < 2 or pos >= len(prices) or prices.index[pos] != index[-1]:
+            return False
+        if prices.index[0] < index[0]:
+            return False
+        new_raw = prices.iloc[pos:][self.columns].to_numpy(dtype=np.float64)
+        block = np.vstack([tail[:1], _ffill_rows(new_raw, tail[:1])])
+        returns = self._returns(block)
+        levels = {m: np.vstack([levels[m][:-1], levels[m][-2] * np.cumprod(1 + returns[m], axis=0)])
+                  for m in self.METHODS}
+        self._set(block[-2:], levels, index[:-1].append(prices.index[pos:]))
+        return True
+
+    def levels(self, method='equal'):
+        """섹터 합성 지수 DataFrame (index=날짜, columns=섹터, 시작=100)"""
+        with self._lock:
+            values, index = self._levels[method], self.index
+        return pd.DataFrame(values, index=index, columns=list(self.sectors), copy=False)
+
+
+@st.cache_resource
+def _sector_composite_registry():
+    """종목 구성/섹터 구분/주식수별 SectorComposite 보관소 (세션 간 공유)"""
+    return SharedRegistry()
+
+
+def get_sector_composite(prices, groups, shares=None, max_entries=8):
+    """가격 패널에 맞는 SectorComposite 반환 (같은 구성이면 새 봉만 반영해 재사용)"""
+    registry = _sector_composite_registry()
+    shares_key = None if shares is None else tuple(np.nan_to_num(shares, nan=-1.0))
+    key = (tuple(prices.columns), tuple(pd.Series(groups).fillna('')), shares_key)
+    composite = registry.get(key)
+    if composite is None or not composite.update(prices):
+        composite = SectorComposite(prices, groups, shares)
+    registry.put(key, composite, max_entries)
+    return composite
+
+
+def load_universe(path=None):
+    """전체 종목 목록 (code, name, market) - 목록 파일이 없으면 섹터 정의 종목으로 대신함"""
+    path = path or UNIVERSE_PATH
+    if os.path.exists(path):
+        universe = pd.read_csv(path, dtype=str)[['code', 'name', 'market']]
+        universe['market'] = universe['market'].str.lower()
+    else:
+        rows = [(stock['code'], stock['name'], market)
+                for sectors in (SECTORS_KR, SECTORS_US)
+                for by_market in sectors.values()
+                for market, stocks in by_market.items()
+                for stock in stocks]
+        universe = pd.DataFrame(rows, columns=['code', 'name', 'market'])
+    universe = universe[~universe['code'].str.startswith('^')]
+    return universe.drop_duplicates('code').reset_index(drop=True)
+
+
+@st.cache_resource
+def get_universe():
+    """전체 종목 목록 (프로세스당 한 번 읽음)"""
+    return load_universe()
+
+
+def calculate_rs_rating(prices, weights=RS_RATING_WEIGHTS):
+    """종목 전체 횡단면 RS 등급 (1~99 백분위)
+
+    기간별 수익률(마지막 가격 / h거래일 전 가격)을 가중합한 점수를 전체 종목에서 백분위로
+    바꾼다. 벤치마크 수익률은 모든 종목에 같게 빠지므로 순위에 영향을 주지 않는다.
+    이력이 짧은 종목은 있는 기간만으로 가중치를 다시 나누고, 가장 짧은 기간도
+    채우지 못한 종목은 등급 없음(NaN).
+
+    반환: (returns (기간 × 종목, %), score (종목), rating (종목))
+    """
+    values = _ffill_rows(prices.to_numpy(dtype=np.float64))
+    horizons = np.array([h for h, _ in weights])
+    weight = np.array([w for _, w in weights])[:, None]
+    base_idx = len(values) - 1 - horizons
+    base = values[np.maximum(base_idx, 0)]
+    base[base_idx < 0] = np.nan
+    returns = (values[-1] / base - 1) * 100
+
+    available = ~np.isnan(returns)
+    score = np.nansum(weight * returns, axis=0) / (weight * available).sum(axis=0)
+    score[~available[np.argmin(horizons)]] = np.nan
+    pct = pd.Series(score).rank(pct=True).to_numpy()
+    rating = np.clip(np.ceil(pct * 99), 1, 99)
+    return returns, score, rating
+
+
+def build_rs_rating_table(prices, universe, benchmark_col=None, weights=RS_RATING_WEIGHTS):
+    """RS 등급표 (종목별 등급, 점수, 기간별 수익률/벤치마크 대비 상대수익률)
+
+    - prices: 종목 코드 컬럼 종가 패널 (benchmark_col 포함 가능)
+    - universe: load_universe() 형식 (code, name, market)
+    """
+    codes = [c for c in universe['code'] if c in prices.columns and c != benchmark_col]
+    if prices.empty or not codes:
+        columns = ['name', 'market', 'rating', 'score'] + [
+            f'{kind}_{h}d' for h, _ in weights for kind in ('return', 'rs')]
+        return pd.DataFrame(columns=columns).rename_axis('code')
+    returns, score, rating = calculate_rs_rating(prices[codes], weights)
+    table = universe.set_index('code').loc[codes, ['name', 'market']]
+    table['rating'] = rating
+    table['score'] = np.round(score, 1)
+    if benchmark_col in prices.columns:
+        bench_returns = calculate_rs_rating(prices[[benchmark_col]], weights)[0][:, 0]
+    else:
+        bench_returns = np.full(len(weights), np.nan)
+    for (horizon, _), stock_return, bench_return in zip(weights, returns, bench_returns):
+        table[f'return_{horizon}d'] = np.round(stock_return, 1)
+        table[f'rs_{horizon}d'] = np.round(stock_return - bench_return, 1)
+    table = table[table['rating'].notna()].sort_values('score', ascending=False, kind='stable')
+    table['rating'] = table['rating'].astype(int)
+    table.index.name = 'code'
+    return table
+
+
+@st.cache_resource
+def _rs_rating_registry():
+    """기준일/유니버스/벤치마크별 RS 등급표 보관소 (하루 한 번 계산, 세션 간 공유)"""
+    return SharedRegistry(stamp=None)
+
+
+def get_rs_rating_table(universe, benchmark_ticker, as_of):
+    """as_of 날짜 기준 RS 등급표 - 같은 날에는 계산해 둔 표를 그대로 반환"""
+    registry = _rs_rating_registry()
+    key = (tuple(universe['code']), benchmark_ticker, as_of)
+    table = registry.get(key)
+    if table is None:
+        end_date = datetime.strptime(as_of, '%Y-%m-%d').date() + timedelta(days=1)
+        start_date = end_date - timedelta(days=RS_RATING_HISTORY_DAYS)
+        tickers = tuple(sorted(set(universe['code']) | {benchmark_ticker}))
+        prices = get_batch_stock_data(tickers, str(start_date), str(end_date))
+        table = build_rs_rating_table(prices, universe, benchmark_ticker)
+        # 지난 날짜의 표는 버림
+        registry.retain(lambda k: k[2] == as_of)
+        registry.put(key, table)
+    return table
+
+
+SCAN_COLUMNS = ['return', 'relative_return', 'days']
+
+
+def summarize_relative_strength(window, benchmark_col, relative=None):
+    """기간 창의 종목별 요약 열 (수익률 %, 상대수익률 %p, 부호 있는 연속 일수)
+
+    window는 벤치마크 거래일 기준으로 자르고 ffill().bfill()을 거친 가격 창.
+    relative(같은 창의 calculate_relative_strength 결과, 예: RSCube.relative())가 있으면 그대로 쓴다.
+    days: +N은 N일 연속 아웃퍼폼, -N은 N일 연속 언더퍼폼 (calculate_outperform_days와 같은 기준,
+    유효값이 2개 미만이면 0).
+    반올림으로 생긴 -0.0은 0.0으로 바꿔 둔다 (표에 "-0.0%p"로 보이지 않게).
+    """
+    if relative is None:
+        relative = calculate_relative_strength(window, benchmark_col)
+    if relative.empty:
+        n = len(relative.columns)
+        return pd.DataFrame({'return': np.full(n, np.nan), 'relative_return': np.full(n, np.nan),
+                             'days': np.zeros(n, dtype=np.int64)}, index=relative.columns)
+    prices = window[relative.columns].to_numpy(dtype=np.float64)
+    values = relative.to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stock_return = np.round((prices[-1] / _first_valid_values(prices) - 1) * 100, 1)
+
+    streak, valid = _streak_matrix(values)
+    last_idx = np.maximum.accumulate(np.where(valid, np.arange(len(values))[:, None], 0), axis=0)[-1]
+    latest = values[last_idx, np.arange(values.shape[1])]
+    days = np.where(latest > 0, streak[-1], -streak[-1])
+    days[valid.sum(axis=0) < 2] = 0
+    return pd.DataFrame({'return': stock_return + 0.0, 'relative_return': latest + 0.0, 'days': days},
+                        index=relative.columns)
+
+
+class ScanCheckpoint:
+    """시장 스캔 체크포인트 (로컬 SQLite)
+
+    - scan_chunks: 스캔별로 끝난 청크 번호
+    - scan_results: 끝난 청크의 종목별 요약 (수익률/상대수익률/연속 일수)
+    같은 스캔을 다시 돌리면 끝난 청크는 건너뛰고 남은(실패한) 청크만 받는다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scan_chunks ("
+                " scan TEXT NOT NULL, as_of TEXT NOT NULL, chunk INTEGER NOT NULL,"
+                " PRIMARY KEY (scan, chunk)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scan_results ("
+                " scan TEXT NOT NULL, code TEXT NOT NULL, ret REAL, relative_return REAL,"
+                " days INTEGER, PRIMARY KEY (scan, code)) WITHOUT ROWID"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def completed(self, scan):
+        """끝난 청크 번호 집합"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT chunk FROM scan_chunks WHERE scan = ?", (scan,)).fetchall()
+        return {chunk for chunk, in rows}
+
+    def save(self, scan, as_of, chunk, summary):
+        """청크 결과와 완료 표시를 한 트랜잭션으로 저장"""
+        rows = [(scan, code, ret, rel, int(days))
+                for code, ret, rel, days in summary[SCAN_COLUMNS].itertuples(name=None)]
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO scan_results (scan, code, ret, relative_return, days)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO scan_chunks (scan, as_of, chunk) VALUES (?, ?, ?)",
+                (scan, as_of, chunk),
+            )
+
+    def load(self, scan):
+        """스캔 결과 (index=code, columns=SCAN_COLUMNS)"""
+        with self._connect() as conn:
+            result = pd.read_sql_query(
+                "SELECT code, ret AS return, relative_return, days FROM scan_results WHERE scan = ?",
+                conn, params=(scan,),
+            )
+        return result.set_index('code')
+
+    def prune(self, as_of):
+        """as_of가 아닌 날짜의 스캔 기록 삭제"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM scan_results WHERE scan IN"
+                " (SELECT DISTINCT scan FROM scan_chunks WHERE as_of != ?)",
+                (as_of,),
+            )
+            conn.execute("DELETE FROM scan_chunks WHERE as_of != ?", (as_of,))
+
+
+@st.cache_resource
+def get_scan_checkpoint():
+    """프로세스 전체에서 공유하는 시장 스캔 체크포인트 (공급자별로 파일 분리)"""
+    path = SCAN_CHECKPOINT_PATH
+    provider = get_price_provider()
+    if provider.name != YFinanceProvider.name:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{provider.name}{ext}"
+    return ScanCheckpoint(path)
+
+
+class MarketScanner:
+    """전체 시장 상대강도 스캐너 (청크 단위 다운로드 + 체크포인트 이어받기)
+
+    종목 목록을 chunk_size개씩 나눠 get_batch_stock_data_partial로 받는다 (티커별 캐시, 로컬
+    가격 저장소, 동시 다운로드 제한을 대시보드와 똑같이 거침). 청크마다 기간 수익률·상대수익률·
+    연속 일수를 계산해 체크포인트에 저장하므로, 실패한 청크는 다시 시도하고 중단된 스캔은
+    남은 청크부터 이어간다.
+    """
+
+    def __init__(self, universe, benchmark_ticker, period_days, as_of, checkpoint,
+                 chunk_size=SCAN_CHUNK_SIZE):
+        self.universe = universe.drop_duplicates('code').set_index('code')[['name', 'market']]
+        self.benchmark_ticker = benchmark_ticker
+        self.period_days = period_days
+        self.as_of = as_of
+        self.checkpoint = checkpoint
+        codes = [c for c in self.universe.index if c != benchmark_ticker]
+        self.chunks = [codes[i:i + chunk_size] for i in range(0, len(codes), chunk_size)]
+        # 종목 목록/청크 크기/벤치마크/기간/기준일이 같으면 같은 스캔 (체크포인트 키)
+        digest = hashlib.sha1("\n".join(codes).encode()).hexdigest()[:16]
+        self.key = f"{as_of}|{benchmark_ticker}|{period_days}|{chunk_size}|{digest}"
+        self.end_date = str(datetime.strptime(as_of, '%Y-%m-%d').date() + timedelta(days=1))
+        self.start_date = str(datetime.strptime(self.end_date, '%Y-%m-%d').date()
+                              - timedelta(days=int(period_days * 1.6) + 30))
+        self.failed = []
+
+    @property
+    def total_chunks(self):
+        return len(self.chunks)
+
+    def completed_chunks(self):
+        return len(self.checkpoint.completed(self.key) & set(range(len(self.chunks))))
+
+    def _scan_chunk(self, i):
+        """청크 하나를 받아 요약 저장 - 다운로드 오류/빈 결과인 티커가 있으면 저장하지 않고 실패(False)
+
+        yfinance는 오류를 빈 결과로 돌려주므로 빈 결과도 실패로 보고 청크를 다시 시도할 수 있게 둔다.
+        저장소에 이력은 있지만 기간 안에 봉이 없는 티커는 결과에서만 빠진다.
+        """
+        bench = self.benchmark_ticker
+        prices, report = get_batch_stock_data_partial(tuple(self.chunks[i]) + (bench,),
+                                                      self.start_date, self.end_date, deadline_seconds=None)
+        if report['failed'] or bench not in prices.columns:
+            return False
+        window = prices.dropna(subset=[bench]).tail(self.period_days).ffill().bfill()
+        self.checkpoint.save(self.key, self.as_of, i, summarize_relative_strength(window, bench))
+        return True
+
+    def scan(self, progress=None, max_retries=SCAN_MAX_RETRIES):
+        """남은 청크를 받아 결과 반환 - 실패한 청크는 max_retries번까지 다시 시도
+
+        progress(끝난 청크 수, 전체 청크 수)를 청크마다 호출한다.
+        끝까지 실패한 청크 번호는 self.failed에 남고, 다음 scan()에서 그 청크만 다시 받는다.
+        """
+        self.checkpoint.prune(self.as_of)
+        done = self.checkpoint.completed(self.key)
+        todo = [i for i in range(len(self.chunks)) if i not in done]
+        for _ in range(max_retries + 1):
+            failed = []
+            for i in todo:
+                try:
+                    ok = self._scan_chunk(i)
+                except (OSError, sqlite3.Error):
+                    # 네트워크/저장소 오류만 실패 청크로 넘김 (그 외 예외는 버그이므로 그대로 올림)
+                    logger.exception("시장 스캔 청크 %d 실패", i)
+                    ok = False
+                if ok:
+                    done.add(i)
+                else:
+                    failed.append(i)
+                if progress is not None:
+                    progress(len(done), len(self.chunks))
+            todo = failed
+            if not todo:
+                break
+        self.failed = todo
+        return self.results()
+
+    def results(self):
+        """체크포인트에 쌓인 결과 (종목명/시장 포함, 상대수익률 내림차순)"""
+        summary = self.checkpoint.load(self.key)
+        summary = summary[summary.index.isin(self.universe.index)]
+        table = self.universe.loc[summary.index].join(summary)
+        table = table.sort_values('relative_return', ascending=False, na_position='last', kind='stable')
+        table.index.name = 'code'
+        return table
+
+    @staticmethod
+    def extremes(table, n):
+        """상대수익률 상위 n개 / 하위 n개 (하위는 약한 순)"""
+        ranked = table[table['relative_return'].notna()]
+        return ranked.head(n), ranked.iloc[::-1].head(n)
+
+
+SCREEN_COLUMNS = ['kind', 'sector', 'name', *SCAN_COLUMNS]
+# 조건식에서 쓸 수 있는 한글 컬럼 이름
+SCREEN_ALIASES = {'구분': 'kind', '섹터': 'sector', '종목': 'name', '수익률': 'return',
+                  '상대수익률': 'relative_return', '연속일수': 'days'}
+_SCREEN_OPS = {'>=': np.greater_equal, '<=': np.less_equal, '!=': np.not_equal,
+               '==': np.equal, '=': np.equal, '>': np.greater, '<': np.less}
+_SCREEN_CLAUSE = re.compile(r'^\s*(\S+?)\s*(>=|<=|!=|==|=|>|<)\s*(.+?)\s*$')
+# 따옴표 문자열은 통째로 건너뛰고 그 밖의 and/쉼표만 조건 구분자로 (group 1)
+_SCREEN_SPLIT = re.compile(r'"[^"]*"|\'[^\']*\'|(\s+and\s+|,)', re.IGNORECASE)
+_SCREEN_SORT_DIRECTIONS = {'asc': False, 'desc': True}
+
+
+def build_screen_table(window, benchmark_col, meta=None, relative=None, kind='stock'):
+    """조건 검색용 열 테이블 (index=표시 이름, columns=SCREEN_COLUMNS)
+
+    window/relative는 대시보드의 기간 창 가격과 상대수익률 (relative가 있으면 다시 계산하지 않음).
+    meta(표시 이름 인덱스, sector/name 열)가 없으면 섹터 '-', 종목명 = 컬럼 이름.
+    kind='sector'는 섹터 합성 지수 창 - 섹터/종목명 모두 섹터 이름.
+    """
+    summary = summarize_relative_strength(window, benchmark_col, relative)
+    labels = summary.index
+    if kind == 'sector':
+        sector = name = np.asarray(labels, dtype=object)
+    elif meta is not None:
+        sector = meta['sector'].reindex(labels).fillna('-').to_numpy(dtype=object)
+        name = meta['name'].reindex(labels)
+        name = name.where(name.notna(), labels).to_numpy(dtype=object)
+    else:
+        sector, name = np.full(len(labels), '-', dtype=object), np.asarray(labels, dtype=object)
+    table = summary.assign(kind=kind, sector=sector, name=name)
+    return table[SCREEN_COLUMNS]
+
+
+def parse_screen_filter(where):
+    """조건식 → [(컬럼, 연산자, 값)]
+
+    "days >= 5 and relative_return > 3" 처럼 '컬럼 연산자 값'을 and(또는 쉼표)로 잇는다.
+    따옴표로 감싼 값 안의 and/쉼표는 구분자로 보지 않는다 (name == "A, B").
+    값은 따옴표를 벗긴 문자열로 두고, 숫자 변환은 screen()에서 컬럼 자료형에 맞춰 한다.
+    해석할 수 없으면 ValueError.
+    """
+    where = where or ''
+    if re.search('[\'"]', _SCREEN_SPLIT.sub('', where)):
+        raise ValueError(f"따옴표가 닫히지 않았습니다: {where}")
+    clauses, start = [], 0
+    for match in _SCREEN_SPLIT.finditer(where):
+        if match.group(1) is not None:
+            clauses.append(where[start:match.start()])
+            start = match.end()
+    clauses.append(where[start:])
+
+    conditions = []
+    for clause in clauses:
+        if not clause.strip():
+            continue
+        match = _SCREEN_CLAUSE.match(clause)
+        if match is None:
+            raise ValueError(f"조건을 해석할 수 없습니다: {clause.strip()}")
+        column, op, value = match.groups()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"':
+            value = value[1:-1]
+        conditions.append((SCREEN_ALIASES.get(column, column), op, value))
+    return conditions
+
+
+def parse_screen_sort(sort):
+    """정렬식 → ([컬럼], [오름차순 여부]) - "relative_return desc, days" 또는 "-days" (기본 오름차순)
+
+    방향은 asc/desc 하나만 (그 밖의 단어나 두 개 이상이면 ValueError)
+    """
+    columns, ascending = [], []
+    for item in (sort or '').split(','):
+        parts = item.split()
+        if not parts:
+            continue
+        if len(parts) > 2 or (len(parts) == 2 and parts[1].lower() not in _SCREEN_SORT_DIRECTIONS):
+            raise ValueError(f"정렬 방향은 asc 또는 desc: {item.strip()}")
+        column = parts[0]
+        descending = len(parts) == 2 and _SCREEN_SORT_DIRECTIONS[parts[1].lower()]
+        if column.startswith('-'):
+            column, descending = column[1:], True
+        columns.append(SCREEN_ALIASES.get(column, column))
+        ascending.append(not descending)
+    return columns, ascending
+
+
+def screen(table, where=None, sort=None, limit=None):
+    """열 테이블에서 조건 검색 (필터 → 정렬 → 개수 제한)
+
+    table은 build_screen_table()이나 MarketScanner.results()처럼 컬럼별 값이 있는 표.
+    조건은 컬럼 배열 비교를 and로 합친 마스크 한 번으로 거르고 (NaN은 != 를 포함해 어떤 조건도
+    통과하지 않음), 정렬은 안정 정렬로 NaN을 맨 뒤에 둔다.
+    문자 컬럼(kind/sector/name)은 ==, != 만 쓸 수 있다 (크기 비교는 ValueError).
+
+    예) screen(table, "kind == sector and days >= 5 and relative_return > 3", "relative_return desc", 20)
+    """
+    mask = np.ones(len(table), dtype=bool)
+    for column, op, value in parse_screen_filter(where):
+        if column not in table.columns:
+            raise ValueError(f"없는 컬럼: {column}")
+        values = table[column].to_numpy()
+        if values.dtype != object:
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"숫자 컬럼({column})에 숫자가 아닌 값: {value}") from None
+        elif _SCREEN_OPS[op] not in (np.equal, np.not_equal):
+            raise ValueError(f"문자 컬럼({column})은 == 또는 != 만 쓸 수 있습니다: {op}")
+        with np.errstate(invalid='ignore'):
+            mask &= _SCREEN_OPS[op](values, value) & pd.notna(values)
+    result = table[mask]
+    columns, ascending = parse_screen_sort(sort)
+    unknown = [c for c in columns if c not in result.columns]
+    if unknown:
+        raise ValueError(f"없는 컬럼: {', '.join(unknown)}")
+    if columns:
+        result = result.sort_values(columns, ascending=ascending, kind='stable', na_position='last')
+    return result if limit is None else result.head(int(limit))
+
+
+def screen_prices(prices, benchmark_col, period_days, where=None, sort=None, limit=None, groups=None):
+    """가격 패널 → 기간 창 조건 검색 (배치 작업용)
+
+    prices는 벤치마크 포함 종가 패널 (index=날짜, columns=티커/표시 이름).
+    groups({컬럼: 섹터 이름})를 주면 섹터 합성 지수(동일가중) 행도 kind='sector'로 함께 검색한다
+    (groups에 없는 컬럼은 합성 지수에서 빠짐).
+
+    예) screen_prices(get_batch_stock_data(tickers, start, end), '^KS11', 20,
+                      "days >= 5 and relative_return > 3", "-relative_return")
+    """
+    prices = prices.dropna(subset=[benchmark_col])
+    window = prices.tail(period_days).ffill().bfill()
+    tables = [build_screen_table(window, benchmark_col)]
+    if groups is not None:
+        stocks = prices.drop(columns=benchmark_col)
+        levels = SectorComposite(stocks, pd.Series(groups).reindex(stocks.columns)).levels()
+        sector_window = pd.concat([prices[[benchmark_col]], levels], axis=1).tail(period_days).ffill().bfill()
+        tables.append(build_screen_table(sector_window, benchmark_col, kind='sector'))
+    return screen(pd.concat(tables), where, sort, limit)
+
+
+_CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+
+
+def _search_key(text):
+    """검색용 정규화 (소문자, 공백 제거)"""
+    return ''.join(str(text).lower().split())
+
+
+def _choseong(text):
+    """한글 음절을 초성으로 바꾼 문자열 (한글 음절 외 문자는 그대로)"""
+    return ''.join(_CHOSEONG[(ord(ch) - 0xAC00) // 588] if '가' <= ch <= '힣' else ch for ch in text)
+
+
+def _is_choseong_query(text):
+    """초성(ㄱ~ㅎ)이 들어 있고 한글 음절은 없는 검색어인지"""
+    return any(ch in _CHOSEONG for ch in text) and not any('가' <= ch <= '힣' for ch in text)
+
+
+class InstrumentIndex:
+    """종목 검색 색인 (종목명/초성/티커 코드)
+
+    - 접두어: 키별로 정렬해 둔 배열에서 이분 탐색
+    - 부분 문자열: 2/3글자 n-gram 역색인 (검색어 n-gram 목록 교집합 후 확인)
+    - 종목 번호는 (이름 길이, 이름) 순으로 매겨 두어 번호가 작을수록 먼저 보여줌
+    - 같은 종목의 다른 이름(한글/영문)도 각각 색인하고, 결과는 종목(코드 앞부분)별로 하나만
+    """
+
+    def __init__(self, instruments):
+        instruments = instruments.drop_duplicates(['code', 'name']).copy()
+        instruments['_len'] = instruments['name'].str.len()
+        instruments = instruments.sort_values(['_len', 'name'], kind='stable').reset_index(drop=True)
+        self.codes = instruments['code'].tolist()
+        self.names = instruments['name'].tolist()
+        self.markets = instruments['market'].to_numpy()
+
+        names = [_search_key(n) for n in self.names]
+        codes = [_search_key(c) for c in self.codes]
+        self._keys = {
+            'name': names,
+            'choseong': [_choseong(n) for n in names],
+            'code': codes,
+            'code_base': [c.split('.')[0] for c in codes],
+        }
+        self._bases = self._keys['code_base']
+        self._exact_code = {}
+        for i, (code, base) in enumerate(zip(codes, self._keys['code_base'])):
+            self._exact_code.setdefault(code, i)
+            self._exact_code.setdefault(base, i)
+
+        self._prefix = {}
+        for kind, keys in self._keys.items():
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            self._prefix[kind] = ([keys[i] for i in order], np.array(order, dtype=np.int64))
+
+        postings = {}
+        for kind in ('name', 'choseong', 'code'):
+            for i, key in enumerate(self._keys[kind]):
+                for gram in {key[j:j + n] for n in (2, 3) for j in range(len(key) - n + 1)}:
+                    postings.setdefault(gram, []).append(i)
+        self._postings = {g: np.unique(ids) for g, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _prefix_ids(self, kind, query):
+        keys, ids = self._prefix[kind]
+        lo = bisect.bisect_left(keys, query)
+        hi = bisect.bisect_left(keys, query + '\uffff')
+        return ids[lo:hi]
+
+    def _substring_ids(self, query, kind):
+        """query를 부분 문자열로 가진 종목 번호 (2글자 이상)"""
+        n = min(3, len(query))
+        grams = sorted({query[j:j + n] for j in range(len(query) - n + 1)},
+                       key=lambda g: len(self._postings.get(g, ())))
+        if not grams or grams[0] not in self._postings:
+            return np.empty(0, dtype=np.int64)
+        ids = self._postings[grams[0]]
+        for gram in grams[1:]:
+            ids = np.intersect1d(ids, self._postings.get(gram, ()), assume_unique=True)
+            if len(ids) == 0:
+                return ids
+        if len(query) > n:
+            keys = self._keys[kind]
+            ids = np.array([i for i in ids if query in keys[i]], dtype=np.int64)
+        return ids
+
+    def search(self, query, markets=None, limit=15):
+        """검색 결과 [{"code", "name"}] - 티커 일치 → 접두어 → 부분 문자열 순, 같은 순위는 짧은 이름 먼저"""
+        query = _search_key(query)
+        if not query:
+            return []
+        name_kind = 'choseong' if _is_choseong_query(query) else 'name'
+        groups = []
+        if query in self._exact_code:
+            groups.append(np.array([self._exact_code[query]]))
+        groups.append(np.sort(np.concatenate([
+            self._prefix_ids(name_kind, query),
+            self._prefix_ids('code', query),
+            self._prefix_ids('code_base', query),
+        ])))
+        if len(query) >= 2:
+            groups.append(np.union1d(self._substring_ids(query, name_kind), self._substring_ids(query, 'code')))
+
+        ids = np.concatenate(groups).astype(np.int64)
+        if markets is not None:
+            ids = ids[np.isin(self.markets[ids], list(markets))]
+        results, seen = [], set()
+        for i in ids:
+            if self._bases[i] in seen:
+                continue
+            seen.add(self._bases[i])
+            results.append({"code": self.codes[i], "name": self.names[i]})
+            if len(results) >= limit:
+                break
+        return results
+
+
+def load_instruments():
+    """검색 대상 전체 종목 (상장 목록 파일/섹터 정의 + 기본 검색 목록)"""
+    defaults = [(s['code'], s['name'], 'kosdaq' if s['code'].endswith('.KQ') else 'kospi')
+                for s in KR_SEARCH_STOCKS]
+    defaults += [(s['code'], s['name'], 'us') for s in US_SEARCH_STOCKS]
+    defaults = pd.DataFrame(defaults, columns=['code', 'name', 'market'])
+    return pd.concat([load_universe(), defaults], ignore_index=True)
+
+
+@st.cache_resource
+def get_instrument_index():
+    """종목 검색 색인 (프로세스당 한 번 생성)"""
+    return InstrumentIndex(load_instruments())
+
+
 def search_korean_stocks(keyword):
     """한국 주식 검색"""
-    all_stocks = [
-        {"code": "005930.KS", "name": "삼성전자"},
-        {"code": "000660.KS", "name": "SK하이닉스"},
-        {"code": "005380.KS", "name": "현대차"},
-        {"code": "000270.KS", "name": "기아"},
-        {"code": "005490.KS", "name": "POSCO홀딩스"},
-        {"code": "051910.KS", "name": "LG화학"},
-        {"code": "006400.KS", "name": "삼성SDI"},
-        {"code": "035420.KS", "name": "NAVER"},
-        {"code": "035720.KS", "name": "카카오"},
-        {"code": "068270.KS", "name": "셀트리온"},
-        {"code": "207940.KS", "name": "삼성바이오로직스"},
-        {"code": "012450.KS", "name": "한화에어로스페이스"},
-        {"code": "047810.KS", "name": "한국항공우주"},
-        {"code": "079550.KS", "name": "LIG넥스원"},
-        {"code": "042660.KS", "name": "한화오션"},
-        {"code": "329180.KS", "name": "HD현대중공업"},
-        {"code": "009540.KS", "name": "HD한국조선해양"},
-        {"code": "373220.KS", "name": "LG에너지솔루션"},
-        {"code": "247540.KS", "name": "에코프로비엠"},
-        {"code": "086520.KS", "name": "에코프로"},
-        {"code": "003670.KS", "name": "포스코퓨처엠"},
-        {"code": "105560.KS", "name": "KB금융"},
-        {"code": "055550.KS", "name": "신한지주"},
-        {"code": "086790.KS", "name": "하나금융지주"},
-        {"code": "096770.KS", "name": "SK이노베이션"},
-        {"code": "004020.KS", "name": "현대제철"},
-        {"code": "066570.KS", "name": "LG전자"},
-        {"code": "003550.KS", "name": "LG"},
-        {"code": "034730.KS", "name": "SK"},
-        {"code": "017670.KS", "name": "SK텔레콤"},
-        {"code": "030200.KS", "name": "KT"},
-        {"code": "032830.KS", "name": "삼성생명"},
-        {"code": "010950.KS", "name": "S-Oil"},
-        {"code": "009150.KS", "name": "삼성전��"},
-        {"code": "028260.KS", "name": "삼성물산"},
-        {"code": "018260.KS", "name": "삼성에스디에스"},
-        {"code": "000810.KS", "name": "삼성화재"},
-        {"code": "036570.KS", "name": "엔씨소프트"},
-        {"code": "251270.KS", "name": "넷마블"},
-        {"code": "263750.KS", "name": "펄어비스"},
-        {"code": "259960.KS", "name": "크래프톤"},
-        {"code": "352820.KS", "name": "하이브"},
-        {"code": "011200.KS", "name": "HMM"},
-        {"code": "402340.KS", "name": "SK스퀘어"},
-        {"code": "000100.KS", "name": "유한양행"},
-        {"code": "128940.KS", "name": "한미약품"},
-        {"code": "302440.KS", "name": "SK바이오사이언스"},
-        {"code": "326030.KS", "name": "SK바이오팜"},
-        {"code": "010130.KS", "name": "고려아연"},
-        {"code": "011070.KS", "name": "LG이노텍"},
-        {"code": "034220.KS", "name": "LG디스플레이"},
-        {"code": "267250.KS", "name": "HD현대"},
-        {"code": "010620.KS", "name": "HD현대미포"},
-        {"code": "241560.KS", "name": "두산밥캣"},
-        {"code": "042700.KS", "name": "한미반도체"},
-        {"code": "000720.KS", "name": "현대건설"},
-        {"code": "006360.KS", "name": "GS건설"},
-        {"code": "047040.KS", "name": "대우건설"},
-        {"code": "323410.KS", "name": "카카오뱅크"},
-        {"code": "377300.KS", "name": "카카오페이"},
-        {"code": "293490.KS", "name": "카카오게임즈"},
-        {"code": "099320.KQ", "name": "쎄트렉아이"},
-        {"code": "095340.KQ", "name": "ISC"},
-        {"code": "357780.KQ", "name": "솔브레인"},
-        {"code": "041510.KQ", "name": "에스엠"},
-        {"code": "122870.KQ", "name": "와이지엔터테인먼트"},
-        {"code": "035900.KQ", "name": "JYP Ent."},
-        {"code": "293480.KQ", "name": "하나기술"},
-        {"code": "039030.KQ", "name": "이오테크닉스"},
-        {"code": "214150.KQ", "name": "클래시스"},
-        {"code": "145020.KQ", "name": "휴젤"},
-        {"code": "196170.KQ", "name": "알테오젠"},
-        {"code": "028300.KQ", "name": "에이치엘비"},
-        {"code": "067160.KQ", "name": "아프리카TV"},
-        {"code": "240810.KQ", "name": "원익IPS"},
-        {"code": "058470.KQ", "name": "리노공업"},
-        {"code": "272210.KS", "name": "한화시스템"},
-    ]
-    results = []
-    keyword_lower = keyword.lower()
-    for stock in all_stocks:
-        if keyword_lower in stock['name'].lower() or keyword in stock['code']:
-            results.append(stock)
-            if len(results) >= 15:
-                break
-    return results
+    return get_instrument_index().search(keyword, markets=REGION_MARKETS['kr'])
 
 
 def search_us_stocks(keyword):
     """미국 주식 검색"""
-    all_stocks = [
-        # AI/가속기 반도체
-        {"code": "NVDA", "name": "NVIDIA"},
-        {"code": "AVGO", "name": "Broadcom"},
-        {"code": "AMD", "name": "AMD"},
-        # 반도체 파운드리/제조
-        {"code": "TSM", "name": "TSMC"},
-        {"code": "INTC", "name": "Intel"},
-        {"code": "GFS", "name": "GlobalFoundries"},
-        # 반도체 장비
-        {"code": "LRCX", "name": "Lam Research"},
-        {"code": "AMAT", "name": "Applied Materials"},
-        {"code": "KLAC", "name": "KLA Corp"},
-        {"code": "ASML", "name": "ASML"},
-        # 반도체 메모리/스토리지
-        {"code": "MU", "name": "Micron"},
-        {"code": "WDC", "name": "Western Digital"},
-        {"code": "STX", "name": "Seagate"},
-        # 검색/광고플랫폼
-        {"code": "GOOG", "name": "Alphabet"},
-        {"code": "APP", "name": "AppLovin"},
-        {"code": "TTD", "name": "The Trade Desk"},
-        # 소셜/커뮤니티
-        {"code": "META", "name": "Meta"},
-        {"code": "PINS", "name": "Pinterest"},
-        {"code": "SNAP", "name": "Snap"},
-        # 이커머스
-        {"code": "AMZN", "name": "Amazon"},
-        {"code": "PDD", "name": "PDD Holdings"},
-        {"code": "MELI", "name": "MercadoLibre"},
-        # 리테일(오프라인)
-        {"code": "WMT", "name": "Walmart"},
-        {"code": "COST", "name": "Costco"},
-        {"code": "TGT", "name": "Target"},
-        # 클라우드/엔터프라이즈
-        {"code": "MSFT", "name": "Microsoft"},
-        {"code": "ORCL", "name": "Oracle"},
-        {"code": "NOW", "name": "ServiceNow"},
-        # 데이터/AI 분석SW
-        {"code": "PLTR", "name": "Palantir"},
-        {"code": "SNOW", "name": "Snowflake"},
-        {"code": "DDOG", "name": "Datadog"},
-        # 사이버보안
-        {"code": "PANW", "name": "Palo Alto"},
-        {"code": "CRWD", "name": "CrowdStrike"},
-        {"code": "FTNT", "name": "Fortinet"},
-        {"code": "ZS", "name": "Zscaler"},
-        {"code": "NET", "name": "Cloudflare"},
-        # 미디어/스트리밍
-        {"code": "NFLX", "name": "Netflix"},
-        {"code": "CMCSA", "name": "Comcast"},
-        {"code": "ROKU", "name": "Roku"},
-        {"code": "DIS", "name": "Disney"},
-        # 전기차/EV
-        {"code": "TSLA", "name": "Tesla"},
-        {"code": "RIVN", "name": "Rivian"},
-        {"code": "LCID", "name": "Lucid"},
-        {"code": "NIO", "name": "NIO"},
-        # 전력인프라(그리드)
-        {"code": "GEV", "name": "GE Vernova"},
-        {"code": "ETN", "name": "Eaton"},
-        {"code": "CEG", "name": "Constellation Energy"},
-        # 신재생/태양광
-        {"code": "FSLR", "name": "First Solar"},
-        {"code": "ENPH", "name": "Enphase"},
-        {"code": "SEDG", "name": "SolarEdge"},
-        # 로봇
-        {"code": "ISRG", "name": "Intuitive Surgical"},
-        {"code": "SYM", "name": "Symbotic"},
-        {"code": "PRCT", "name": "PROCEPT BioRobotics"},
-        # 양자컴퓨팅
-        {"code": "IONQ", "name": "IonQ"},
-        {"code": "RGTI", "name": "Rigetti"},
-        {"code": "QBTS", "name": "D-Wave"},
-        # 결제/카드네트워크
-        {"code": "V", "name": "Visa"},
-        {"code": "MA", "name": "Mastercard"},
-        {"code": "AXP", "name": "American Express"},
-        # 은행
-        {"code": "JPM", "name": "JPMorgan"},
-        {"code": "BAC", "name": "Bank of America"},
-        {"code": "GS", "name": "Goldman Sachs"},
-        # 자산운용/투자
-        {"code": "BRK-B", "name": "Berkshire Hathaway"},
-        {"code": "BLK", "name": "BlackRock"},
-        # 기타
-        {"code": "AAPL", "name": "Apple"},
-        {"code": "JNJ", "name": "Johnson & Johnson"},
-        {"code": "PFE", "name": "Pfizer"},
-        {"code": "UNH", "name": "UnitedHealth"},
-        {"code": "PG", "name": "Procter & Gamble"},
-        {"code": "KO", "name": "Coca-Cola"},
-        {"code": "PEP", "name": "PepsiCo"},
-        {"code": "MCD", "name": "McDonald's"},
-        {"code": "NKE", "name": "Nike"},
-        {"code": "SBUX", "name": "Starbucks"},
-    ]
-    results = []
-    keyword_lower = keyword.lower()
-    for stock in all_stocks:
-        if keyword_lower in stock['name'].lower() or keyword_lower in stock['code'].lower():
-            results.append(stock)
-            if len(results) >= 15:
-                break
-    return results
-
-
-def get_sector_from_col(col_name):
-    """컬럼명에서 섹터 추출"""
-    if '[' in col_name and ']' in col_name:
-        return col_name.split(']')[0] + ']'
-    return None
+    return get_instrument_index().search(keyword, markets=REGION_MARKETS['us'])
+
+
+def display_name(sector, name):
+    """차트/표에 쓰는 표시 이름 ("[섹터]종목")"""
+    return f"[{sector}]{name}"
+
+
+class InstrumentRegistry:
+    """섹터 정의 종목 레지스트리 (프로세스당 한 번 생성)
+
+    SECTORS_KR/SECTORS_US를 (섹터, 시장, 종목) 행으로 펼쳐 코드/종목명/표시 이름과
+    섹터·시장·색상 번호, ETF·지수 여부를 열 배열로 둔다. 섹터/ETF 필터와 섹터별 묶기,
+    색상 조회는 표시 이름 문자열을 자르지 않고 이 배열의 비교와 인덱싱으로 처리한다.
+    전체 메타데이터 표(meta)도 생성 시 한 번 만들어 두고, 실행마다 meta.iloc[행 번호]로 고른다
+    (섹터 종목 행 뒤에 벤치마크 행 - benchmark_rows, select() 대상 아님).
+    """
+
+    def __init__(self, sector_maps=None):
+        sector_maps = sector_maps or (SECTORS_KR, SECTORS_US)
+        rows = [(stock['code'], stock['name'], sector, market)
+                for sectors in sector_maps
+                for sector, by_market in sectors.items()
+                for market, stocks in by_market.items()
+                for stock in stocks]
+        codes, names, sector_names, market_names = (np.array(col, dtype=object) for col in zip(*rows))
+
+        # 범주 목록 (번호 = 목록 위치, 추가 종목 섹터는 맨 뒤)
+        self.sectors = list(dict.fromkeys(sector_names)) + [CUSTOM_SECTOR]
+        self.markets = tuple(m for markets in REGION_MARKETS.values() for m in markets)
+        self._sector_pos = {sector: i for i, sector in enumerate(self.sectors)}
+
+        self.codes = codes
+        self.names = names
+        self.labels = np.array([display_name(s, n) for s, n in zip(sector_names, names)], dtype=object)
+        self.sector_id = np.array([self._sector_pos[s] for s in sector_names], dtype=np.int16)
+        self.market_id = pd.Index(self.markets).get_indexer(market_names).astype(np.int8)
+        name_series = pd.Series(names, dtype=object)
+        self.is_etf = np.logical_or.reduce(
+            [name_series.str.contains(kw, regex=False).to_numpy() for kw in ETF_KEYWORDS])
+        self.is_index = np.isin(names, list(INDEX_COLORS))
+
+        # 색상 팔레트: 섹터 색상 번호(섹터당 하나) + 선 색상 번호(지수는 지수 고유 색상)
+        sector_colors = [SECTOR_COLORS.get(s, DEFAULT_COLOR) for s in self.sectors]
+        line_colors = np.where(self.is_index,
+                               pd.Series(names).map(INDEX_COLORS).to_numpy(dtype=object),
+                               np.asarray(sector_colors, dtype=object)[self.sector_id])
+        self.palette = list(dict.fromkeys(sector_colors + list(INDEX_COLORS.values())))
+        palette_index = pd.Index(self.palette)
+        self.sector_color_id = palette_index.get_indexer(sector_colors).astype(np.int16)
+        self.color_id = palette_index.get_indexer(line_colors).astype(np.int16)
+
+        benchmarks = [(info['name'], info['ticker'], info['name']) for info in BENCHMARK_OPTIONS.values()]
+        self.meta = pd.concat([self.frame(np.arange(len(codes))), self.extra_frame(benchmarks)])
+        self.benchmark_rows = {code: len(codes) + i for i, (_, code, _) in enumerate(benchmarks)}
+
+    FRAME_COLUMNS = ['code', 'name', 'sector_id', 'sector', 'market', 'is_etf', 'is_index', 'color', 'sector_color']
+
+    def __len__(self):
+        return len(self.codes)
+
+    def sector_ids(self, sectors):
+        """섹터 이름 목록 → 섹터 번호 배열 (없는 섹터는 -1)"""
+        return np.array([self._sector_pos.get(s, -1) for s in sectors], dtype=np.intp)
+
+    def select(self, market, sectors, etf_only=False):
+        """시장·섹터(·ETF) 조건에 맞는 행 번호
+
+        순서는 sectors 순서, 섹터 안에서는 정의 순서 (같은 종목은 먼저 오는 섹터가 가져감).
+        """
+        # 섹터 번호 → sectors 안 순서 (선택 안 된 섹터는 -1)
+        order = np.full(len(self.sectors), -1, dtype=np.intp)
+        sector_ids = self.sector_ids(sectors)
+        found = sector_ids >= 0
+        order[sector_ids[found][::-1]] = np.flatnonzero(found)[::-1]
+        rank = order[self.sector_id]
+        mask = (self.market_id == self.markets.index(market)) & (rank >= 0)
+        if etf_only:
+            mask &= self.is_etf
+        rows = np.flatnonzero(mask)
+        return rows[np.argsort(rank[rows], kind='stable')]
+
+    def frame(self, rows):
+        """행 번호 → 종목 메타데이터 표 (표시 이름 인덱스, 번호 열은 이름/색상으로 풀어 함께 둠)"""
+        rows = np.asarray(rows, dtype=np.intp)
+        palette = np.asarray(self.palette, dtype=object)
+        sector_id = self.sector_id[rows]
+        return pd.DataFrame({
+            'code': self.codes[rows],
+            'name': self.names[rows],
+            'sector_id': sector_id,
+            'sector': np.asarray(self.sectors, dtype=object)[sector_id],
+            'market': np.asarray(self.markets, dtype=object)[self.market_id[rows]],
+            'is_etf': self.is_etf[rows],
+            'is_index': self.is_index[rows],
+            'color': palette[self.color_id[rows]],
+            'sector_color': palette[self.sector_color_id[sector_id]],
+        }, index=pd.Index(self.labels[rows], name='label'))
+
+    def extra_frame(self, entries, sector=None):
+        """섹터 정의 밖 종목(벤치마크/추가 종목) 메타데이터 - frame()과 같은 열
+
+        entries: [(표시 이름, 코드, 종목명)]. sector가 없으면 섹터 '-' (번호 -1).
+        """
+        sector_id = self.sectors.index(sector) if sector else -1
+        sector_color = SECTOR_COLORS.get(sector, DEFAULT_COLOR) if sector else DEFAULT_COLOR
+        records = [(label, code, name, sector_id, sector or '-', None,
+                    any(kw in name for kw in ETF_KEYWORDS), name in INDEX_COLORS,
+                    INDEX_COLORS.get(name, sector_color), sector_color)
+                   for label, code, name in entries]
+        df = pd.DataFrame.from_records(records, columns=['label', *self.FRAME_COLUMNS])
+        return df.astype({'sector_id': np.int16, 'is_etf': bool, 'is_index': bool}).set_index('label')
+
+
+@st.cache_resource
+def get_instrument_registry():
+    """섹터 정의 종목 레지스트리 (프로세스당 한 번 생성)"""
+    return InstrumentRegistry()
 
 
 # ========================================================================================
@@ -1369,7 +3712,6 @@ def main():
     bench_color = benchmark_info['color']
     market_key = benchmark_info['market']
     region = benchmark_info.get('region', 'kr')
-    SECTORS = SECTORS_KR if region == 'kr' else SECTORS_US
     st.markdown(f"""
         <div style='margin-bottom: 16px;'>
             <p style='color: #666; font-size: 11px; text-transform: uppercase; letter-spacing: 2px;
@@ -1385,47 +3727,67 @@ def main():
     # ========== 데이터 수집 (배치 다운로드) ==========
     today = datetime.now().date()
     end_date = today + timedelta(days=1)    # yfinance end는 exclusive라 +1일
-    start_date = today - timedelta(days=int(period_days * 3) + 100)
+    start_date = today - timedelta(days=HISTORY_DAYS[period_days])   # 짧은 기간은 짧게 받고, 긴 기간은 고를 때 채움
 
     with st.spinner("📡 데이터 로딩..."):
         # 1. 모든 티커 수집 (벤치마크 + 섹터 종목 + 커스텀 종목)
         ticker_info = {}  # {ticker_code: display_name}
         ticker_info[benchmark_info['ticker']] = bench_name
 
-        ETF_KEYWORDS = ("KODEX", "TIGER", "HANARO", "ACE", "KBSTAR", "SOL", "ARIRANG", "KOSEF", "ETF")
-        etf_only = stock_type_filter == "ETF만"
-
-        for sector_name in selected_sectors:
-            sector = SECTORS[sector_name]
-            for stock_info in sector[market_key]:
-                if etf_only and not any(kw in stock_info['name'] for kw in ETF_KEYWORDS):
-                    continue
-                code = stock_info['code']
-                if code not in ticker_info:
-                    ticker_info[code] = f"[{sector_name}]{stock_info['name']}"
+        # 섹터/ETF 필터는 레지스트리 번호 열로 한 번에 (종목명 키워드 검사 없음)
+        registry = get_instrument_registry()
+        # 검색 색인도 여기서 미리 생성 (4만 종목 기준 수 초 - 첫 검색어 입력 때 멈추지 않도록)
+        get_instrument_index()
+        rows = registry.select(market_key, selected_sectors, etf_only=stock_type_filter == "ETF만")
+        sector_rows = []
+        for row, code in zip(rows, registry.codes[rows]):
+            if code not in ticker_info:
+                ticker_info[code] = registry.labels[row]
+                sector_rows.append(row)
 
+        custom_entries = []
         for custom in st.session_state.custom_stocks:
             code = custom['code']
             if code not in ticker_info:
-                ticker_info[code] = f"[➕추가]{custom['name']}"
+                ticker_info[code] = display_name(CUSTOM_SECTOR, custom['name'])
+                custom_entries.append((ticker_info[code], code, custom['name']))
+
+        # 표시 이름별 종목 메타데이터 (섹터/종목명/색상 - 렌더링 중 문자열 파싱 없음)
+        # 행 순서는 ticker_info 순서 (벤치마크, 섹터 종목, 추가 종목) - 레지스트리 표에서 행 번호로 고름
+        instrument_meta = registry.meta.iloc[[registry.benchmark_rows[benchmark_info['ticker']]] + sector_rows]
+        if custom_entries:
+            instrument_meta = pd.concat([instrument_meta,
+                                         registry.extra_frame(custom_entries, sector=CUSTOM_SECTOR)])
+        ticker_pos = {t: i for i, t in enumerate(ticker_info)}
 
         # 2. 배치 다운로드 (한 번의 API 호출)
         all_tickers = tuple(sorted(ticker_info.keys()))  # 캐시 키용 tuple
         # 캐시 키: 날짜 문자열로 변환 (datetime 객체는 초 단위로 변해서 캐시 무효화됨)
-        batch_data = get_batch_stock_data(all_tickers, str(start_date), str(end_date))
+        # 마감 시간 안에 도착한 티커만으로 먼저 그리고, 늦은/실패 티커는 따로 안내
+        batch_data, fetch_report = get_batch_stock_data_partial(all_tickers, str(start_date), str(end_date))
 
         if batch_data.empty or benchmark_info['ticker'] not in batch_data.columns:
-            st.error(f"❌ {bench_name} 데이터를 가져올 수 없습니다.")
+            if benchmark_info['ticker'] in fetch_report['pending']:
+                st.info(f"⏳ {bench_name} 데이터를 받는 중입니다. 잠시 후 새로고침해 주세요.")
+            else:
+                st.error(f"❌ {bench_name} 데이터를 가져올 수 없습니다.")
             return
 
-        # 3. 컬럼명을 표시명으로 변경
-        all_data = pd.DataFrame(index=batch_data.index)
-        for ticker, display_name in ticker_info.items():
-            if ticker in batch_data.columns:
-                all_data[display_name] = batch_data[ticker]
-
-    all_data = all_data.dropna(subset=[bench_name]).tail(period_days)
-    all_data = all_data.ffill().bfill()
+        # 3. 컬럼명을 표시명으로 변경 (컬럼 선택 한 번으로 정렬된 가격 행렬 구성)
+        present = [t for t in ticker_info if t in batch_data.columns]
+        all_data = batch_data[present].set_axis([ticker_info[t] for t in present], axis=1)
+        panel_meta = instrument_meta.iloc[[ticker_pos[t] for t in present]]
+        if all_data.columns.has_duplicates:
+            unique = ~all_data.columns.duplicated(keep='last')
+            all_data, panel_meta = all_data.loc[:, unique], panel_meta[unique]
+
+    all_data = all_data.dropna(subset=[bench_name])
+    aligned_data = all_data  # 전체 이력 (벤치마크 거래일 기준 정렬) - 롤링 베타/상관계수용
+    # 모든 기간의 상대수익률을 미리 계산해 둔 큐브 (기간 전환 시 재계산 없음)
+    rs_cube = get_rs_cube(all_data, bench_name)
+    all_data = all_data.tail(period_days)
+    rs_state = get_rs_state(all_data, bench_name, period_days)
+    all_data = all_data.ffill().bfill().astype(PANEL_DTYPE, copy=False)
 
     if all_data.empty or len(all_data) < 2:
         st.warning("⚠️ 데이터가 부족합니다.")
@@ -1456,30 +3818,46 @@ def main():
         </div>
     """, unsafe_allow_html=True)
 
+    # 누락/지연/만료 티커 안내 (나머지 종목은 그대로 표시)
+    report_labels = {'pending': "⏳ 수신 중", 'missing': "⚠️ 데이터 없음", 'failed': "⚠️ 다운로드 실패 (재시도 예정)",
+                     'stale': "🕒 갱신 대기", 'refresh_failed': "⚠️ 갱신 실패 (이전 데이터)"}
+    report_notes = []
+    for key, label in report_labels.items():
+        keys = fetch_report[key]
+        if key == 'missing':
+            keys = [t for t in keys if t not in fetch_report['failed']]
+        names = list(instrument_meta['name'].iloc[[ticker_pos[t] for t in keys if t in ticker_pos]])
+        if names:
+            report_notes.append(f"{label}: {', '.join(names)}")
+    if report_notes:
+        st.caption(" · ".join(report_notes))
+
     # ========== 상대강도 미리 계산 (주도/소외 분류용) ==========
-    relative_df_all = calculate_relative_strength(all_data, benchmark_col=bench_name)
-
-    # 주도/소외 종목 분류
-    outperform_cols = []  # 상대수익률 > 0
-    underperform_cols = []  # 상대수익률 < 0
-    for col in relative_df_all.columns:
-        if len(relative_df_all[col].dropna()) > 0:
-            latest_val = relative_df_all[col].dropna().iloc[-1]
-            if latest_val > 0:
-                outperform_cols.append(col)
-            else:
-                underperform_cols.append(col)
+    relative_df_all = rs_cube.relative(period_days)
+    # 섹터 합성 지수 구성 종목 - ETF/지수/추가 종목은 빼고 섹터 정의 종목만 (탭2 합성 지수, 탭3 조건 검색)
+    member_meta = panel_meta.drop(index=bench_name)
+    member_meta = member_meta[(member_meta['sector_id'] >= 0) & ~member_meta['is_etf'] & ~member_meta['is_index']
+                              & (member_meta['sector'] != CUSTOM_SECTOR)]
+    # 이번 실행에서 만든 프레임 (사이드바 메모리 사용량 표시용)
+    session_frames = {'all_data': all_data, 'relative_df_all': relative_df_all}
+
+    # 주도/소외 종목 분류 (최신 상대수익률 기준, 데이터가 전혀 없는 종목은 제외)
+    latest_rs = rs_state.latest()
+    has_data = latest_rs['return'].notna()
+    outperform_cols = latest_rs.index[has_data & (latest_rs['relative_return'] > 0)].tolist()  # 상대수익률 > 0
+    underperform_cols = latest_rs.index[has_data & ~(latest_rs['relative_return'] > 0)].tolist()  # 상대수익률 < 0
 
     # ========== 공유 그룹 필터 (session_state) ==========
     if 'shared_group_filter' not in st.session_state:
         st.session_state.shared_group_filter = "🔥 주도"
 
     # ========== 탭 구성 ==========
-    tab1, tab2, tab3 = st.tabs(["📈 표준화 차트", "📊 상대강도 차트", "📋 랭킹표"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📈 표준화 차트", "📊 상대강도 차트", "📋 랭킹표", "🏆 RS 등급", "🔭 시장 스캔"])
 
     # ========== 탭1: 표준화 차트 ==========
     with tab1:
-        normalized = normalize_data(all_data, normalize_method)
+        normalized = normalize_data(all_data, normalize_method, dtype=PANEL_DTYPE)
+        session_frames['normalized'] = normalized
         available_cols = [c for c in normalized.columns if c != bench_name]
 
         # 좁은 왼쪽 컬럼
@@ -1518,35 +3896,35 @@ def main():
 
             st.markdown("<p style='font-size:10px; font-weight:500; text-transform:uppercase; letter-spacing:1.5px; color:#666; margin:16px 0 8px 0;'>SECTORS</p>", unsafe_allow_html=True)
 
-            # 섹터별로 그룹화하여 표시
+            # 섹터별로 그룹화하여 표시 (섹터 번호 기준, 섹터 안에서는 컬럼 순서)
             selected_items = []
-            processed_cols = set()
+            filtered_meta = panel_meta.loc[filtered_cols]
+            sector_groups = filtered_meta.groupby('sector_id', sort=False)['name'].groups
+            stock_names = filtered_meta['name']
 
-            for sector_name in selected_sectors:
-                sector_cols = [c for c in filtered_cols if f"[{sector_name}]" in c and c not in processed_cols]
-                if sector_cols:
+            for sector_name, sector_id in zip(selected_sectors, registry.sector_ids(selected_sectors)):
+                sector_cols = sector_groups.get(sector_id, [])
+                if len(sector_cols):
                     with st.expander(sector_name, expanded=False):
                         for idx, col in enumerate(sector_cols):
-                            stock_name = col.split(']')[-1]
+                            stock_name = stock_names[col]
                             # 주도/소외 표시
                             status_icon = "🔥" if col in outperform_cols else "❄️"
                             default_val = (idx == 0)  # 대표종목만 기본 선택
                             unique_key = f"chk_{sector_name}_{stock_name}_{idx}"
                             if st.checkbox(f"{status_icon} {stock_name}", value=default_val, key=unique_key):
                                 selected_items.append(col)
-                            processed_cols.add(col)
 
             # 추가된 종목
-            custom_cols = [c for c in filtered_cols if "[➕추가]" in c and c not in processed_cols]
-            if custom_cols:
+            custom_cols = sector_groups.get(registry.sectors.index(CUSTOM_SECTOR), [])
+            if len(custom_cols):
                 with st.expander("➕ 추가 종목", expanded=True):
                     for idx, col in enumerate(custom_cols):
-                        stock_name = col.split(']')[-1]
+                        stock_name = stock_names[col]
                         status_icon = "🔥" if col in outperform_cols else "❄️"
                         unique_key = f"chk_custom_{stock_name}_{idx}"
                         if st.checkbox(f"{status_icon} {stock_name}", value=True, key=unique_key):
                             selected_items.append(col)
-                        processed_cols.add(col)
 
             # 선택된 종목을 session_state에 저장 (탭2, 탭3에서 사용)
             st.session_state.selected_items = selected_items
@@ -1575,21 +3953,14 @@ def main():
                 ))
 
             # 종목별 - 섹터 색상 + 사용자 설정 스타일 (지수는 굵은 실선)
-            for col in selected_items:
-                sector = get_sector_from_col(col)
-                stock_name = col.split(']')[-1] if ']' in col else col
-
-                # 지수인지 확인 (INDEX_COLORS에 있는 이름이면 지수)
-                is_index = stock_name in INDEX_COLORS
-
+            trace_meta = panel_meta.loc[selected_items, ['color', 'is_index']]
+            for col, color, is_index in trace_meta.itertuples(name=None):
                 if is_index:
                     # 지수는 굵은 실선 + 고유 색상
-                    color = INDEX_COLORS.get(stock_name, '#FFD700')
                     line_width = 3
                     line_dash = 'solid'
                 else:
                     # 일반 종목은 섹터 색상 + 사용자 설정 스타일
-                    color = SECTOR_COLORS.get(sector.replace('[', '').replace(']', ''), '#888888') if sector else '#888888'
                     line_width = stock_line_width
                     line_dash = stock_line_style
 
@@ -1683,25 +4054,19 @@ def main():
             """, unsafe_allow_html=True)
 
         with col2_t2:
-            filtered_data = all_data[[bench_name] + [c for c in tab_selected if c in all_data.columns]]
-            relative_df = calculate_relative_strength(filtered_data, benchmark_col=bench_name)
+            relative_df = relative_df_all[[c for c in tab_selected if c in relative_df_all.columns]]
+            session_frames['relative_df'] = relative_df
 
             if not relative_df.empty:
                 fig2 = go.Figure()
 
-                for col in relative_df.columns:
-                    sector = get_sector_from_col(col)
-                    stock_name = col.split(']')[-1] if ']' in col else col
-
-                    # 지수인지 확인
-                    is_index = stock_name in INDEX_COLORS
-
+                trace_meta = panel_meta.loc[relative_df.columns, ['color', 'is_index']]
+                for col, color, is_index in trace_meta.itertuples(name=None):
+                    # 지수는 굵은 실선 + 고유 색상
                     if is_index:
-                        color = INDEX_COLORS.get(stock_name, '#FFD700')
                         line_width = 3
                         line_dash = 'solid'
                     else:
-                        color = SECTOR_COLORS.get(sector.replace('[', '').replace(']', ''), '#888888') if sector else '#888888'
                         line_width = stock_line_width
                         line_dash = stock_line_style
 
@@ -1753,6 +4118,109 @@ def main():
                     'modeBarButtonsToRemove': ['lasso2d', 'select2d'],
                 })
 
+                # ===== 베타 / 상관계수 (롤링 창) =====
+                with st.expander("📐 베타 / 상관계수", expanded=False):
+                    # 전체 패널 롤링 합계 행렬은 펼쳐 볼 때만 (탭4 RS 등급처럼 켜야 계산)
+                    if st.toggle("베타 / 상관계수 계산", key='beta_on'):
+                        beta_window_name = st.radio(
+                            "창 길이", options=list(BETA_WINDOW_OPTIONS.keys()), index=1,
+                            horizontal=True, key='beta_window',
+                        )
+                        rolling_stats = get_rolling_stats(aligned_data, bench_name, BETA_WINDOW_OPTIONS[beta_window_name])
+                        beta_cols = list(relative_df.columns)
+                        short_names = list(panel_meta.loc[beta_cols, 'name'])
+                        latest_beta = rolling_stats.latest().loc[beta_cols]
+                        bar_colors = list(panel_meta.loc[beta_cols, 'sector_color'])
+
+                        b1, b2 = st.columns([1, 1])
+                        with b1:
+                            fig_beta = go.Figure(go.Bar(
+                                x=latest_beta['beta'], y=short_names, orientation='h',
+                                marker_color=bar_colors,
+                                customdata=latest_beta['correlation'],
+                                hovertemplate=f'%{{y}}<br>베타: %{{x:.2f}}<br>{bench_name} 상관: %{{customdata:.2f}}<extra></extra>',
+                            ))
+                            fig_beta.add_vline(x=1, line_dash="dot", line_color=bench_color, line_width=1)
+                            fig_beta.update_layout(
+                                title=dict(text=f"{bench_name} 대비 베타 ({beta_window_name})", font=dict(size=12, color='#9B9B9B')),
+                                height=max(300, 22 * len(beta_cols) + 80),
+                                margin=dict(l=10, r=10, t=40, b=20),
+                                yaxis=dict(autorange='reversed', gridcolor='rgba(255,255,255,0.04)'),
+                                xaxis=dict(gridcolor='rgba(255,255,255,0.04)', zeroline=False),
+                                template='plotly_dark',
+                                paper_bgcolor='rgba(0,0,0,0)',
+                                plot_bgcolor='rgba(0,0,0,0)',
+                                font=dict(size=11, color='#666'),
+                            )
+                            st.plotly_chart(fig_beta, use_container_width=True, config={'displayModeBar': False})
+
+                        with b2:
+                            corr = rolling_stats.correlation([bench_name] + beta_cols)
+                            corr_names = [bench_name] + short_names
+                            fig_corr = go.Figure(go.Heatmap(
+                                z=corr.to_numpy(), x=corr_names, y=corr_names,
+                                zmin=-1, zmax=1, colorscale='RdBu_r',
+                                hovertemplate='%{y} · %{x}<br>상관: %{z:.2f}<extra></extra>',
+                            ))
+                            fig_corr.update_layout(
+                                title=dict(text=f"상관계수 ({beta_window_name})", font=dict(size=12, color='#9B9B9B')),
+                                height=max(300, 22 * len(beta_cols) + 80),
+                                margin=dict(l=10, r=10, t=40, b=20),
+                                yaxis=dict(autorange='reversed'),
+                                template='plotly_dark',
+                                paper_bgcolor='rgba(0,0,0,0)',
+                                plot_bgcolor='rgba(0,0,0,0)',
+                                font=dict(size=11, color='#666'),
+                            )
+                            st.plotly_chart(fig_corr, use_container_width=True, config={'displayModeBar': False})
+
+                # ===== 섹터 합성 지수 (구성 종목으로 만든 섹터 지수의 상대강도) =====
+                with st.expander("🧩 섹터 합성 지수", expanded=False):
+                    # 구성 종목 전체로 합성 지수를 만드는 일은 켤 때만
+                    if st.toggle("섹터 합성 지수 계산", key='composite_on'):
+                        composite_method = st.radio(
+                            "가중 방식", options=list(SectorComposite.METHODS), horizontal=True,
+                            format_func={'equal': "동일가중", 'cap': "시가총액가중"}.get, key='composite_method',
+                        )
+                        shares = get_shares_outstanding(list(member_meta['code'])) if composite_method == 'cap' else None
+                        composite = get_sector_composite(aligned_data[member_meta.index], member_meta['sector'], shares)
+                        composite_window = pd.concat(
+                            [aligned_data[[bench_name]], composite.levels(composite_method)], axis=1,
+                        ).tail(period_days).ffill().bfill()
+                        sector_relative = calculate_relative_strength(composite_window, bench_name)
+                        session_frames['sector_relative'] = sector_relative
+
+                        if sector_relative.empty:
+                            st.caption("구성 종목이 있는 섹터가 없습니다.")
+                        else:
+                            sector_colors = member_meta.groupby('sector', sort=False)['sector_color'].first()
+                            fig_sector = go.Figure()
+                            for sector_name in sector_relative.columns:
+                                fig_sector.add_trace(go.Scatter(
+                                    x=sector_relative.index, y=sector_relative[sector_name], name=sector_name,
+                                    line=dict(color=sector_colors[sector_name], width=stock_line_width, dash=stock_line_style),
+                                    hovertemplate=f'%{{x|%Y-%m-%d}}<br>{sector_name}: %{{y:+.1f}}%p<extra></extra>',
+                                ))
+                            fig_sector.add_hline(y=0, line_dash="solid", line_color=bench_color, line_width=2, opacity=0.6)
+                            fig_sector.update_layout(
+                                height=420,
+                                margin=dict(l=10, r=10, t=20, b=20),
+                                yaxis_title=f"{bench_name} 대비 (%p)",
+                                hovermode='closest',
+                                template='plotly_dark',
+                                paper_bgcolor='rgba(0,0,0,0)',
+                                plot_bgcolor='rgba(0,0,0,0)',
+                                font=dict(size=11, color='#666'),
+                                xaxis=dict(gridcolor='rgba(255,255,255,0.04)', showgrid=True, zeroline=False),
+                                yaxis=dict(gridcolor='rgba(255,255,255,0.04)', showgrid=True, zeroline=False),
+                            )
+                            st.plotly_chart(fig_sector, use_container_width=True, config={'displayModeBar': False})
+                            member_counts = member_meta['sector'].value_counts()
+                            st.caption(" · ".join(
+                                f"{s} {member_counts[s]}종목 {sector_relative[s].iloc[-1]:+.1f}%p"
+                                for s in sector_relative.iloc[-1].sort_values(ascending=False).index
+                            ))
+
     # ========== 탭3: 랭킹표 (이전 vs 현재 비교) ==========
     with tab3:
         # 선택된 종목만 랭킹 (session_state 사용)
@@ -1760,30 +4228,17 @@ def main():
 
         # ===== 현재 기간 데이터 (이미 all_data에 있음) =====
         filtered_data_now = all_data[[bench_name] + [c for c in tab3_selected if c in all_data.columns]]
-        relative_df_now = calculate_relative_strength(filtered_data_now, benchmark_col=bench_name)
-
-        # ===== 이전 기간 데이터 (한 기�� 전) =====
-        # all_data는 이미 period_days로 잘려있으므로, 원본 batch_data에서 이전 기간 추출
-        prev_end_idx = len(batch_data) - period_days  # 이전 기간의 끝 인덱스
-        prev_start_idx = max(0, prev_end_idx - period_days)  # 이전 기간의 시작 인덱스
-
-        if prev_end_idx > prev_start_idx:
-            # 이전 기간 데이터 추출
-            prev_batch = batch_data.iloc[prev_start_idx:prev_end_idx]
-            prev_data = pd.DataFrame(index=prev_batch.index)
-            for ticker, display_name in ticker_info.items():
-                if ticker in prev_batch.columns:
-                    prev_data[display_name] = prev_batch[ticker]
-            prev_data = prev_data.ffill().bfill()
-
-            if not prev_data.empty and bench_name in prev_data.columns:
-                filtered_data_prev = prev_data[[bench_name] + [c for c in tab3_selected if c in prev_data.columns]]
-                relative_df_prev = calculate_relative_strength(filtered_data_prev, benchmark_col=bench_name)
-                has_prev_data = True
-            else:
-                has_prev_data = False
-        else:
-            has_prev_data = False
+        relative_df_now = relative_df_all[[c for c in tab3_selected if c in relative_df_all.columns]]
+
+        # ===== 이전 기간 데이터 (한 기간 전) =====
+        # 현재 기간과 같은 정렬 가격 행렬(rs_cube)에서 바로 앞 창을 잘라 씀
+        prev_cols = [c for c in tab3_selected if c in rs_cube.columns]
+        has_prev_data = rs_cube.window_rows(period_days, back=1) is not None
+        if has_prev_data:
+            filtered_data_prev = rs_cube.prices(period_days, prev_cols, back=1)
+            relative_df_prev = rs_cube.relative(period_days, prev_cols, back=1)
+            session_frames.update(filtered_data_prev=filtered_data_prev, relative_df_prev=relative_df_prev)
+        session_frames.update(filtered_data_now=filtered_data_now, relative_df_now=relative_df_now)
 
         # ===== 기간 날짜 표시 =====
         current_start = filtered_data_now.index[0].strftime('%Y-%m-%d') if len(filtered_data_now) > 0 else ''
@@ -1795,77 +4250,18 @@ def main():
         else:
             prev_start, prev_end = '', ''
 
-        # ===== 랭킹 데이터 생성 함수 =====
-        def create_ranking_df(filtered_data, relative_df, include_rank_col=True):
-            if relative_df.empty:
-                return pd.DataFrame()
-            ranking_data = []
-            for col in relative_df.columns:
-                if col in filtered_data.columns:
-                    first_val = filtered_data[col].iloc[0]
-                    last_val = filtered_data[col].iloc[-1]
-                    rel_val = relative_df[col].iloc[-1] if len(relative_df[col]) > 0 else 0
-
-                    if pd.isna(first_val) or pd.isna(last_val) or first_val == 0 or pd.isna(rel_val):
-                        stock_return = None
-                        rel_return = None
-                        status = '⚠️'
-                    else:
-                        stock_return = round((last_val / first_val - 1) * 100, 1)
-                        rel_return = round(rel_val, 1)
-                        status = '🔥' if rel_return > 0 else '❄️'
-
-                    stock_name = col.split(']')[-1] if ']' in col else col
-                    if '[' in col and ']' in col:
-                        sector = col.split('[')[1].split(']')[0]
-                    else:
-                        sector = '-'
-                    ranking_data.append({
-                        '섹터': sector,
-                        '종목': stock_name,
-                        '상대수익률': rel_return,
-                        '수익률': stock_return,
-                        '상태': status,
-                        '_full_name': col
-                    })
-            df = pd.DataFrame(ranking_data)
-            if df.empty:
-                return df
-            df = df.sort_values('상대수익률', ascending=False, na_position='last')
-            df['순위'] = range(1, len(df) + 1)
-            return df
-
         # ===== 현재 기간 랭킹 =====
-        ranking_now = create_ranking_df(filtered_data_now, relative_df_now)
+        ranking_now = create_ranking_df(filtered_data_now, relative_df_now, panel_meta)
 
         # ===== 이전 기간 랭킹 =====
         if has_prev_data:
-            ranking_prev = create_ranking_df(filtered_data_prev, relative_df_prev)
+            ranking_prev = create_ranking_df(filtered_data_prev, relative_df_prev, panel_meta)
         else:
             ranking_prev = pd.DataFrame()
 
         # ===== 이전 기간 부족 종목 보완 =====
         if not ranking_now.empty:
-            prev_names = set(ranking_prev['_full_name']) if not ranking_prev.empty else set()
-            missing_rows = []
-            for _, row in ranking_now.iterrows():
-                if row['_full_name'] not in prev_names:
-                    missing_rows.append({
-                        '섹터': row['섹터'],
-                        '종목': row['종목'],
-                        '상대수익률': None,
-                        '수익률': None,
-                        '상태': '⚠️',
-                        '_full_name': row['_full_name'],
-                    })
-            if missing_rows:
-                missing_df = pd.DataFrame(missing_rows)
-                if not ranking_prev.empty:
-                    ranking_prev = pd.concat([ranking_prev, missing_df], ignore_index=True)
-                    ranking_prev = ranking_prev.sort_values('상대수익률', ascending=False, na_position='last')
-                else:
-                    ranking_prev = missing_df
-                ranking_prev['순위'] = range(1, len(ranking_prev) + 1)
+            ranking_prev = fill_missing_ranking(ranking_now, ranking_prev)
 
             if not ranking_prev.empty and not has_prev_data:
                 has_prev_data = True
@@ -1875,24 +4271,7 @@ def main():
 
         # ===== 순위 변동 계산 =====
         if not ranking_now.empty and not ranking_prev.empty:
-            prev_valid = set(ranking_prev[ranking_prev['상대수익률'].notna()]['_full_name']) if not ranking_prev.empty else set()
-            prev_rank_map = dict(zip(ranking_prev['_full_name'], ranking_prev['순위']))
-            rank_changes = []
-            for _, row in ranking_now.iterrows():
-                full_name = row['_full_name']
-                if full_name not in prev_valid:
-                    rank_changes.append('⚠️')
-                    continue
-                curr_rank = row['순위']
-                prev_rank = prev_rank_map.get(full_name, curr_rank)
-                change = prev_rank - curr_rank
-                if change > 0:
-                    rank_changes.append(f'▲{change}')
-                elif change < 0:
-                    rank_changes.append(f'▼{abs(change)}')
-                else:
-                    rank_changes.append('-')
-            ranking_now['변동'] = rank_changes
+            ranking_now['변동'] = calculate_rank_changes(ranking_now, ranking_prev)
 
         # ===== 요약 카드 =====
         c1, c2, c3, c4 = st.columns(4)
@@ -2003,6 +4382,134 @@ def main():
                 }, na_rep='⚠️ 기간 부족')
                 st.dataframe(styled_now, use_container_width=True, height=420)
 
+        # ===== 조건 검색 (기간 상대수익률/수익률/연속 일수 열에서 바로 거름) =====
+        with st.expander("🔎 조건 검색", expanded=False):
+            st.caption(
+                "컬럼: kind(stock/sector) · sector · name · return · relative_return · days "
+                "(+N일 연속 아웃퍼폼 / -N일 연속 언더퍼폼) — 예: kind == sector and days >= 5 and relative_return > 3"
+            )
+            # 섹터 합성 지수와 전체 패널 스크린 표는 켤 때만 만듦
+            if st.toggle("조건 검색 실행", key='screen_on'):
+                q1, q2, q3 = st.columns([4, 2, 1])
+                with q1:
+                    screen_where = st.text_input("조건", "days >= 5 and relative_return > 3", key='screen_where')
+                with q2:
+                    screen_sort = st.text_input("정렬", "relative_return desc", key='screen_sort')
+                with q3:
+                    screen_limit = st.number_input("개수", 1, 1000, 50, step=10, key='screen_limit')
+
+                # 종목 행은 이미 계산한 상대수익률 큐브 창을, 섹터 행은 동일가중 합성 지수를 씀
+                screen_composite = get_sector_composite(aligned_data[member_meta.index], member_meta['sector'])
+                screen_sector_window = pd.concat(
+                    [aligned_data[[bench_name]], screen_composite.levels()], axis=1,
+                ).tail(period_days).ffill().bfill()
+                screen_table = pd.concat([
+                    build_screen_table(all_data, bench_name, panel_meta, relative=relative_df_all),
+                    build_screen_table(screen_sector_window, bench_name, kind='sector'),
+                ])
+                try:
+                    screen_result = screen(screen_table, screen_where, screen_sort, screen_limit)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                else:
+                    st.caption(f"{len(screen_table)}개 중 조건에 맞는 {len(screen_result)}개")
+                    screen_view = screen_result.reset_index(drop=True)
+                    screen_view.index = range(1, len(screen_view) + 1)
+                    st.dataframe(
+                        screen_view.style.applymap(color_relative, subset=['relative_return']).format(
+                            {'return': '{:+.1f}%', 'relative_return': '{:+.1f}%p', 'days': '{:+d}일'}, na_rep='-'),
+                        use_container_width=True, height=360,
+                    )
+
+    # ========== 탭4: RS 등급 (전체 종목 횡단면) ==========
+    with tab4:
+        universe = get_universe()
+        universe = universe[universe['market'].isin(REGION_MARKETS[benchmark_info['region']])]
+        horizons = [h for h, _ in RS_RATING_WEIGHTS]
+        st.markdown(f"""
+            <p style='color:#666; font-size:11px; margin-bottom:8px;'>
+            {len(universe)}개 종목 · 기간별 수익률 가중합({' / '.join(f'{h}일' for h in horizons)})의
+            백분위 (1~99, 하루 한 번 계산)
+            </p>
+        """, unsafe_allow_html=True)
+
+        if st.toggle("전체 종목 RS 등급 보기", key='rs_rating_on'):
+            with st.spinner("📡 전체 종목 RS 등급 계산..."):
+                rating_table = get_rs_rating_table(universe, benchmark_info['ticker'], str(today))
+
+            f1, f2, f3 = st.columns([2, 2, 1])
+            with f1:
+                markets = st.multiselect("시장", REGION_MARKETS[benchmark_info['region']],
+                                         default=list(REGION_MARKETS[benchmark_info['region']]),
+                                         key=f"rs_rating_markets_{benchmark_info['region']}")
+            with f2:
+                min_rating = st.slider("최소 등급", 1, 99, 1, key='rs_rating_min')
+            with f3:
+                top_n = st.number_input("표시 개수", 10, 5000, 100, step=10, key='rs_rating_top')
+
+            view = rating_table[rating_table['market'].isin(markets) & (rating_table['rating'] >= min_rating)]
+            view = view.head(int(top_n)).reset_index()
+            view.index = range(1, len(view) + 1)
+            st.dataframe(
+                view.style.applymap(color_relative, subset=[f'rs_{h}d' for h in horizons]).format(
+                    {**{f'return_{h}d': '{:+.1f}%' for h in horizons},
+                     **{f'rs_{h}d': '{:+.1f}%p' for h in horizons},
+                     'score': '{:+.1f}'}, na_rep='-'),
+                use_container_width=True, height=420,
+            )
+
+    # ========== 탭5: 시장 스캔 (전체 종목 기간 상대강도) ==========
+    with tab5:
+        scan_universe = get_universe()
+        scan_universe = scan_universe[scan_universe['market'].isin(REGION_MARKETS[benchmark_info['region']])]
+        scanner = MarketScanner(scan_universe, benchmark_info['ticker'], period_days, str(today),
+                                get_scan_checkpoint())
+        completed = scanner.completed_chunks()
+        st.markdown(f"""
+            <p style='color:#666; font-size:11px; margin-bottom:8px;'>
+            {len(scanner.universe)}개 종목 · {period_name} {bench_name} 대비 상대수익률/연속 일수 ·
+            청크 {completed}/{scanner.total_chunks} 완료 (중단돼도 남은 청크부터 이어서 받음)
+            </p>
+        """, unsafe_allow_html=True)
+
+        s1, s2 = st.columns([1, 1])
+        with s1:
+            run_label = "▶️ 스캔 시작" if completed == 0 else "▶️ 이어서 스캔"
+            run_scan = st.button(run_label, key='market_scan_run', disabled=completed == scanner.total_chunks)
+        with s2:
+            scan_top = st.number_input("상위/하위 개수", 5, 500, 20, step=5, key='market_scan_top')
+
+        if run_scan:
+            scan_bar = st.progress(completed / max(scanner.total_chunks, 1), text="📡 시장 스캔...")
+            scanner.scan(progress=lambda done, total: scan_bar.progress(done / total, text=f"📡 청크 {done}/{total}"))
+            if scanner.failed:
+                st.warning(f"⚠️ {len(scanner.failed)}개 청크를 받지 못했습니다. 다시 누르면 그 청크만 받습니다.")
+
+        scan_table = scanner.results()
+        if not scan_table.empty:
+            scan_format = {'return': '{:+.1f}%', 'relative_return': '{:+.1f}%p', 'days': '{:+d}일'}
+            top, bottom = MarketScanner.extremes(scan_table, int(scan_top))
+            t1, t2 = st.columns(2)
+            for column, label, view in ((t1, "🔥 상위", top), (t2, "❄️ 하위", bottom)):
+                with column:
+                    st.markdown(f"**{label} {len(view)}**")
+                    view = view.reset_index()
+                    view.index = range(1, len(view) + 1)
+                    st.dataframe(
+                        view.style.applymap(color_relative, subset=['relative_return']).format(scan_format, na_rep='-'),
+                        use_container_width=True, height=420,
+                    )
+
+    # ========== 메모리 사용량 (SHOW_MEMORY_REPORT일 때만 사이드바 하단, 아니면 디버그 로그) ==========
+    memory = panel_memory_report(session_frames)
+    memory_note = (f"세션 {memory['session'] / 2 ** 20:.1f}MB · "
+                   f"공유 {memory['shared'] / 2 ** 20:.1f}MB / 한도 {memory['budget'] / 2 ** 20:.0f}MB · "
+                   f"{PANEL_DTYPE.name}")
+    if SHOW_MEMORY_REPORT:
+        st.sidebar.caption(f"💾 {memory_note}")
+    else:
+        logger.debug("메모리 사용량: %s", memory_note)
+
     # ========== 하단 가이드 ==========
     st.markdown("<div style='margin-top: 24px;'></div>", unsafe_allow_html=True)
     with st.expander("💡 사용 가이드", expanded=False):